@@ -0,0 +1,136 @@
+import json
+from collections import deque
+from multiprocessing import Pool
+
+from lib.cache import ResultCache
+from lib.search import *
+
+
+MAX_PENDING_PER_WORKER = 4  # positions queued per worker -> bounds the memory used by the pipeline
+
+_worker_board: Board = None  # every worker process reuses one board for all of its positions
+_worker_stores: Dict[str, PositionStore] = {}  # and opens every position store only once
+WORKER_CACHE_BYTES = 256 << 20  # memory bound of the result cache of a worker process
+_worker_cache: ResultCache = None  # results of this process, created by the first analysis with use_cache
+
+
+def iter_positions(stream):
+    """Yields (fen, id) for every FEN or EPD line of the stream. Empty lines and lines starting with '#' are
+    skipped. For EPD lines the operations are dropped and the value of the 'id' operation (if any) is returned.
+    """
+    for line in stream:
+        tokens = line.split()
+        if not tokens or tokens[0].startswith("#"):
+            continue
+
+        # FEN has the half move clock & move number after the 4 position fields, EPD has operations
+        if len(tokens) >= 6 and tokens[4].isdigit() and tokens[5].isdigit():
+            yield " ".join(tokens[:6]), None
+            continue
+
+        position_id = None
+        operations = " ".join(tokens[4:])
+        for operation in operations.split(";"):
+            operation = operation.strip()
+            if operation.startswith("id "):
+                position_id = operation[3:].strip().strip('"')
+
+        yield " ".join(tokens[:4]), position_id
+
+
+def analyse_position(fen: str, position_id=None, simulations=1000, move_time=0.0, store_path=None,
+                     use_cache=False) -> dict:
+    """Searches a single position under a simulation and/or time (seconds) budget and
+    returns the result as a json serializable dict.
+    The position is searched by search_position: with a position store, stored results with enough simulations are
+    returned without searching and new results are written back. With use_cache searches without a time budget go
+    through the result cache of the process: repeated requests are answered from it and larger budgets continue the
+    cached tree.
+    """
+    global _worker_board, _worker_cache
+    if _worker_board is None:
+        _worker_board = Board()
+    if use_cache and _worker_cache is None:
+        _worker_cache = ResultCache(max_bytes=WORKER_CACHE_BYTES, keep_trees=True)
+
+    store = None
+    if store_path is not None:
+        if store_path not in _worker_stores:
+            _worker_stores[store_path] = PositionStore(store_path)
+        store = _worker_stores[store_path]
+
+    result = {"fen": fen}
+    if position_id is not None:
+        result["id"] = position_id
+
+    try:
+        _worker_board.parse_fen(fen)
+    except (AssertionError, KeyError, IndexError, ValueError):
+        result["error"] = "invalid fen"
+        return result
+
+    info = SearchInfo()
+    info.reset()
+    if move_time > 0:
+        info.timeSet = True
+        info.stopTime = info.startTime + move_time
+        if simulations <= 0:
+            simulations = INFINITE_SIMULATIONS
+
+    search = SearchResult()
+    search_position(_worker_board, simulations, info, store=store, cache=_worker_cache if use_cache else None,
+                    result=search)
+
+    result["nodes"] = search.nodes
+    if search.bestMove == NO_MOVE:
+        result["bestmove"] = None
+        result["result"] = _worker_board.get_result(_worker_board.playerJustMoved)
+    else:
+        result["bestmove"] = _worker_board.moveGenerator.print_move(search.bestMove)
+        if search.visits is not None:
+            result["visits"] = search.visits
+        result["winrate"] = round(search.winRate, 4)
+    if search.source == "store":
+        result["stored"] = True
+    elif search.source == "cache":
+        result["cached"] = True
+
+    return result
+
+
+def run_batch(input_stream, output_stream, simulations=1000, move_time=0.0, workers=1, store_path=None,
+              use_cache=False) -> int:
+    """Analyses every position of the input stream and writes one json line per position to the output stream,
+    in input order and as soon as the result is available. Work is spread over a pool of worker processes with
+    a bounded number of pending positions. All workers share the position store at store_path (if given).
+    With use_cache every worker answers repeated positions from its result cache (see analyse_position).
+    Returns the number of analysed positions.
+    """
+    count = 0
+    positions = iter_positions(input_stream)
+
+    def write(result: dict):
+        output_stream.write(json.dumps(result) + "\n")
+        output_stream.flush()
+
+    if workers <= 1:
+        for fen, position_id in positions:
+            write(analyse_position(fen, position_id, simulations, move_time, store_path, use_cache))
+            count += 1
+        return count
+
+    pending = deque()
+    with Pool(processes=workers) as pool:
+        for fen, position_id in positions:
+            pending.append(pool.apply_async(analyse_position,
+                                            (fen, position_id, simulations, move_time, store_path, use_cache)))
+
+            if len(pending) >= workers * MAX_PENDING_PER_WORKER:
+                write(pending.popleft().get())
+                count += 1
+
+        while pending:
+            write(pending.popleft().get())
+            count += 1
+
+    return count
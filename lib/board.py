@@ -3,7 +3,7 @@ from copy import deepcopy
 from lib.constants import *
 from lib.conversion import Conversion, convert_file_rank_to_square
 from lib.movegenerator import MoveGenerator
-from lib.history import Undo
+from lib.history import Undo, BoardSnapshot
 
 
 class Board:
@@ -18,12 +18,19 @@ class Board:
         self.enPassantSquare: int = 0  # square in which en passant capture is possible
         self.fiftyMove: int = 0  # how many moves from the fifty move rule have been made
         self.histPly: int = 0  # how many half moves have been made
+        self.startPly: int = 0  # half moves played before the position set up from a fen (by its fullmove number)
         # Create fixed size list that stores current position and variables before a move is made
         self.history: List[Undo] = [Undo() for _ in range(MAX_GAME_MOVES)]
 
         # The piece list below make it easier to determine drawn positions or insufficient material
         self.pieceNumber: List[int] = [0] * 13  # how many pieces of each type are there currently on the board
 
+        # endgame tablebase (lib.tablebase.Tablebase) consulted by get_result, only set on boards that are searched
+        self.tablebase = None
+
+        # number of pieces of each side attacking every square, only maintained after enable_attack_maps()
+        self.attackMaps: List[List[int]] = None
+
         # Create related objects
         self.hashData = HashData()
         self.moveGenerator = MoveGenerator(self)
@@ -139,7 +146,8 @@ class Board:
         return c_uint64(final_key)
 
     def __copy__(self):
-        return deepcopy(self)
+        # the tablebase (memory mapped tables) is shared by all copies
+        return deepcopy(self, {id(self.tablebase): self.tablebase})
 
     def reset(self):
         # Set all board positions to OFF_BOARD
@@ -161,6 +169,7 @@ class Board:
         self.enPassantSquare = NO_SQUARE
         self.fiftyMove = 0
         self.histPly = 0
+        self.startPly = 0
         self.castlePermissions = 0
         self.posKey = 0
 
@@ -229,22 +238,27 @@ class Board:
                 break
 
             # Depending on the char, enable the corresponding castling permission related bit
-            if char is "K":
+            if char == "K":
                 self.castlePermissions |= WHITE_KING_CASTLING
-            elif char is "Q":
+            elif char == "Q":
                 self.castlePermissions |= WHITE_QUEEN_CASTLING
-            elif char is "k":
+            elif char == "k":
                 self.castlePermissions |= BLACK_KING_CASTLING
-            elif char is "q":
+            elif char == "q":
                 self.castlePermissions |= BLACK_QUEEN_CASTLING
+            elif char == "-":
+                # no castling permissions at all -> skip the dash
+                char_idx += 1
+                break
             else:
                 break
 
             char_idx += 1
 
         assert 0 <= self.castlePermissions <= 15
-        # move to the en passant square related part of FEN
-        char_idx += 1
+        # move to the en passant square related part of FEN (it may directly follow the castling part, i.e. 'w --')
+        while fen[char_idx] == " ":
+            char_idx += 1
         char = fen[char_idx]
 
         if char != "-":
@@ -268,8 +282,86 @@ class Board:
         char_idx = self._parse_fen_pieces(fen)
         self._parse_fen_options(fen, char_idx)
 
+        # the fullmove number is optional, it counts from 1 and goes up after every black move
+        fields = fen.split()
+        if len(fields) >= 6 and fields[5].isdigit():
+            self.startPly = max(int(fields[5]) - 1, 0) * 2 + (self.side == BLACK)
+
         self.posKey = self.__hash__()  # generate pos key for new position
         self.update_material_lists()
+        if self.attackMaps is not None:
+            self.compute_attack_maps()
+
+    def get_fen(self) -> str:
+        """returns the fen string of the current position"""
+        ranks = []
+        for rank in reversed(range(RANK_8 + 1)):
+            rank_str = ""
+            empty = 0
+            for file in range(FILE_H + 1):
+                piece = self.pieces[convert_file_rank_to_square(file, rank)]
+                if piece == EMPTY:
+                    empty += 1
+                    continue
+
+                if empty:
+                    rank_str += str(empty)
+                    empty = 0
+                rank_str += PIECE_CHARACTER_STRING[piece]
+
+            if empty:
+                rank_str += str(empty)
+            ranks.append(rank_str)
+
+        castling = ""
+        for permission, char in ((WHITE_KING_CASTLING, "K"), (WHITE_QUEEN_CASTLING, "Q"),
+                                 (BLACK_KING_CASTLING, "k"), (BLACK_QUEEN_CASTLING, "q")):
+            if self.castlePermissions & permission != 0:
+                castling += char
+
+        en_passant = "-"
+        if self.enPassantSquare != NO_SQUARE:
+            en_passant = (chr(ord("a") + self.conversion.FilesBoard[self.enPassantSquare]) +
+                          chr(ord("1") + self.conversion.RanksBoard[self.enPassantSquare]))
+
+        return "{} {} {} {} {} {}".format("/".join(ranks), SIDE_CHAR[self.side], castling or "-", en_passant,
+                                          self.fiftyMove, (self.startPly + self.histPly) // 2 + 1)
+
+    def get_packed_position(self) -> bytes:
+        """returns the position packed into PACKED_POSITION_SIZE bytes: two squares (4 bits each) per byte
+        from a1 to h8 followed by side, castle permissions, en passant square (64 based, 64 if none) and fifty move
+        """
+        packed = bytearray(PACKED_POSITION_SIZE)
+        for sq64 in range(0, 64, 2):
+            packed[sq64 >> 1] = (self.pieces[self.conversion.Sq64ToSq120[sq64]] |
+                                 (self.pieces[self.conversion.Sq64ToSq120[sq64 + 1]] << 4))
+
+        packed[32] = self.side
+        packed[33] = self.castlePermissions
+        packed[34] = 64 if self.enPassantSquare == NO_SQUARE else self.conversion.Sq120ToSq64[self.enPassantSquare]
+        packed[35] = min(self.fiftyMove, 255)
+        return bytes(packed)
+
+    def parse_packed_position(self, packed: bytes):
+        """sets up the position from the output of get_packed_position"""
+        assert len(packed) >= PACKED_POSITION_SIZE
+
+        self.reset()
+        for sq64 in range(64):
+            piece = (packed[sq64 >> 1] >> ((sq64 & 1) * 4)) & 0xf
+            if piece != EMPTY:
+                self.pieces[self.conversion.Sq64ToSq120[sq64]] = piece
+
+        self.side = packed[32]
+        self.playerJustMoved = self.side ^ 1
+        self.castlePermissions = packed[33]
+        self.enPassantSquare = NO_SQUARE if packed[34] == 64 else self.conversion.Sq64ToSq120[packed[34]]
+        self.fiftyMove = packed[35]
+
+        self.posKey = self.__hash__()
+        self.update_material_lists()
+        if self.attackMaps is not None:
+            self.compute_attack_maps()
 
     def update_material_lists(self):  # todo why not do this while parsing fen pieces
         """updates all material related piece lists"""
@@ -355,66 +447,145 @@ class Board:
         assert self.is_square_on_board(sq)
         assert self.is_side_valid(side)
 
+        if self.attackMaps is not None:
+            return self.attackMaps[side][sq] > 0
+
+        pieces = self.pieces
+
         # pawns
         # if attacking side is white and there are pawns infornt to the left and right of us, then we are attacked
         if side == WHITE:
-            if self.pieces[sq - 11] == WHITE_PAWN or self.pieces[sq - 9] == WHITE_PAWN:
+            if pieces[sq - 11] == WHITE_PAWN or pieces[sq - 9] == WHITE_PAWN:
                 return True
 
         else:
-            if self.pieces[sq + 11] == BLACK_PAWN or self.pieces[sq + 9] == BLACK_PAWN:
+            if pieces[sq + 11] == BLACK_PAWN or pieces[sq + 9] == BLACK_PAWN:
                 return True
 
-        # knights
-        # Loop through 8 directions
-        for index in range(8):
-            # find what piece is in that direction
-            pce = self.pieces[sq + KNIGHT_MOVE_INCREMENT[index]]
-            # if there is a knight of the opposite side at that piece -> return True
-            if pce != OFF_BOARD and IS_PIECE_KNIGHT[pce] and PIECE_COLOR_MAP[pce] == side:
+        # knights - if there is a knight of the attacking side on any of the knight targets of our square
+        knight = KNIGHT_OF_SIDE[side]
+        for target_sq in KNIGHT_TARGETS[sq]:
+            if pieces[target_sq] == knight:
                 return True
 
         # rooks, queens
-        for index in range(4):
-            dir_ = ROOK_MOVE_INCREMENT[index]  # get current direction
-            to_sq = sq + dir_  # take the first square
-            pce = self.pieces[to_sq]  # see what piece is there
-            while pce != OFF_BOARD:  # while the piece is not OFF_BOARD
+        rook, queen = ROOK_OF_SIDE[side], QUEEN_OF_SIDE[side]
+        for ray in ROOK_RAYS[sq]:
+            for target_sq in ray:
+                pce = pieces[target_sq]
                 if pce != EMPTY:  # if we hit a piece
-                    # if that piece is a rook or queen from the opposite side
-                    if IS_PIECE_ROOK_QUEEN[pce] and PIECE_COLOR_MAP[pce] == side:
-                        return True  # our square is under attack -> return True
+                    # if that piece is a rook or queen from the opposite side -> our square is under attack
+                    if pce == rook or pce == queen:
+                        return True
 
                     break  # otherwise we hit a piece that is not an attacker -> try another direction
 
-                to_sq += dir_  # increment new piece square and perform check again
-                pce = self.pieces[to_sq]  # get new piece
-
         # bishops, queens
-        for index in range(4):  # todo could be rewriten as for _, dir = range bishopDir !!!!!!
-            dir_ = BISHOP_MOVE_INCREMENT[index]
-            to_sq = sq + dir_
-            pce = self.pieces[to_sq]
-            while pce != OFF_BOARD:
+        bishop = BISHOP_OF_SIDE[side]
+        for ray in BISHOP_RAYS[sq]:
+            for target_sq in ray:
+                pce = pieces[target_sq]
                 if pce != EMPTY:
-                    if IS_PIECE_BISHOP_QUEEN[pce] and PIECE_COLOR_MAP[pce] == side:
+                    if pce == bishop or pce == queen:
                         return True
 
                     break
 
-                to_sq += dir_
-                pce = self.pieces[to_sq]
-
         # kings
-        for index in range(8):
-            pce = self.pieces[sq + KING_MOVE_INCREMENT[index]]
-            if pce != OFF_BOARD and IS_PIECE_KING[pce] and PIECE_COLOR_MAP[pce] == side:
+        king = KING_OF_SIDE[side]
+        for target_sq in KING_TARGETS[sq]:
+            if pieces[target_sq] == king:
                 return True
 
         return False
 
+    def enable_attack_maps(self):
+        """Starts maintaining the number of attackers of every square for both sides. From then on
+        is_square_attacked is a lookup and most moves are checked for legality without making them, at the cost of
+        updating the maps whenever a piece is added, cleared or moved.
+        """
+        self.attackMaps = [[0] * BOARD_SQUARE_NUMBER, [0] * BOARD_SQUARE_NUMBER]
+        self.compute_attack_maps()
+
+    def disable_attack_maps(self):
+        self.attackMaps = None
+
+    def compute_attack_maps(self):
+        """Recomputes the attack maps from scratch"""
+        for attack_map in self.attackMaps:
+            for sq in range(BOARD_SQUARE_NUMBER):
+                attack_map[sq] = 0
+
+        for sq in range(BOARD_SQUARE_NUMBER):
+            piece = self.pieces[sq]
+            if piece != OFF_BOARD and piece != EMPTY:
+                self._update_piece_attacks(sq, piece, 1)
+
+    def _update_piece_attacks(self, sq: int, piece: int, delta: int):
+        """Adds (delta 1) or removes (delta -1) the attacks of the piece on sq to the attack map of its side"""
+        attack_map = self.attackMaps[PIECE_COLOR_MAP[piece]]
+
+        if piece == WHITE_PAWN:
+            attack_map[sq + 9] += delta
+            attack_map[sq + 11] += delta
+        elif piece == BLACK_PAWN:
+            attack_map[sq - 9] += delta
+            attack_map[sq - 11] += delta
+        elif IS_PIECE_SLIDING[piece]:
+            pieces = self.pieces
+            for ray in SLIDING_RAYS[piece][sq]:
+                for target_sq in ray:
+                    attack_map[target_sq] += delta
+                    if pieces[target_sq] != EMPTY:
+                        break
+        else:
+            for target_sq in NON_SLIDING_TARGETS[piece][sq]:
+                attack_map[target_sq] += delta
+
+    def _update_xray_attacks(self, sq: int, delta: int):
+        """A piece arriving on sq blocks (delta -1) and a piece leaving sq unblocks (delta 1) the rays of all sliding
+        pieces that attack sq, beyond sq.
+        """
+        pieces = self.pieces
+        for ray, behind, is_slider in XRAY_LINES[sq]:
+            for target_sq in ray:
+                piece = pieces[target_sq]
+                if piece != EMPTY:
+                    if is_slider[piece]:
+                        attack_map = self.attackMaps[PIECE_COLOR_MAP[piece]]
+                        for behind_sq in behind:
+                            attack_map[behind_sq] += delta
+                            if pieces[behind_sq] != EMPTY:
+                                break
+                    break
+
     def generate_moves(self):
-        return filter(lambda move: self.is_move_legal(move), self.moveGenerator.generate_all_moves())
+        return filter(self.is_move_legal, self.moveGenerator.generate_all_moves())
+
+    def get_moves_into(self, moves) -> int:
+        """Writes the legal moves into the preallocated moves buffer (see movegenerator.new_move_buffer) and
+        returns their number
+        """
+        count = self.moveGenerator.generate_moves_into(moves)
+
+        legal_count = 0
+        for index in range(count):
+            move = moves[index]
+            if self.is_move_legal(move):
+                moves[legal_count] = move
+                legal_count += 1
+        return legal_count
+
+    def iter_legal_moves(self):
+        """Yields the legal moves staged by the move generator (captures & promotions, quiet moves, castling)"""
+        return filter(self.is_move_legal, self.moveGenerator.iter_moves())
+
+    def has_legal_move(self) -> bool:
+        """Stops at the first legal move instead of generating all of them"""
+        for move in self.moveGenerator.iter_moves():
+            if self.is_move_legal(move):
+                return True
+        return False
 
     def get_moves(self):  # needed for uct simulation
         return list(self.generate_moves())
@@ -422,7 +593,13 @@ class Board:
     def is_move_legal(self, move_: int) -> bool:
         """Does a simplified version of make_move, however it does not update any hashtables or special squares.
         it only makes a move and checks that the side to move is still in check after the move => move is illegal.
+        With attack maps most moves are decided without making them.
         """
+        if self.attackMaps is not None and move_ & MOVE_FLAG_ENPASS == 0:
+            is_legal = self._is_move_legal_by_attack_maps(move_)
+            if is_legal is not None:
+                return is_legal
+
         is_legal = True
 
         from_ = get_from_square(move_)
@@ -525,6 +702,50 @@ class Board:
 
         return is_legal
 
+    def _is_move_legal_by_attack_maps(self, move_: int):
+        """Decides the legality of a (non en passant) move with the attack maps. Returns None for moves that have to
+        be made to find out (moves of other pieces while in check).
+        """
+        from_ = get_from_square(move_)
+        to = get_to_square(move_)
+        king_sq = self.kingSquare[self.side]
+        enemy_attacks = self.attackMaps[self.side ^ 1]
+        pieces = self.pieces
+
+        if from_ == king_sq:
+            if enemy_attacks[to] > 0:
+                return False
+            if enemy_attacks[king_sq] == 0 or move_ & MOVE_FLAG_CASTLE != 0:
+                return True
+
+            # in check the king can't step back along the line of a checking slider (the king hides the square)
+            dir_ = to - king_sq
+            is_slider = IS_PIECE_ROOK_QUEEN if dir_ in ROOK_MOVE_INCREMENT else IS_PIECE_BISHOP_QUEEN
+            sq = king_sq - dir_
+            while pieces[sq] == EMPTY:
+                sq -= dir_
+            return not (is_slider[pieces[sq]] and PIECE_COLOR_MAP[pieces[sq]] == self.side ^ 1)
+
+        if enemy_attacks[king_sq] > 0:
+            return None
+
+        # not in check -> only a pinned piece leaving the line of the pin is illegal
+        dir_ = LINE_DIRECTION[king_sq][from_]
+        if dir_ == 0 or LINE_DIRECTION[king_sq][to] == dir_:
+            return True
+
+        sq = king_sq + dir_
+        while pieces[sq] == EMPTY:
+            sq += dir_
+        if sq != from_:
+            return True  # another piece stands between the king and the moving piece
+
+        sq += dir_
+        while pieces[sq] == EMPTY:
+            sq += dir_
+        is_slider = IS_PIECE_ROOK_QUEEN if dir_ in ROOK_MOVE_INCREMENT else IS_PIECE_BISHOP_QUEEN
+        return not (is_slider[pieces[sq]] and PIECE_COLOR_MAP[pieces[sq]] == self.side ^ 1)
+
     # MakeMove perform a move
     # return False if the side to move has left themselves in check after the move i.e. illegal move
     def make_move(self, move_: int) -> bool:
@@ -639,6 +860,33 @@ class Board:
 
         return True
 
+    def get_snapshot(self) -> BoardSnapshot:
+        """Returns a snapshot of the current position to rewind to after making any number of moves"""
+        return BoardSnapshot(self)
+
+    def rewind(self, snapshot: BoardSnapshot):
+        """Restores the position of the snapshot at once instead of taking back the moves made since one by one.
+        The board must not have been taken back below the ply of the snapshot in the meantime.
+        """
+        assert self.histPly >= snapshot.histPly
+        self.histPly = snapshot.histPly
+        self.pieces[:] = snapshot.pieces
+        self.pieceNumber[:] = snapshot.pieceNumber
+        self.kingSquare[:] = snapshot.kingSquare
+        self.side = snapshot.side
+        self.playerJustMoved = snapshot.playerJustMoved
+        self.castlePermissions = snapshot.castlePermissions
+        self.enPassantSquare = snapshot.enPassantSquare
+        self.fiftyMove = snapshot.fiftyMove
+        self.posKey = snapshot.posKey
+
+        if self.attackMaps is not None:
+            if snapshot.attackMaps is None:
+                self.compute_attack_maps()
+            else:
+                self.attackMaps[WHITE][:] = snapshot.attackMaps[WHITE]
+                self.attackMaps[BLACK][:] = snapshot.attackMaps[BLACK]
+
     # TakeMove revert move, opposite to MakeMove()
     def take_move(self):
         self.histPly -= 1
@@ -712,8 +960,12 @@ class Board:
         assert self.is_piece_valid(piece)
 
         self.hashData.hash_piece(piece, sq, self)
+        if self.attackMaps is not None:
+            self._update_piece_attacks(sq, piece, -1)
         self.pieces[sq] = EMPTY
         self.pieceNumber[piece] -= 1
+        if self.attackMaps is not None:
+            self._update_xray_attacks(sq, 1)
 
     def add_piece(self, sq: int, piece: int):
         assert self.is_piece_valid(piece)
@@ -721,8 +973,12 @@ class Board:
 
         self.hashData.hash_piece(piece, sq, self)
 
+        if self.attackMaps is not None:
+            self._update_xray_attacks(sq, -1)
         self.pieces[sq] = piece
         self.pieceNumber[piece] += 1
+        if self.attackMaps is not None:
+            self._update_piece_attacks(sq, piece, 1)
 
     def move_piece(self, from_: int, to: int):
         assert self.is_square_on_board(from_)
@@ -732,10 +988,18 @@ class Board:
 
         # hash the piece out of the from square and then later hash it back in to the new square
         self.hashData.hash_piece(piece, from_, self)
+        if self.attackMaps is not None:
+            self._update_piece_attacks(from_, piece, -1)
         self.pieces[from_] = EMPTY
+        if self.attackMaps is not None:
+            self._update_xray_attacks(from_, 1)
 
         self.hashData.hash_piece(piece, to, self)
+        if self.attackMaps is not None:
+            self._update_xray_attacks(to, -1)
         self.pieces[to] = piece
+        if self.attackMaps is not None:
+            self._update_piece_attacks(to, piece, 1)
 
     def get_threefold_repetition_count(self) -> int:
         """Detects how many repetitions for a given position"""
@@ -747,6 +1011,12 @@ class Board:
 
         return repetition
 
+    def is_history_draw(self) -> bool:
+        """Is the game drawn by the fifty move rule or threefold repetition, i.e. by the moves played before
+        rather than by the position alone
+        """
+        return self.fiftyMove > 100 or self.get_threefold_repetition_count() >= 2
+
     def is_position_draw(self) -> bool:
         """Determine if position is a draw"""
 
@@ -777,20 +1047,22 @@ class Board:
     def get_result(self, player_jm):
         """is called every time a move is made this method is called to check if the game is ended"""
 
-        if self.fiftyMove > 100:
-            # print("1/2-1/2:fifty move rule (claimed by Hugo)\n")
-            return DRAW
-
-        if self.get_threefold_repetition_count() >= 2:
-            # print("1/2-1/2:3-fold repetition (claimed by Hugo)\n")
+        if self.is_history_draw():
+            # print("1/2-1/2:fifty move rule or 3-fold repetition (claimed by Hugo)\n")
             return DRAW
 
         if self.is_position_draw():
             # print("1/2-1/2:insufficient material (claimed by Hugo)\n")
             return DRAW
 
+        if self.tablebase is not None:
+            probed = self.tablebase.probe(self)
+            if probed is not None:  # the result is known from the tables (from the POV of the side to move)
+                result = probed[0]
+                return result if self.side == player_jm else 1.0 - result
+
         # we have legal moves -> game is not over
-        if len(list(self.generate_moves())) != 0:
+        if self.has_legal_move():
             return None
 
         in_check = self.is_square_attacked(self.kingSquare[self.side], self.side ^ 1)
@@ -0,0 +1,150 @@
+import mmap
+import os
+import random
+import struct
+from typing import Tuple
+
+from lib.board import Board
+from lib.constants import *
+from lib.pgn import read_games
+from lib.selfplay import iter_records
+
+
+BOOK_MAGIC = b"HUGOBK01"
+MAX_BOOK_PLY = 20  # positions after this many half moves are not added to the book
+MAX_WEIGHT = 0xffffffff
+
+_header_struct = struct.Struct("<8sQ")  # magic, number of entries
+_entry_struct = struct.Struct("<QII")  # posKey, move, weight - entries are sorted by posKey
+ENTRY_SIZE = _entry_struct.size
+
+
+class OpeningBook:
+    """Opening book stored as a file of fixed size entries sorted by posKey. Lookups binary search the
+    memory mapped file, so opening a book costs nothing and only the touched pages are ever read.
+    """
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count = _header_struct.unpack_from(self.mm, 0)
+        if magic != BOOK_MAGIC or len(self.mm) != _header_struct.size + self.count * ENTRY_SIZE:
+            self.close()
+            raise ValueError("{} is not an opening book".format(path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+    def _get_entry(self, index: int):
+        return _entry_struct.unpack_from(self.mm, _header_struct.size + index * ENTRY_SIZE)
+
+    def get_entries(self, pos: Board) -> List[Tuple[int, int]]:
+        """Returns the (move, weight) pairs of the book for the position. Moves that are not legal in the position
+        (i.e. after a key collision) are left out.
+        """
+        key = pos.posKey.value
+
+        # find the first entry with the key
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+        legal_moves = None
+        for index in range(low, self.count):
+            entry_key, move, weight = self._get_entry(index)
+            if entry_key != key:
+                break
+
+            if legal_moves is None:
+                legal_moves = pos.get_moves()
+            if move in legal_moves:
+                entries.append((move, weight))
+
+        return entries
+
+    def get_move(self, pos: Board, pick_random=True) -> int:
+        """Returns a book move for the position (NO_MOVE if the position is not in the book).
+        The move is picked at random proportionally to the weights or, if pick_random is False, the heaviest one.
+        """
+        entries = self.get_entries(pos)
+        if not entries:
+            return NO_MOVE
+
+        if not pick_random:
+            return max(entries, key=lambda e: e[1])[0]
+
+        total = sum(weight for _, weight in entries)
+        pick = random.random() * total
+        for move, weight in entries:
+            pick -= weight
+            if pick < 0:
+                return move
+
+        return entries[-1][0]
+
+
+def _get_weight(score: int) -> int:
+    """Weight added for a move by a side that went on to win (1), draw (0) or lose (-1) the game"""
+    return score + 1
+
+
+def build_book(path: str, pgn_paths=(), record_paths=(), max_ply=MAX_BOOK_PLY, min_weight=1) -> int:
+    """Compiles an opening book from pgn files and/or self-play record files. Every move played in the first
+    max_ply half moves gets a weight of 2 for a win, 1 for a draw (or unknown result) and 0 for a loss of the side
+    that played it. Moves with a total weight below min_weight are dropped. Returns the number of book entries.
+    """
+    weights: Dict[Tuple[int, int], int] = {}
+    board = Board()
+
+    def add(key: int, move: int, score: int):
+        weights[(key, move)] = weights.get((key, move), 0) + _get_weight(score)
+
+    for pgn_path in pgn_paths:
+        with open(pgn_path) as pgn_file:
+            for game in read_games(pgn_file):
+                white_score = {"1-0": 1, "0-1": -1}.get(game.result, 0)
+                board.parse_fen(game.headers.get("FEN", START_FEN))
+
+                key = board.posKey.value
+                for move in game.replay(board):
+                    if board.histPly > max_ply:
+                        break
+                    # the move was played by the side that just moved
+                    add(key, move, white_score if board.playerJustMoved == WHITE else -white_score)
+                    key = board.posKey.value
+
+    for record_path in record_paths:
+        for record in iter_records(record_path):
+            if record.ply >= max_ply:
+                continue
+            board.parse_packed_position(record.packedPosition)
+            add(board.posKey.value, record.move, record.result)
+
+    entries = sorted((key, move, min(weight, MAX_WEIGHT)) for (key, move), weight in weights.items()
+                     if weight >= min_weight)
+
+    with open(path, "wb") as book_file:
+        book_file.write(_header_struct.pack(BOOK_MAGIC, len(entries)))
+        for entry in entries:
+            book_file.write(_entry_struct.pack(*entry))
+
+    return len(entries)
+
+
+def open_book(path: str):
+    """Opens the book at path, returns None for a missing or empty path"""
+    if not path or not os.path.exists(path):
+        return None
+    return OpeningBook(path)
@@ -0,0 +1,96 @@
+from collections import OrderedDict
+
+from lib.board import Board
+from lib.constants import *
+
+
+DEFAULT_CACHE_ENTRIES = 4096
+# rough memory use of the cached objects, used to bound the cache by memory
+ENTRY_BYTES = 400
+CHILD_BYTES = 120
+NODE_BYTES = 600
+
+
+class CacheEntry:
+    """Result of a search of a position with a given number of simulations"""
+    __slots__ = ['bestMove', 'visits', 'winRate', 'children', 'rootnode', 'size']
+
+    def __init__(self, rootnode, keep_tree: bool):
+        best_node = rootnode.get_most_visited_child()
+        self.bestMove: int = best_node.move if best_node is not None else NO_MOVE
+        self.visits: int = rootnode.visits
+        # win rate of the best move from the POV of the side to move
+        self.winRate: float = best_node.wins / best_node.visits if best_node is not None else 0.0
+        self.children: List[tuple] = [(c.move, c.visits, c.wins) for c in rootnode.childNodes]
+        self.rootnode = rootnode if keep_tree else None  # the whole tree to continue searching
+        self.size: int = ENTRY_BYTES + CHILD_BYTES * len(self.children)
+        if keep_tree:
+            self.size += NODE_BYTES * (rootnode.visits + 1)  # a search adds at most one node per simulation
+
+
+class ResultCache:
+    """In process cache of search results keyed by (posKey, simulations) with least recently used eviction.
+    It is bounded by the number of entries and, if max_bytes is given, by the estimated memory of the entries.
+    With keep_trees the search trees are cached as well: a search of a position with more simulations than a cached
+    one continues the cached tree (see take_tree) instead of starting from scratch.
+    """
+    def __init__(self, max_entries: int = DEFAULT_CACHE_ENTRIES, max_bytes: int = 0, keep_trees: bool = False):
+        self.maxEntries = max_entries
+        self.maxBytes = max_bytes
+        self.keepTrees = keep_trees
+        self.entries: OrderedDict = OrderedDict()  # (posKey, simulations) -> CacheEntry, least recently used first
+        self.budgets: Dict[int, set] = {}  # posKey -> simulations of its cached entries
+        self.memory = 0  # estimated bytes of all entries
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, pos: Board, simulations: int):
+        """Returns the CacheEntry of a search of pos with the given simulations or None"""
+        key = (pos.posKey.value, simulations)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def take_tree(self, pos: Board, simulations: int):
+        """Removes the cached entry of pos with the most simulations below the given ones that kept its tree and
+        returns the tree (its root node) to warm start a larger search, None if there is none.
+        """
+        pos_key = pos.posKey.value
+        budgets = [budget for budget in self.budgets.get(pos_key, ())
+                   if budget < simulations and self.entries[(pos_key, budget)].rootnode is not None]
+        if not budgets:
+            return None
+
+        entry = self._remove((pos_key, max(budgets)))
+        return entry.rootnode
+
+    def put(self, pos: Board, simulations: int, rootnode):
+        """Caches the result of the search of pos with the given simulations (rootnode is the searched tree)"""
+        key = (pos.posKey.value, simulations)
+        if key in self.entries:
+            self._remove(key)
+
+        entry = CacheEntry(rootnode, self.keepTrees)
+        self.entries[key] = entry
+        self.budgets.setdefault(key[0], set()).add(simulations)
+        self.memory += entry.size
+
+        while self.entries and (len(self.entries) > self.maxEntries or 0 < self.maxBytes < self.memory):
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: tuple) -> CacheEntry:
+        entry = self.entries.pop(key)
+        self.memory -= entry.size
+        budgets = self.budgets[key[0]]
+        budgets.discard(key[1])
+        if not budgets:
+            del self.budgets[key[0]]
+        return entry
@@ -1,7 +1,7 @@
 from lib.search import *
 
 
-def console_loop(pos: Board):
+def console_loop(pos: Board, book=None, tablebase=None):
     # InitHashTable(pos.HashTable)
 
     print("Welcome to Hugo In Console Mode!\n")
@@ -15,8 +15,11 @@ def console_loop(pos: Board):
     engine_side = BLACK
     pos.parse_fen(START_FEN)
 
+    ponder = False
+    search_root = None  # tree kept from pondering/previous searches for the current position
+
     while True:
-        if pos.side == engine_side and pos.get_result() is None:
+        if pos.side == engine_side and pos.get_result(pos.playerJustMoved) is None:
             # info.StartTime = time.time()
 
             # if moveTime != 0:
@@ -24,13 +27,36 @@ def console_loop(pos: Board):
             #     info.StopTime = moveTime
 
             # pos, info = SearchPosition(pos, info)
-            move = search_position(pos, simulations=1000)
+            move = book.get_move(pos) if book is not None else NO_MOVE
+            if move == NO_MOVE and tablebase is not None:
+                move = tablebase.get_best_move(pos)
+            if move != NO_MOVE:  # book & tablebase moves skip the search
+                search_root = None
+            else:
+                root = search_tree(pos, simulations=1000, rootnode=search_root, tablebase=tablebase)
+                move = root.get_most_visited_child().move
+                search_root = root.detach_child(move)
+
             print("\n\n***!! Hugo makes move {} !!***\n\n".format(pos.moveGenerator.print_move(move)))
             pos.make_move(move)
             print(pos)
 
+        # think on the opponent's time while waiting for their move
+        ponder_thread = None
+        if ponder and engine_side != BOTH and pos.side != engine_side and (
+                pos.get_result(pos.playerJustMoved) is None):
+            ponder_thread, ponder_info, search_root = start_pondering(pos, search_root)
+
         command = input("\nHugo > ")
+
+        if ponder_thread is not None:
+            stop_pondering(ponder_thread, ponder_info)
+
+        # only a move keeps the matching part of the tree (see below), any other command invalidates it
+        ponder_root, search_root = search_root, None
+
         if len(command) < 2:
+            search_root = ponder_root
             continue
 
         if "help" in command:
@@ -40,6 +66,8 @@ def console_loop(pos: Board):
             print("print - show board\n")
             print("post - show thinking\n")
             print("nopost - do not show thinking\n")
+            print("ponder - think on the opponent's time\n")
+            print("noponder - do not think on the opponent's time\n")
             print("new - start new game\n")
             print("mirror - prints the current position and then it's mirrored image.\n")
             print("setboard x - set position to fen x\n")
@@ -47,7 +75,7 @@ def console_loop(pos: Board):
             print("depth x - set depth to x\n")
             print("time x - set thinking time to x seconds (depth still applies if set)\n")
             print("view - show current depth and moveTime settings\n")
-            print("showline - show current move line so far\n")
+            print("showline - show the book moves of the current position\n")
             print("** note ** - to reset time and depth, set to 0\n")
             print("enter moves using b7b8q notation\n\n\n")
             continue
@@ -63,6 +91,15 @@ def console_loop(pos: Board):
             # info.Quit = True
             break
 
+        if "noponder" in command:
+            ponder = False
+            continue
+
+        if "ponder" in command:
+            ponder = True
+            search_root = ponder_root
+            continue
+
         if "post" in command == 0:
             # info.PostThinking = True
             continue
@@ -94,12 +131,16 @@ def console_loop(pos: Board):
             continue
 
         if "getres" in command:
-            print("Winner is: {}".format(pos.get_result()))
+            print("Winner is: {}".format(pos.get_result(pos.playerJustMoved)))
             continue
 
-        # if "showline" in command: TODO
-        #     print(GetBookMove(pos))
-        #     continue
+        if "showline" in command:
+            entries = book.get_entries(pos) if book is not None else []
+            for move_, weight in sorted(entries, key=lambda e: e[1], reverse=True):
+                print("{} {}".format(pos.moveGenerator.print_move(move_), weight))
+            if not entries:
+                print("no book moves")
+            continue
 
         if "depth" in command:
             # does not support depth
@@ -131,3 +172,5 @@ def console_loop(pos: Board):
             continue
 
         pos.make_move(move)
+        if ponder_root is not None:
+            search_root = ponder_root.detach_child(move)
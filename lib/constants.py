@@ -1,9 +1,11 @@
 from ctypes import c_uint64
-from random import getrandbits
+from random import Random
 from typing import List, Dict
 
 BOARD_SQUARE_NUMBER = 120
 MAX_GAME_MOVES = 2048  # maximum number halfmoves allowed
+# packed position: 64 squares x 4 bits + side, castle permissions, en passant square (64 based) & fifty move counter
+PACKED_POSITION_SIZE = 36
 PIECE_CHARACTER_STRING = ".PNBRQKpnbrqk"
 SIDE_CHAR = "wb-"
 START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
@@ -80,22 +82,25 @@ FILE_NOTATION_MAP = {
     "h": FILE_H,
 }
 
-# A map used to identify a piece's colour
-PIECE_COLOR_MAP: Dict[int, int] = {
-    EMPTY: BOTH,
-    WHITE_PAWN: WHITE,
-    WHITE_KNIGHT: WHITE,
-    WHITE_BISHOP: WHITE,
-    WHITE_ROOK: WHITE,
-    WHITE_QUEEN: WHITE,
+# The piece tables below are flat lists indexed by the content of a board square. They cover everything up to
+# OFF_BOARD so that squares off the board can be looked up without checking for them first.
+PIECE_TABLE_SIZE = OFF_BOARD + 1
+
+
+def _get_piece_table(default, values: Dict[int, object]) -> List:
+    table = [default] * PIECE_TABLE_SIZE
+    for piece, value in values.items():
+        table[piece] = value
+    return table
+
+
+# A map used to identify a piece's colour (BOTH for empty & off board squares)
+PIECE_COLOR_MAP: List[int] = _get_piece_table(BOTH, {
+    WHITE_PAWN: WHITE, WHITE_KNIGHT: WHITE, WHITE_BISHOP: WHITE, WHITE_ROOK: WHITE, WHITE_QUEEN: WHITE,
     WHITE_KING: WHITE,
-    BLACK_PAWN: BLACK,
-    BLACK_KNIGHT: BLACK,
-    BLACK_BISHOP: BLACK,
-    BLACK_ROOK: BLACK,
-    BLACK_QUEEN: BLACK,
+    BLACK_PAWN: BLACK, BLACK_KNIGHT: BLACK, BLACK_BISHOP: BLACK, BLACK_ROOK: BLACK, BLACK_QUEEN: BLACK,
     BLACK_KING: BLACK,
-}
+})
 
 SIDE_TO_PLAYER_MAP: Dict[int, int] = {
     WHITE: PLAYER_WHITE,
@@ -103,136 +108,23 @@ SIDE_TO_PLAYER_MAP: Dict[int, int] = {
 }
 
 # --- Maps used to quickly resolve the type of a piece regardless of its colour
-IS_PIECE_KNIGHT: Dict[int, bool] = {
-    EMPTY: False,
-    WHITE_PAWN: False,
-    WHITE_KNIGHT: True,
-    WHITE_BISHOP: False,
-    WHITE_ROOK: False,
-    WHITE_QUEEN: False,
-    WHITE_KING: False,
-    BLACK_PAWN: False,
-    BLACK_KNIGHT: True,
-    BLACK_BISHOP: False,
-    BLACK_ROOK: False,
-    BLACK_QUEEN: False,
-    BLACK_KING: False,
-}
-
-IS_PIECE_KING: Dict[int, bool] = {
-    EMPTY: False,
-    WHITE_PAWN: False,
-    WHITE_KNIGHT: False,
-    WHITE_BISHOP: False,
-    WHITE_ROOK: False,
-    WHITE_QUEEN: False,
-    WHITE_KING: True,
-    BLACK_PAWN: False,
-    BLACK_KNIGHT: False,
-    BLACK_BISHOP: False,
-    BLACK_ROOK: False,
-    BLACK_QUEEN: False,
-    BLACK_KING: True,
-}
-
-IS_PIECE_ROOK_QUEEN: Dict[int, bool] = {
-    EMPTY: False,
-    WHITE_PAWN: False,
-    WHITE_KNIGHT: False,
-    WHITE_BISHOP: False,
-    WHITE_ROOK: True,
-    WHITE_QUEEN: True,
-    WHITE_KING: False,
-    BLACK_PAWN: False,
-    BLACK_KNIGHT: False,
-    BLACK_BISHOP: False,
-    BLACK_ROOK: True,
-    BLACK_QUEEN: True,
-    BLACK_KING: False,
-}
-
-IS_PIECE_BISHOP_QUEEN: Dict[int, bool] = {
-    EMPTY: False,
-    WHITE_PAWN: False,
-    WHITE_KNIGHT: False,
-    WHITE_BISHOP: True,
-    WHITE_ROOK: False,
-    WHITE_QUEEN: True,
-    WHITE_KING: False,
-    BLACK_PAWN: False,
-    BLACK_KNIGHT: False,
-    BLACK_BISHOP: True,
-    BLACK_ROOK: False,
-    BLACK_QUEEN: True,
-    BLACK_KING: False,
-}
-
-IS_PIECE_PAWN: Dict[int, bool] = {
-    EMPTY: False,
-    WHITE_PAWN: True,
-    WHITE_KNIGHT: False,
-    WHITE_BISHOP: False,
-    WHITE_ROOK: False,
-    WHITE_QUEEN: False,
-    WHITE_KING: False,
-    BLACK_PAWN: True,
-    BLACK_KNIGHT: False,
-    BLACK_BISHOP: False,
-    BLACK_ROOK: False,
-    BLACK_QUEEN: False,
-    BLACK_KING: False,
-}
-
-IS_PIECE_SLIDING: Dict[int, bool] = {
-    EMPTY: False,
-    WHITE_PAWN: False,
-    WHITE_KNIGHT: False,
-    WHITE_BISHOP: True,
-    WHITE_ROOK: True,
-    WHITE_QUEEN: True,
-    WHITE_KING: False,
-    BLACK_PAWN: False,
-    BLACK_KNIGHT: False,
-    BLACK_BISHOP: True,
-    BLACK_ROOK: True,
-    BLACK_QUEEN: True,
-    BLACK_KING: False,
-}
-
-
-# squares increment for each direction of movement
-PIECE_MOVEMENT_INCREMENT: Dict[int, List[int]] = {
-    EMPTY: [0, 0, 0, 0, 0, 0, 0],
-    WHITE_PAWN: [0, 0, 0, 0, 0, 0, 0],
-    WHITE_KNIGHT: [-8, -19, -21, -12, 8, 19, 21, 12],
-    WHITE_BISHOP: [-9, -11, 11, 9, 0, 0, 0, 0],
-    WHITE_ROOK: [-1, -10, 1, 10, 0, 0, 0, 0],
-    WHITE_QUEEN: [-1, -10, 1, 10, -9, -11, 11, 9],
-    WHITE_KING: [-1, -10, 1, 10, -9, -11, 11, 9],
-    BLACK_PAWN: [0, 0, 0, 0, 0, 0, 0],
-    BLACK_KNIGHT: [-8, -19, -21, -12, 8, 19, 21, 12],
-    BLACK_BISHOP: [-9, -11, 11, 9, 0, 0, 0, 0],
-    BLACK_ROOK: [-1, -10, 1, 10, 0, 0, 0, 0],
-    BLACK_QUEEN: [-1, -10, 1, 10, -9, -11, 11, 9],
-    BLACK_KING: [-1, -10, 1, 10, -9, -11, 11, 9],
-}
-
-# number of directions in which each piece can move
-DIRECTIONS_OF_MOVEMENT: Dict[int, int] = {
-    EMPTY: 0,
-    WHITE_PAWN: 0,
-    WHITE_KNIGHT: 8,
-    WHITE_BISHOP: 4,
-    WHITE_ROOK: 4,
-    WHITE_QUEEN: 8,
-    WHITE_KING: 8,
-    BLACK_PAWN: 0,
-    BLACK_KNIGHT: 8,
-    BLACK_BISHOP: 4,
-    BLACK_ROOK: 4,
-    BLACK_QUEEN: 8,
-    BLACK_KING: 8,
-}
+IS_PIECE_KNIGHT: List[bool] = _get_piece_table(False, {WHITE_KNIGHT: True, BLACK_KNIGHT: True})
+IS_PIECE_KING: List[bool] = _get_piece_table(False, {WHITE_KING: True, BLACK_KING: True})
+IS_PIECE_ROOK_QUEEN: List[bool] = _get_piece_table(False, {
+    WHITE_ROOK: True, WHITE_QUEEN: True, BLACK_ROOK: True, BLACK_QUEEN: True})
+IS_PIECE_BISHOP_QUEEN: List[bool] = _get_piece_table(False, {
+    WHITE_BISHOP: True, WHITE_QUEEN: True, BLACK_BISHOP: True, BLACK_QUEEN: True})
+IS_PIECE_PAWN: List[bool] = _get_piece_table(False, {WHITE_PAWN: True, BLACK_PAWN: True})
+IS_PIECE_SLIDING: List[bool] = _get_piece_table(False, {
+    WHITE_BISHOP: True, WHITE_ROOK: True, WHITE_QUEEN: True, BLACK_BISHOP: True, BLACK_ROOK: True, BLACK_QUEEN: True})
+
+# pieces of each side indexed by side, i.e. KNIGHT_OF_SIDE[BLACK] == BLACK_KNIGHT
+PAWN_OF_SIDE = [WHITE_PAWN, BLACK_PAWN]
+KNIGHT_OF_SIDE = [WHITE_KNIGHT, BLACK_KNIGHT]
+BISHOP_OF_SIDE = [WHITE_BISHOP, BLACK_BISHOP]
+ROOK_OF_SIDE = [WHITE_ROOK, BLACK_ROOK]
+QUEEN_OF_SIDE = [WHITE_QUEEN, BLACK_QUEEN]
+KING_OF_SIDE = [WHITE_KING, BLACK_KING]
 
 # KnightDir Squares increment to find places where the knight will be attacking the current piece
 # For example if we want to check if square 55 (e4) is attacked. We need to check if there is a
@@ -248,6 +140,49 @@ KING_MOVE_INCREMENT = [-1, -10, 1, 10, -9, -11, 11, 9]
 WHITE_KING_CASTLING, WHITE_QUEEN_CASTLING, BLACK_KING_CASTLING, BLACK_QUEEN_CASTLING = [2**x for x in range(4)]
 
 
+def _is_square_on_board(sq: int) -> bool:
+    return A1 <= sq <= H8 and FILE_A <= sq % 10 - 1 <= FILE_H
+
+
+def _get_rays(increments: List[int], sliding: bool) -> List[List[List[int]]]:
+    """Returns for every square of the 120 square board the list of rays (target squares in the order they are
+    reached) in the directions of increments. Rays are truncated at the edge of the board and non sliding pieces
+    have one square rays. Squares off the board have no rays.
+    """
+    rays = []
+    for sq in range(BOARD_SQUARE_NUMBER):
+        square_rays = []
+        for dir_ in increments if _is_square_on_board(sq) else []:
+            ray = []
+            target_sq = sq + dir_
+            while _is_square_on_board(target_sq):
+                ray.append(target_sq)
+                if not sliding:
+                    break
+                target_sq += dir_
+            if ray:
+                square_rays.append(ray)
+        rays.append(square_rays)
+    return rays
+
+
+# Precomputed targets per square of the 120 square board
+KNIGHT_TARGETS: List[List[int]] = [[ray[0] for ray in rays] for rays in _get_rays(KNIGHT_MOVE_INCREMENT, False)]
+KING_TARGETS: List[List[int]] = [[ray[0] for ray in rays] for rays in _get_rays(KING_MOVE_INCREMENT, False)]
+ROOK_RAYS: List[List[List[int]]] = _get_rays(ROOK_MOVE_INCREMENT, True)
+BISHOP_RAYS: List[List[List[int]]] = _get_rays(BISHOP_MOVE_INCREMENT, True)
+QUEEN_RAYS: List[List[List[int]]] = [rook + bishop for rook, bishop in zip(ROOK_RAYS, BISHOP_RAYS)]
+
+# rays of sliding pieces & targets of non sliding pieces (per piece, per square)
+SLIDING_RAYS: List[List[List[List[int]]]] = _get_piece_table([], {
+    WHITE_BISHOP: BISHOP_RAYS, WHITE_ROOK: ROOK_RAYS, WHITE_QUEEN: QUEEN_RAYS,
+    BLACK_BISHOP: BISHOP_RAYS, BLACK_ROOK: ROOK_RAYS, BLACK_QUEEN: QUEEN_RAYS,
+})
+NON_SLIDING_TARGETS: List[List[List[int]]] = _get_piece_table([], {
+    WHITE_KNIGHT: KNIGHT_TARGETS, WHITE_KING: KING_TARGETS, BLACK_KNIGHT: KNIGHT_TARGETS, BLACK_KING: KING_TARGETS,
+})
+
+
 def get_2d_list(num_lists, size_lists, default_val) -> List[List[int]]:
     """Generate a NON linked list of lists"""
     main_list = []
@@ -258,6 +193,9 @@ def get_2d_list(num_lists, size_lists, default_val) -> List[List[int]]:
     return main_list
 
 
+ZOBRIST_SEED = 0x48756730  # seed of the position hashkeys, changing it invalidates all stored positions
+
+
 class HashData:
     def __init__(self):
         # Hashkeys for each piece for each possible position for the key
@@ -292,15 +230,19 @@ class HashData:
             15, 15, 15, 15, 15, 15, 15, 15, 15, 15]
 
     def _fill_values(self):
-        """initializes hashkeys for all pieces and possible positions, for castling rights, for side to move"""
+        """initializes hashkeys for all pieces and possible positions, for castling rights, for side to move.
+        The keys come from a generator with a fixed seed so that a position has the same key in every Board,
+        process and run (position keys are stored on disk and shared between processes)
+        """
+        generator = Random(ZOBRIST_SEED)
 
         for piece in range(13):
             for square in range(BOARD_SQUARE_NUMBER):
-                self.pieceKeys[piece][square] = getrandbits(64)  # returns a random 64 bit number
+                self.pieceKeys[piece][square] = generator.getrandbits(64)  # returns a random 64 bit number
 
-        self.sideKey = getrandbits(64)
+        self.sideKey = generator.getrandbits(64)
         for i in range(16):
-            self.castleKeys[i] = getrandbits(64)
+            self.castleKeys[i] = generator.getrandbits(64)
 
     #  -= 1- Hashing 'macros'  -= 1-
     def hash_piece(self, piece: int, sq: int, pos):
@@ -348,3 +290,34 @@ MOVE_FLAG_CASTLE = 0x1000000  # move flag that denotes if move was castling
 # move flag that denotes if move was capture without saying what the capture was (checks capture & enpas squares)
 MOVE_FLAG_CAPTURE = 0x7C000
 MOVE_FLAG_PROMOTION = 0xF00000  # move flag that denotes if move was promotion without saying what the promotion was
+
+def _get_line_directions() -> List[List[int]]:
+    line_directions = [[0] * BOARD_SQUARE_NUMBER for _ in range(BOARD_SQUARE_NUMBER)]
+    for sq, rays in enumerate(QUEEN_RAYS):
+        for ray in rays:
+            for target_sq in ray:
+                line_directions[sq][target_sq] = ray[0] - sq
+    return line_directions
+
+
+# LINE_DIRECTION[a][b] - increment of the queen direction that leads from square a to square b (0 if they are not on
+# a common line or diagonal)
+LINE_DIRECTION: List[List[int]] = _get_line_directions()
+
+
+def _get_xray_lines() -> List[List[tuple]]:
+    xray_lines = []
+    for sq, rays in enumerate(QUEEN_RAYS):
+        rays_by_direction = {ray[0] - sq: ray for ray in rays}
+        lines = []
+        for dir_, ray in rays_by_direction.items():
+            if -dir_ in rays_by_direction:
+                slider = IS_PIECE_ROOK_QUEEN if dir_ in ROOK_MOVE_INCREMENT else IS_PIECE_BISHOP_QUEEN
+                lines.append((ray, rays_by_direction[-dir_], slider))
+        xray_lines.append(lines)
+    return xray_lines
+
+
+# For every square the lines through it: (ray in one direction, ray in the opposite direction, predicate of the
+# sliding pieces that move along the line). A slider found on the first ray attacks the second one through the square.
+XRAY_LINES: List[List[tuple]] = _get_xray_lines()
@@ -0,0 +1,223 @@
+import json
+import selectors
+import socket
+import socketserver
+import threading
+import time
+
+from lib.board import Board
+from lib.constants import *
+from lib.mcts import uct_search
+
+
+# Root parallel search over TCP: every worker searches the same root position with its own tree and streams the
+# statistics of the root children to the coordinator, which merges them and tells all workers to stop.
+# Messages are json objects, one per line:
+#   coordinator -> worker: {"cmd": "search", "fen": ..., "moves": ["e2e4", ...], "simulations": n}, {"cmd": "stop"}
+#   worker -> coordinator: {"type": "stats" | "done", "visits": n, "proven": result or null,
+#                           "children": [[move, visits, wins, proven], ...]} or {"type": "error", "error": ...}
+
+DEFAULT_WORKER_PORT = 9077
+REPORT_INTERVAL = 0.5  # seconds between two statistics messages of a worker
+
+
+class DistributedResult:
+    """Root children statistics merged over all workers"""
+    __slots__ = ['children', 'visits', 'proven', 'workers']
+
+    def __init__(self):
+        self.children: Dict[int, List[float]] = {}  # move -> [visits, wins, proven]
+        self.visits: int = 0
+        self.proven = None  # proven result of the root (POV of the player that just moved) if any worker proved it
+        self.workers: int = 0  # number of workers that reported
+
+    def get_best_move(self) -> int:
+        """Returns the move with the most visits over all workers (a proven win first, see
+        Node.get_most_visited_child) or NO_MOVE if no worker expanded a move
+        """
+        if not self.children:
+            return NO_MOVE
+        return max(self.children, key=lambda move: (self.children[move][2] != LOSS, self.children[move][2] == WIN,
+                                                    self.children[move][0]))
+
+
+def _send(stream, message: dict):
+    stream.write((json.dumps(message) + "\n").encode())
+    stream.flush()
+
+
+def _get_stats(rootnode, message_type: str) -> dict:
+    return {"type": message_type, "visits": rootnode.visits, "proven": rootnode.proven,
+            "children": [[c.move, c.visits, c.wins, c.proven] for c in rootnode.childNodes]}
+
+
+def setup_position(pos: Board, fen: str, moves) -> bool:
+    """Sets up the position after the moves (in coordinate notation) from fen. Returns False for an illegal move."""
+    pos.parse_fen(fen)
+    for move_str in moves:
+        move = pos.parse_move(move_str) if len(move_str) >= 4 else NO_MOVE
+        if move == NO_MOVE:
+            return False
+        pos.make_move(move)
+    return True
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+    """Runs one search per connection: waits for the search command, searches until the simulations are done or
+    the coordinator sends stop and reports the statistics of the root children every REPORT_INTERVAL seconds.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        request = json.loads(line)
+        if request.get("cmd") != "search":
+            return
+
+        pos = Board()
+        if not setup_position(pos, request["fen"], request.get("moves", [])):
+            _send(self.wfile, {"type": "error", "error": "illegal move"})
+            return
+
+        # the stop command arrives while this thread searches -> read it in another thread
+        stop = threading.Event()
+
+        def wait_for_stop():
+            try:
+                for stop_line in self.rfile:
+                    if json.loads(stop_line).get("cmd") == "stop":
+                        break
+            except (OSError, ValueError):  # the connection was closed after the search
+                pass
+            stop.set()  # stop as well when the coordinator goes away
+
+        threading.Thread(target=wait_for_stop, daemon=True).start()
+
+        last_report = time.time()
+
+        def on_iteration(rootnode, _) -> bool:
+            nonlocal last_report
+            if time.time() - last_report >= REPORT_INTERVAL:
+                last_report = time.time()
+                _send(self.wfile, _get_stats(rootnode, "stats"))
+            return stop.is_set()
+
+        rootnode = uct_search(pos, request["simulations"], on_iteration=on_iteration)
+        _send(self.wfile, _get_stats(rootnode, "done"))
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def create_worker_server(host: str = "", port: int = DEFAULT_WORKER_PORT) -> WorkerServer:
+    """Returns a worker server listening on host:port (port 0 picks a free port, see server_address).
+    Run it with serve_forever().
+    """
+    return WorkerServer((host, port), WorkerHandler)
+
+
+class _WorkerConnection:
+    def __init__(self, address):
+        self.socket = socket.create_connection(address)
+        self.wfile = self.socket.makefile("wb")
+        self.buffer = b""  # received data up to an incomplete line
+        self.stats: dict = None  # the last statistics the worker sent
+        self.done = False
+
+    def read_messages(self) -> list:
+        """Reads what the worker sent (the socket must be readable) and returns the complete messages"""
+        data = self.socket.recv(1 << 16)
+        if not data:
+            return [{"type": "error", "error": "connection closed"}]
+
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b"\n")
+        return [json.loads(line) for line in lines]
+
+    def close(self):
+        self.wfile.close()
+        self.socket.close()
+
+
+def _merge(connections) -> DistributedResult:
+    result = DistributedResult()
+    for connection in connections:
+        if connection.stats is None:
+            continue
+
+        result.workers += 1
+        result.visits += connection.stats["visits"]
+        if connection.stats["proven"] is not None:
+            result.proven = connection.stats["proven"]
+
+        for move, visits, wins, proven in connection.stats["children"]:
+            merged = result.children.setdefault(move, [0, 0.0, None])
+            merged[0] += visits
+            merged[1] += wins
+            if proven is not None:
+                merged[2] = proven
+
+    return result
+
+
+def run_coordinator(workers, fen: str = START_FEN, moves=(), simulations=10000, move_time=0.0,
+                    on_update=None) -> DistributedResult:
+    """Searches the position after moves from fen on all workers ((host, port) addresses) at once.
+    The simulations are split evenly between the workers. All workers are stopped when the time (seconds, 0 - no
+    limit) is up or a worker proved the root. on_update is called with the merged DistributedResult whenever a worker
+    reports. Returns the merged statistics once every worker finished. Unreachable workers raise OSError.
+    """
+    connections = [_WorkerConnection(address) for address in workers]
+    start_time = time.time()
+    stopped = False
+
+    def stop_all():
+        for connection in connections:
+            if not connection.done:
+                try:
+                    _send(connection.wfile, {"cmd": "stop"})
+                except OSError:
+                    connection.done = True
+
+    selector = selectors.DefaultSelector()
+    try:
+        share = max(1, -(-simulations // len(connections)))
+        for connection in connections:
+            _send(connection.wfile, {"cmd": "search", "fen": fen, "moves": list(moves), "simulations": share})
+            selector.register(connection.socket, selectors.EVENT_READ, connection)
+
+        while not all(connection.done for connection in connections):
+            timeout = None
+            if move_time > 0 and not stopped:
+                timeout = max(0.0, start_time + move_time - time.time())
+
+            for key, _ in selector.select(timeout):
+                connection = key.data
+                for message in connection.read_messages():
+                    if message["type"] != "error":
+                        connection.stats = message
+                    if message["type"] != "stats":
+                        connection.done = True
+                        selector.unregister(connection.socket)
+                        break
+
+                merged = _merge(connections)
+                if on_update is not None:
+                    on_update(merged)
+                if not stopped and merged.proven is not None:
+                    stopped = True
+                    stop_all()
+
+            if not stopped and move_time > 0 and time.time() - start_time >= move_time:
+                stopped = True
+                stop_all()
+    finally:
+        selector.close()
+        for connection in connections:
+            connection.close()
+
+    return _merge(connections)
@@ -1,4 +1,7 @@
 from ctypes import c_uint64
+from typing import List
+
+from lib.constants import WHITE, BLACK
 
 
 class Undo:
@@ -13,3 +16,27 @@ class Undo:
         self.enPassantSquare: int = 0
         self.fiftyMove: int = 0
         self.posKey: c_uint64 = 0
+
+
+class BoardSnapshot:
+    """Copy of the position state of a board at a given ply (see Board.get_snapshot and Board.rewind).
+    The history below the ply is not copied, it is still valid on the board as long as only moves made after
+    the snapshot are undone.
+    """
+    __slots__ = ['histPly', 'pieces', 'pieceNumber', 'kingSquare', 'side', 'playerJustMoved', 'castlePermissions',
+                 'enPassantSquare', 'fiftyMove', 'posKey', 'attackMaps']
+
+    def __init__(self, board):
+        self.histPly: int = board.histPly
+        self.pieces: List[int] = board.pieces[:]
+        self.pieceNumber: List[int] = board.pieceNumber[:]
+        self.kingSquare: List[int] = board.kingSquare[:]
+        self.side: int = board.side
+        self.playerJustMoved: int = board.playerJustMoved
+        self.castlePermissions: int = board.castlePermissions
+        self.enPassantSquare: int = board.enPassantSquare
+        self.fiftyMove: int = board.fiftyMove
+        self.posKey: c_uint64 = board.posKey  # keys are replaced, never changed in place
+        self.attackMaps: List[List[int]] = None
+        if board.attackMaps is not None:
+            self.attackMaps = [board.attackMaps[WHITE][:], board.attackMaps[BLACK][:]]
@@ -15,12 +15,36 @@
 # 
 # For more information about Monte Carlo Tree Search check out our web site at www.mcts.ai
 import time
+from array import array
 from math import *
 import random
 from multiprocessing import Queue, Process
 from operator import itemgetter
 
 from lib.board import Board
+from lib.constants import WHITE, WIN, LOSS, MOVE_FLAG_PROMOTION
+from lib.movegenerator import new_move_buffer
+from lib.pgn import write_game
+from lib.rollout import RandomRollout, get_move_prior
+from lib.selection import RAVE, TABLE_SIZE, UCB1
+from lib.sharedtable import SharedTable
+
+
+# progressive widening: a node with n visits may have up to 1 + WIDENING_FACTOR * n ** WIDENING_EXPONENT children
+WIDENING_FACTOR = 1.0
+WIDENING_EXPONENT = 0.5
+# the number of children allowed by the visits of a node, looked up for the visit counts of the table
+WIDENING_TABLE = array('d', [1 + WIDENING_FACTOR * n ** WIDENING_EXPONENT for n in range(TABLE_SIZE)])
+
+PROVEN_IDLE_INTERVAL = 0.05  # seconds between two calls of on_iteration while waiting on a proven root
+
+AMAF_MOVE_MASK = 0x3fff | MOVE_FLAG_PROMOTION  # from, to and promotion: the same move in any later position
+
+DEFAULT_SELECTION_POLICY = UCB1()
+
+# a new node whose position was simulated this often by other searches (see SharedTable) backs up their mean result
+# instead of a rollout of its own
+TABLE_MIN_VISITS = 8
 
 
 class GameState:
@@ -55,90 +79,199 @@ class GameState:
 
 class Node:
     """ A node in the game tree. Note wins is always from the viewpoint of playerJustMoved.
-        Crashes if state not specified.
+        Crashes if neither state nor player_just_moved (e.g. for a tree loaded from disk) is specified.
     """
 
-    def __init__(self, move=None, parent=None, state=None):
+    def __init__(self, move=None, parent=None, state=None, player_just_moved=None):
         self.move = move  # the move that got us to this node - "None" for the root node
         self.parentNode = parent  # "None" for the root node
         self.childNodes = []
         self.wins = 0
         self.visits = 0
-        self.untriedMoves = state.get_moves()  # future child nodes
-        self.playerJustMoved = state.playerJustMoved  # the only part of the state that the Node needs later
+        self.untriedMoves = None  # future child nodes, generated when the node is expanded for the first time
+        # the only part of the state that the Node needs later
+        self.playerJustMoved = state.playerJustMoved if state is not None else player_just_moved
+        assert self.playerJustMoved is not None
+        self.proven = None  # game theoretic result from the viewpoint of playerJustMoved once solved
+        self.provenByHistory = False  # the proof depends on the moves played before (repetition, fifty move rule)
+        self.squaredWins = 0  # sum of the squared results for the variance of UCB1-Tuned
+        self.amafWins = 0  # all-moves-as-first statistics, only updated by RAVE searches
+        self.amafVisits = 0
+        self.prior = 1.0  # probability of the move by the expansion order prior, used by PUCT
+        self.movePriors = None  # priors of the untried moves, in the order of untriedMoves
+
+    def uct_select_child(self, policy=None):
+        """ Select the child to descend into with a selection policy (see lib.selection), UCB1 with the exploration
+            constant sqrt(2) by default.
+        """
+        return (policy or DEFAULT_SELECTION_POLICY).select_child(self)
 
-    def uct_select_child(self):
-        """ Use the UCB1 formula to select a child node. Often a constant UCTK is applied so we have
-            lambda c: c.wins/c.visits + UCTK * sqrt(2*log(self.visits)/c.visits to vary the amount of
-            exploration versus exploitation.
+    def can_expand(self, state):
+        """ Return True if a child should be added to this node (state is the position of the node).
+            The untried moves are generated on the first call, best prior last (see get_expansion_order),
+            and progressive widening limits the number of children by the visits of the node.
         """
-        s = sorted(self.childNodes, key=lambda c: c.wins / c.visits + sqrt(2 * log(self.visits) / c.visits))[-1]
-        return s
+        if self.untriedMoves is None:
+            self.untriedMoves, self.movePriors = get_expansion_order(state)
+            for c in self.childNodes:  # a node loaded from disk already has children but no untried moves
+                self._pop_untried_move(c.move)
+        visits = self.visits
+        return bool(self.untriedMoves) and len(self.childNodes) < (
+            WIDENING_TABLE[visits] if visits < TABLE_SIZE else 1 + WIDENING_FACTOR * visits ** WIDENING_EXPONENT)
 
     def add_child(self, m, s):
         """ Remove m from untriedMoves and add a new child node for this move.
             Return the added child node
         """
         n = Node(move=m, parent=self, state=s)
-        self.untriedMoves.remove(m)
+        prior = self._pop_untried_move(m)
+        if prior is not None:
+            n.prior = prior
         self.childNodes.append(n)
         return n
 
+    def _pop_untried_move(self, m):
+        # the move with the best prior is expanded first and comes from the end of the list
+        moves = self.untriedMoves
+        index = len(moves) - 1 if moves[-1] == m else moves.index(m)
+        del moves[index]
+        return self.movePriors.pop(index) if self.movePriors is not None else None
+
     def update(self, result):
         """ Update this node - one additional visit and result additional wins. result must be from
             the viewpoint of playerJustmoved.
         """
         self.visits += 1
         self.wins += result
+        self.squaredWins += result * result
+
+    def solve(self):
+        """ Return the proven result of this node (from the viewpoint of playerJustMoved) if its children prove it
+            or None. The player to move wins if any move wins and needs every move expanded and proven otherwise.
+        """
+        best = None  # best proven result for the player to move
+        unproven = False
+        for c in self.childNodes:
+            if c.proven is None:
+                unproven = True
+            elif c.proven == WIN:
+                return LOSS
+            elif best is None or c.proven > best:
+                best = c.proven
+
+        if unproven or self.untriedMoves is None or self.untriedMoves or best is None:
+            return None
+        return 1.0 - best
+
+    def set_proven(self, result, by_history=False):
+        """ Mark this node as solved with result (from the viewpoint of playerJustMoved) and propagate the
+            proof to the ancestors that are solved by it. by_history marks a proof that depends on the moves
+            played before the position (a draw by repetition or the fifty move rule), the proofs of the ancestors
+            depend on it if any of their proven children does.
+        """
+        self.proven = result
+        self.provenByHistory = by_history
+        node = self.parentNode
+        while node is not None and node.proven is None:
+            result = node.solve()
+            if result is None:
+                break
+            node.proven = result
+            node.provenByHistory = any(c.provenByHistory for c in node.childNodes)
+            node = node.parentNode
 
     def __repr__(self):
         return "[M:" + str(self.move) + " W/V:" + str(self.wins) + "/" + str(self.visits) + " U:" + str(
             self.untriedMoves) + "]"
 
+    def iter_tree(self):
+        """ Yield (node, depth below this node) for every node of the tree in depth first pre-order (children in the
+            order they were expanded). Walks with an explicit stack, so deep trees can not exhaust the call stack.
+        """
+        stack = [(self, 0)]
+        while stack:
+            node, depth = stack.pop()
+            yield node, depth
+            children = node.childNodes
+            for i in range(len(children) - 1, -1, -1):
+                stack.append((children[i], depth + 1))
+
+    def iter_tree_lines(self, indent=0):
+        """ Yield the lines of convert_tree_to_string one node at a time (e.g. to write a large tree to a file).
+        """
+        for node, depth in self.iter_tree():
+            yield self.get_indent_string(indent + depth) + str(node)
+
     def convert_tree_to_string(self, indent):
-        s = self.get_indent_string(indent) + str(self)
-        for c in self.childNodes:
-            s += c.convert_tree_to_string(indent + 1)
-        return s
+        return "".join(self.iter_tree_lines(indent))
 
     @staticmethod
     def get_indent_string(indent):
-        s = "\n"
-        for i in range(1, indent + 1):
-            s += "| "
-        return s
+        return "\n" + "| " * indent
 
-    def convert_children_to_string(self):
-        s = ""
+    def detach_child(self, move):
+        """ Return the child node for move as the root of a new tree (the rest of the tree is discarded)
+            or None if the move was never expanded.
+        """
         for c in self.childNodes:
-            s += str(c) + "\n"
-        return s
+            if c.move == move:
+                c.parentNode = None
+                return c
+        return None
+
+    def get_most_visited_child(self):
+        """ Return the child with the most visits (the move we would play now) or None if nothing was expanded.
+            A proven win is always preferred and proven losses are avoided while there is another move.
+        """
+        if not self.childNodes:
+            return None
+        return max(self.childNodes, key=lambda c: (c.proven != LOSS, c.proven == WIN, c.visits))
+
+    def get_principal_variation(self):
+        """ Return the list of moves obtained by following the most visited child from this node downwards.
+        """
+        pv = []
+        node = self.get_most_visited_child()
+        while node is not None:
+            pv.append(node.move)
+            node = node.get_most_visited_child()
+        return pv
+
+    def convert_children_to_string(self):
+        return "".join(str(c) + "\n" for c in self.childNodes)
 
 
-def uct_multi(rootstate: Board, itermax):
+def uct_multi(rootstate: Board, itermax, rollout_policy=None):
+    """ Search every root move in a process of its own and return the move that leaves the opponent the worst
+        best reply. The processes share their statistics and proofs through a SharedTable.
+    """
     moves = rootstate.get_moves()
     if len(moves) == 1:
         return moves[0]
 
     avg_iters = itermax // len(moves)
     queue = Queue()
+    table = SharedTable()
 
     processes = []
-    for move in moves:
-        current_state = rootstate.__copy__()
-        current_state.make_move(move)
-        result = current_state.get_result(current_state.playerJustMoved ^ 1)
-        if result is not None:
-            print(f'Immediate result. Move: {rootstate.moveGenerator.print_move(move)}, score: {result}')
-            queue.put((move, result, 1))
-            continue  # here 1 referes to number of visits
-
-        p = Process(target=uct, args=(queue, move, current_state, avg_iters))
-        p.start()
-        processes.append(p)
-
-    for process in processes:
-        process.join()
+    try:
+        for move in moves:
+            current_state = rootstate.__copy__()
+            current_state.make_move(move)
+            result = current_state.get_result(current_state.playerJustMoved ^ 1)
+            if result is not None:
+                print(f'Immediate result. Move: {rootstate.moveGenerator.print_move(move)}, score: {result}')
+                queue.put((move, result, 1))
+                continue  # here 1 referes to number of visits
+
+            p = Process(target=uct, args=(queue, move, current_state, avg_iters, rollout_policy, table))
+            p.start()
+            processes.append(p)
+
+        for process in processes:
+            process.join()
+    finally:
+        table.close()  # frees the shared memory even if a process could not be started or joined
     # for move in moves:
     #     state = rootstate.__copy__()
     #     state.make_move(move)
@@ -156,78 +289,194 @@ def uct_multi(rootstate: Board, itermax):
     return best_move
 
 
+def get_expansion_order(state):
+    """ Return the legal moves of state in the order they are expanded from the end of the list (captures,
+        promotions and checks by their prior, see lib.rollout.get_move_prior, and the rest at random) and an array
+        with the probability of each move in the same order: its prior plus one, normalized over all moves.
+    """
+    moves = state.get_moves()
+    random.shuffle(moves)
+    scored = sorted([(get_move_prior(state, m) + 1, m) for m in moves], key=itemgetter(0))  # equal stay shuffled
+
+    total = sum(score for score, _ in scored)
+    return [m for _, m in scored], array('f', [score / total for score, _ in scored])
+
+
+def update_amaf(node, moves, depth, result):
+    """ Update the all-moves-as-first statistics of the children along the path from node up to the root.
+        moves are all moves of the simulation from the root, node is depth plies below the root and result is from
+        the viewpoint of node.playerJustMoved. A child is updated if its move was played later by the same side.
+    """
+    played = (set(), set())  # moves played from depth onwards by ply parity
+    for ply in range(depth, len(moves)):
+        played[ply & 1].add(moves[ply] & AMAF_MOVE_MASK)
+
+    while node is not None:
+        child_result = 1.0 - result  # the children moved for the opponent of node.playerJustMoved
+        moves_of_side = played[depth & 1]
+        for c in node.childNodes:
+            if (c.move & AMAF_MOVE_MASK) in moves_of_side:
+                c.amafVisits += 1
+                c.amafWins += child_result
+
+        node = node.parentNode
+        result = child_result
+        depth -= 1
+        if depth >= 0:
+            played[depth & 1].add(moves[depth] & AMAF_MOVE_MASK)
+
+
 def rand_choice(x):  # fastest way to get random item from list
     return x[int(random.random() * len(x))]
 
 
-def uct(queue: Queue, move_origin, rootstate, itermax):
-    """ Conduct a UCT search for itermax iterations starting from rootstate.
-        Return the best move from the rootstate.
-        Assumes 2 alternating players (player 1 starts), with game results in the range [0.0, 1.0]."""
+def uct(queue: Queue, move_origin, rootstate, itermax, rollout_policy=None, table=None):
+    """ Conduct a UCT search for itermax iterations starting from rootstate and put the statistics of
+        the most visited child into the queue (used as a process target by uct_multi).
+        rollout_policy (see lib.rollout) picks the rollout moves, uniformly random moves by default.
+        table is the SharedTable of all processes of the search, if any.
+    """
+    rootnode = uct_search(rootstate, itermax, rollout_policy=rollout_policy, table=table)
+    best_node = rootnode.get_most_visited_child()
+    queue.put((move_origin, best_node.wins, best_node.visits))
+
 
-    rootnode = Node(state=rootstate)
+def uct_search(rootstate, itermax, rootnode=None, on_iteration=None, rollout_policy=None, rave=False,
+               selection_policy=None, table=None, stop_when_proven=True):
+    """ Conduct a UCT search for itermax iterations starting from rootstate and return the root node.
+        Assumes 2 alternating players (player 1 starts), with game results in the range [0.0, 1.0].
+        The search can be continued from an existing tree by passing its rootnode. If on_iteration is given it
+        is called with (rootnode, iterations done) after every iteration and the search stops when it returns True.
+        Nodes are expanded by progressive widening in the order of a cheap move prior. Terminal nodes are proven
+        and the proofs are propagated up the tree (MCTS-Solver), the search stops early once the result of the
+        root is proven (see Node.proven). Without stop_when_proven the search instead waits for on_iteration to
+        stop it (e.g. an infinite analysis must not return before it is told to).
+        rollout_policy (see lib.rollout) picks the rollout moves, uniformly random moves by default.
+        selection_policy (see lib.selection) picks the child to descend into, UCB1 by default. With rave the
+        simulations also update all-moves-as-first statistics and the default selection policy is RAVE.
+        With a SharedTable (lib.sharedtable) the statistics of every position on the path are also written to the
+        table and new nodes use the results of other processes: their proofs and, for positions with at least
+        TABLE_MIN_VISITS visits, their mean result in place of a rollout. Only proofs that depend on the position
+        alone are shared, and a result taken from the table is not written back to the entry it came from.
+        rootstate is restored to its original position when the search returns."""
+
+    if rootnode is None:
+        rootnode = Node(state=rootstate)
+
+    if rollout_policy is None:
+        rollout_policy = RandomRollout()
+
+    if selection_policy is None:
+        selection_policy = RAVE() if rave else DEFAULT_SELECTION_POLICY
+
+    # attack maps make legality checks (the bulk of a rollout) lookups
+    attack_maps_enabled = rootstate.attackMaps is not None
+    if not attack_maps_enabled:
+        rootstate.enable_attack_maps()
 
     state = rootstate
+    root_snapshot = state.get_snapshot()
+    root_key = state.posKey.value
+    rollout_moves = new_move_buffer()  # reused by every rollout ply
     for i in range(itermax):
+        if rootnode.proven is not None:
+            # the root is solved, more simulations can not change the result
+            while not stop_when_proven and on_iteration is not None and not on_iteration(rootnode, i):
+                time.sleep(PROVEN_IDLE_INTERVAL)
+            break
+
         node = rootnode
-        moves_to_root = 0
+        tree_depth = 0  # plies from the root to node
+        played = []  # moves of the simulation, only kept for rave
+        path_keys = [root_key]  # position keys of the nodes from the root, only kept with a table
+        from_table = False  # is the result the mean of the leaf's table entry, which must not be counted again
 
-        game_over = False
         # Select
-        while not node.untriedMoves and node.childNodes:  # node is fully expanded and non-terminal
-            node = node.uct_select_child()
+        while node.proven is None and not node.can_expand(state) and node.childNodes:  # node is widened enough
+            node = selection_policy.select_child(node)
             state.make_move(node.move)
-            moves_to_root += 1
-            if state.get_result(state.playerJustMoved) is not None:
-                # Backpropagate
-                while node is not None:  # backpropagate from the expanded node and work back to the root node
-                    # state is terminal. Update node with result from POV of node.playerJustMoved
-                    result = state.get_result(node.playerJustMoved)
-                    node.update(result)
-                    node = node.parentNode
-
-                for _ in range(moves_to_root):
-                    state.take_move()
-
-                game_over = True
-                break
-        if game_over:
-            continue
-
-        # Expand
-        if node.untriedMoves:  # if we can expand (i.e. state/node is non-terminal)
-            m = rand_choice(node.untriedMoves)
-            state.make_move(m)
-            moves_to_root += 1
-            node = node.add_child(m, state)  # add child and descend tree
-
-        # Rollout - this can often be made orders of magnitude quicker using a state.GetRandomMove() function
-        while state.get_result(state.side) is None:  # while state is non-terminal
-            state.make_move(rand_choice(state.get_moves()))
-            moves_to_root += 1
+            tree_depth += 1
+            if rave:
+                played.append(node.move)
+            if table is not None:
+                path_keys.append(state.posKey.value)
+
+        if node.proven is None:
+            # Expand
+            if node.untriedMoves:  # if we can expand (i.e. state/node is non-terminal)
+                m = node.untriedMoves[-1]  # the untried move with the best prior
+                state.make_move(m)
+                node = node.add_child(m, state)  # add child and descend tree
+                tree_depth += 1
+                if rave:
+                    played.append(m)
+                if table is not None:
+                    path_keys.append(state.posKey.value)
+
+            entry = None
+            result = state.get_result(WHITE)
+            if result is not None:
+                # a terminal node is solved and never simulated again
+                node.set_proven(result if node.playerJustMoved == WHITE else 1.0 - result, state.is_history_draw())
+            elif table is not None and node is not rootnode:
+                entry = table.probe(path_keys[-1])
+
+            if entry is not None and entry.proven is not None:
+                node.set_proven(entry.proven)  # solved by another process
+            elif entry is not None and entry.visits >= TABLE_MIN_VISITS:
+                result = entry.wins / entry.visits
+                from_table = True
+            elif result is None:
+                # Rollout - this can often be made orders of magnitude quicker using a state.GetRandomMove() function
+                while result is None:  # while state is non-terminal
+                    count = state.get_moves_into(rollout_moves)
+                    m = rollout_policy.choose_move(state, rollout_moves, count)
+                    state.make_move(m)
+                    if rave:
+                        played.append(m)
+                    result = state.get_result(WHITE)
+                result = result if node.playerJustMoved == WHITE else 1.0 - result
+
+        if node.proven is not None:
+            result = node.proven  # proven nodes back up their exact result instead of a simulation
+
+        if rave:
+            update_amaf(node, played, tree_depth, result)
 
         # Backpropagate
         while node is not None:  # backpropagate from the expanded node and work back to the root node
-            # state is terminal. Update node with result from POV of node.playerJustMoved
-            node.update(state.get_result(node.playerJustMoved))
+            # update node with result from POV of node.playerJustMoved, players alternate on the way up
+            node.update(result)
+            if table is not None:
+                # the leaf's own result came from the table, only its ancestors take the result of the simulation
+                if not (from_table and tree_depth == len(path_keys) - 1):
+                    # proofs that depend on the path to the node would be wrong for other paths to the position
+                    table.update(path_keys[tree_depth], result, None if node.provenByHistory else node.proven)
+                tree_depth -= 1
+            result = 1.0 - result
             node = node.parentNode
 
-        for _ in range(moves_to_root):
-            state.take_move()
+        state.rewind(root_snapshot)  # back to the root at once instead of taking back every move
 
-    # return sorted(rootnode.childNodes, key=lambda c: c.visits)[-1].move  # return the move that was most visited
-    best_node = sorted(rootnode.childNodes, key=lambda c: c.visits)[-1]
-    queue.put((move_origin, best_node.wins, best_node.visits))
+        if on_iteration is not None and on_iteration(rootnode, i + 1):
+            break
+
+    if not attack_maps_enabled:
+        rootstate.disable_attack_maps()
 
+    return rootnode
 
-def uct_play_game():
+
+def uct_play_game(pgn_path=None):
     """ Play a sample game between two UCT players where each player gets a different number 
         of UCT iterations (= simulations = tree nodes).
+        If pgn_path is given the finished game is appended to that pgn file.
     """
     state = Board()
     # mate_in_2 = '3k4/Q7/8/3K4/8/8/8/8 w --'
     mate_in_3 = 'r5rk/5p1p/5R2/4B3/8/8/7P/7K w --'  # todo investigate result after rxf7 rg7
     state.parse_fen(mate_in_3)
+    start_fen = state.get_fen()
 
     while state.get_moves():
         print(state)
@@ -244,6 +493,10 @@ def uct_play_game():
     else:
         print("Nobody wins!")
 
+    if pgn_path is not None:
+        with open(pgn_path, "a") as pgn_file:
+            write_game(pgn_file, state, headers={"Event": "uct_play_game"}, start_fen=start_fen)
+
 
 if __name__ == "__main__":
     """ Play a single game to the end using UCT for both players. 
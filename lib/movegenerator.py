@@ -1,6 +1,19 @@
+from array import array
+
 from lib.constants import *
 
 
+# Stages of the move generation (bit flags)
+GEN_CAPTURES = 1  # captures, en passant & promotions
+GEN_QUIETS = 2  # all other moves except castling
+GEN_CASTLING = 4
+GEN_ALL = GEN_CAPTURES | GEN_QUIETS | GEN_CASTLING
+GEN_STAGES = (GEN_CAPTURES, GEN_QUIETS, GEN_CASTLING)
+
+MAX_POSITION_MOVES = 256  # no legal chess position has more (pseudo legal) moves
+MAX_PIECE_MOVES = 32  # no single piece has more (a queen has at most 27, castling counts as one stage)
+
+
 # get_move_int creates and returns a move int from given move information
 def get_move_int(from_sq: int, to_sq: int, capture_piece: int, promotion_piece: int, flag: int) -> int:
     return from_sq | (to_sq << 7) | (capture_piece << 14) | (promotion_piece << 20) | flag
@@ -25,6 +38,10 @@ class MoveGenerator:
             BLACK_QUEEN: self.generate_sliding_moves,
             BLACK_KING: self.generate_non_sliding_moves,
         }
+        # scratch buffer of the list based api
+        self.moveBuffer = new_move_buffer()
+        # moves of one piece near the end of a buffer, copied over once it is known that they fit
+        self.pieceBuffer = array('I', bytes(4 * MAX_PIECE_MOVES))
 
     def print_move(self, move: int) -> str:
         file_from = self.pos.conversion.FilesBoard[get_from_square(move)]
@@ -52,164 +69,168 @@ class MoveGenerator:
 
         return move_str
 
-    def add_white_pawn_capture_move(self, from_: int, to: int, cap: int, move_list: List) -> List:
+    def add_white_pawn_capture_move(self, from_: int, to: int, cap: int, moves, count: int) -> int:
         assert self.pos.is_piece_valid_or_empty(cap)
         assert self.pos.is_square_on_board(from_)
         assert self.pos.is_square_on_board(to)
 
         if self.pos.conversion.RanksBoard[from_] == RANK_7:
             # add all promotion with capture related moves
-            move_list.append(get_move_int(from_, to, cap, WHITE_QUEEN, 0))
-            move_list.append(get_move_int(from_, to, cap, WHITE_ROOK, 0))
-            move_list.append(get_move_int(from_, to, cap, WHITE_BISHOP, 0))
-            move_list.append(get_move_int(from_, to, cap, WHITE_KNIGHT, 0))
-        else:
-            # add normal capture moves without promotion
-            move_list.append(get_move_int(from_, to, cap, EMPTY, 0))
+            moves[count] = get_move_int(from_, to, cap, WHITE_QUEEN, 0)
+            moves[count + 1] = get_move_int(from_, to, cap, WHITE_ROOK, 0)
+            moves[count + 2] = get_move_int(from_, to, cap, WHITE_BISHOP, 0)
+            moves[count + 3] = get_move_int(from_, to, cap, WHITE_KNIGHT, 0)
+            return count + 4
 
-        return move_list
+        # add normal capture moves without promotion
+        moves[count] = get_move_int(from_, to, cap, EMPTY, 0)
+        return count + 1
 
-    def add_white_pawn_move(self, from_: int, to: int, move_list: List) -> List:
+    def add_white_pawn_move(self, from_: int, to: int, moves, count: int) -> int:
         assert self.pos.is_square_on_board(from_)
         assert self.pos.is_square_on_board(to)
 
         if self.pos.conversion.RanksBoard[from_] == RANK_7:
             # add normal promotion without capture
-            move_list.append(get_move_int(from_, to, EMPTY, WHITE_QUEEN, 0))
-            move_list.append(get_move_int(from_, to, EMPTY, WHITE_ROOK, 0))
-            move_list.append(get_move_int(from_, to, EMPTY, WHITE_BISHOP, 0))
-            move_list.append(get_move_int(from_, to, EMPTY, WHITE_KNIGHT, 0))
-        else:
-            move_list.append(get_move_int(from_, to, EMPTY, EMPTY, 0))
+            moves[count] = get_move_int(from_, to, EMPTY, WHITE_QUEEN, 0)
+            moves[count + 1] = get_move_int(from_, to, EMPTY, WHITE_ROOK, 0)
+            moves[count + 2] = get_move_int(from_, to, EMPTY, WHITE_BISHOP, 0)
+            moves[count + 3] = get_move_int(from_, to, EMPTY, WHITE_KNIGHT, 0)
+            return count + 4
 
-        return move_list
+        moves[count] = get_move_int(from_, to, EMPTY, EMPTY, 0)
+        return count + 1
 
-    def add_black_pawn_capture_move(self, from_: int, to: int, cap: int, move_list: List) -> List:
+    def add_black_pawn_capture_move(self, from_: int, to: int, cap: int, moves, count: int) -> int:
         assert self.pos.is_piece_valid_or_empty(cap)
         assert self.pos.is_square_on_board(from_)
         assert self.pos.is_square_on_board(to)
 
         if self.pos.conversion.RanksBoard[from_] == RANK_2:
             # add all promotion with capture related moves
-            move_list.append(get_move_int(from_, to, cap, BLACK_QUEEN, 0))
-            move_list.append(get_move_int(from_, to, cap, BLACK_ROOK, 0))
-            move_list.append(get_move_int(from_, to, cap, BLACK_BISHOP, 0))
-            move_list.append(get_move_int(from_, to, cap, BLACK_KNIGHT, 0))
-        else:
-            # add normal capture moves without promotion
-            move_list.append(get_move_int(from_, to, cap, EMPTY, 0))
+            moves[count] = get_move_int(from_, to, cap, BLACK_QUEEN, 0)
+            moves[count + 1] = get_move_int(from_, to, cap, BLACK_ROOK, 0)
+            moves[count + 2] = get_move_int(from_, to, cap, BLACK_BISHOP, 0)
+            moves[count + 3] = get_move_int(from_, to, cap, BLACK_KNIGHT, 0)
+            return count + 4
 
-        return move_list
+        # add normal capture moves without promotion
+        moves[count] = get_move_int(from_, to, cap, EMPTY, 0)
+        return count + 1
 
-    def add_black_pawn_move(self, from_: int, to: int, move_list: List) -> List:
+    def add_black_pawn_move(self, from_: int, to: int, moves, count: int) -> int:
         assert self.pos.is_square_on_board(from_)
         assert self.pos.is_square_on_board(to)
 
         if self.pos.conversion.RanksBoard[from_] == RANK_2:
             # add normal promotion without capture
-            move_list.append(get_move_int(from_, to, EMPTY, BLACK_QUEEN, 0))
-            move_list.append(get_move_int(from_, to, EMPTY, BLACK_ROOK, 0))
-            move_list.append(get_move_int(from_, to, EMPTY, BLACK_BISHOP, 0))
-            move_list.append(get_move_int(from_, to, EMPTY, BLACK_KNIGHT, 0))
-        else:
-            move_list.append(get_move_int(from_, to, EMPTY, EMPTY, 0))
+            moves[count] = get_move_int(from_, to, EMPTY, BLACK_QUEEN, 0)
+            moves[count + 1] = get_move_int(from_, to, EMPTY, BLACK_ROOK, 0)
+            moves[count + 2] = get_move_int(from_, to, EMPTY, BLACK_BISHOP, 0)
+            moves[count + 3] = get_move_int(from_, to, EMPTY, BLACK_KNIGHT, 0)
+            return count + 4
 
-        return move_list
+        moves[count] = get_move_int(from_, to, EMPTY, EMPTY, 0)
+        return count + 1
 
     # noinspection PyMethodMayBeStatic
-    def empty_handler(self, *_):
-        return []
+    def empty_handler(self, _sq, _piece, _moves, count: int, _stage) -> int:
+        return count
 
-    def generate_pawn_moves(self, sq, _) -> List:
-        move_list = []
+    # Every handler writes the moves of the piece on sq into the moves buffer starting at index count and returns
+    # the new number of moves in the buffer
 
+    def generate_pawn_moves(self, sq, _, moves, count: int, stage=GEN_ALL) -> int:
         enemy = BLACK
-        pawn_rank = RANK_2
+        pawn_rank, promotion_rank = RANK_2, RANK_7
         forward_one_sq, forward_two_sq, capture_left_sq, capture_right_sq = 10, 20, 9, 11
         pawn_move_handler, pawn_capture_move_handler = self.add_white_pawn_move, self.add_white_pawn_capture_move
 
         if self.pos.side == BLACK:
             enemy = WHITE
-            pawn_rank = RANK_7
+            pawn_rank, promotion_rank = RANK_7, RANK_2
             forward_one_sq, forward_two_sq, capture_left_sq, capture_right_sq = -10, -20, -9, -11
             pawn_move_handler, pawn_capture_move_handler = self.add_black_pawn_move, self.add_black_pawn_capture_move
 
+        # promotions are generated together with the captures
+        rank = self.pos.conversion.RanksBoard[sq]
+        push_stage = GEN_CAPTURES if rank == promotion_rank else GEN_QUIETS
+
         # add simple pawn move forward if next sq is empty
-        if self.pos.pieces[sq + forward_one_sq] == EMPTY:
-            move_list = pawn_move_handler(sq, sq + forward_one_sq, move_list)
+        if stage & push_stage and self.pos.pieces[sq + forward_one_sq] == EMPTY:
+            count = pawn_move_handler(sq, sq + forward_one_sq, moves, count)
             # if we are on the second rank, generate a double pawn move if 4th rank sq is empty
-            if self.pos.conversion.RanksBoard[sq] == pawn_rank and self.pos.pieces[sq + forward_two_sq] == EMPTY:
+            if rank == pawn_rank and self.pos.pieces[sq + forward_two_sq] == EMPTY:
                 # don't forget to set the flag for PAWN START
-                move_list.append(get_move_int(sq, (sq + forward_two_sq), EMPTY, EMPTY, MOVE_FLAG_PAWN_START))
+                moves[count] = get_move_int(sq, (sq + forward_two_sq), EMPTY, EMPTY, MOVE_FLAG_PAWN_START)
+                count += 1
+
+        if not stage & GEN_CAPTURES:
+            return count
 
         # Capture to the left and right
-        # check if the square that we are capturing on is on the board and that it has a black piece on it
-        if self.pos.is_square_on_board(sq + capture_left_sq) and (
-                PIECE_COLOR_MAP[self.pos.pieces[sq + capture_left_sq]] == enemy):
-            move_list = pawn_capture_move_handler(sq, sq + capture_left_sq,
-                                                  self.pos.pieces[sq + capture_left_sq], move_list)
-
-        # check if the square that we are capturing on is on the board and that it has a black piece on it
-        if self.pos.is_square_on_board(sq + capture_right_sq) and (
-                PIECE_COLOR_MAP[self.pos.pieces[sq + capture_right_sq]] == enemy):
-            move_list = pawn_capture_move_handler(sq, sq + capture_right_sq,
-                                                  self.pos.pieces[sq + capture_right_sq], move_list)
+        # check if the square that we are capturing on has an enemy piece on it (off board squares have no colour)
+        if PIECE_COLOR_MAP[self.pos.pieces[sq + capture_left_sq]] == enemy:
+            count = pawn_capture_move_handler(sq, sq + capture_left_sq, self.pos.pieces[sq + capture_left_sq], moves,
+                                              count)
+
+        if PIECE_COLOR_MAP[self.pos.pieces[sq + capture_right_sq]] == enemy:
+            count = pawn_capture_move_handler(sq, sq + capture_right_sq, self.pos.pieces[sq + capture_right_sq], moves,
+                                              count)
 
         if self.pos.enPassantSquare != NO_SQUARE:
             # check if the sq+9 square is equal to the enpassant square that we have stored in our pos
             if sq + capture_left_sq == self.pos.enPassantSquare:
-                move_list.append(get_move_int(sq, sq + capture_left_sq, EMPTY, EMPTY, MOVE_FLAG_ENPASS))
+                moves[count] = get_move_int(sq, sq + capture_left_sq, EMPTY, EMPTY, MOVE_FLAG_ENPASS)
+                count += 1
 
             if sq + capture_right_sq == self.pos.enPassantSquare:
-                move_list.append(get_move_int(sq, sq + capture_right_sq, EMPTY, EMPTY, MOVE_FLAG_ENPASS))
-
-        return move_list
-
-    def generate_sliding_moves(self, sq, piece) -> List:
-        move_list = []
-
-        for index in range(DIRECTIONS_OF_MOVEMENT[piece]):
-            dir_ = PIECE_MOVEMENT_INCREMENT[piece][index]
-            target_sq = sq + dir_
-
-            # while we are still on the board, take a sliding piece and add a possible move
-            # until we see another piece or we hit the edge of the board
-            while self.pos.is_square_on_board(target_sq):
-                # BLACK ^ 1 == WHITE       WHITE ^ 1 == BLACK
-                if self.pos.pieces[target_sq] != EMPTY:
-                    if PIECE_COLOR_MAP[self.pos.pieces[target_sq]] == self.pos.side ^ 1:
-                        move_list.append(get_move_int(sq, target_sq, self.pos.pieces[target_sq], EMPTY, 0))
+                moves[count] = get_move_int(sq, sq + capture_right_sq, EMPTY, EMPTY, MOVE_FLAG_ENPASS)
+                count += 1
+
+        return count
+
+    def generate_sliding_moves(self, sq, piece, moves, count: int, stage=GEN_ALL) -> int:
+        pieces = self.pos.pieces
+        enemy = self.pos.side ^ 1  # BLACK ^ 1 == WHITE       WHITE ^ 1 == BLACK
+        captures, quiets = stage & GEN_CAPTURES, stage & GEN_QUIETS
+
+        # take a sliding piece and add a possible move for every square of the ray
+        # until we see another piece (rays already end at the edge of the board)
+        for ray in SLIDING_RAYS[piece][sq]:
+            for target_sq in ray:
+                target = pieces[target_sq]
+                if target != EMPTY:
+                    if captures and PIECE_COLOR_MAP[target] == enemy:
+                        moves[count] = get_move_int(sq, target_sq, target, EMPTY, 0)
+                        count += 1
 
                     break  # if we hit a non-empty square, we break from this direction
 
-                move_list.append(get_move_int(sq, target_sq, EMPTY, EMPTY, 0))
-                target_sq += dir_
-
-        return move_list
-
-    def generate_non_sliding_moves(self, sq, piece) -> List:
-        move_list = []
-
-        for index in range(DIRECTIONS_OF_MOVEMENT[piece]):
-            dir_ = PIECE_MOVEMENT_INCREMENT[piece][index]
-            target_sq = sq + dir_
-
-            if not self.pos.is_square_on_board(target_sq):
-                continue
+                if quiets:
+                    moves[count] = get_move_int(sq, target_sq, EMPTY, EMPTY, 0)
+                    count += 1
 
-            # BLACK ^ 1 == WHITE       WHITE ^ 1 == BLACK
-            if self.pos.pieces[target_sq] != EMPTY:
-                if PIECE_COLOR_MAP[self.pos.pieces[target_sq]] == self.pos.side ^ 1:
-                    move_list.append(get_move_int(sq, target_sq, self.pos.pieces[target_sq], EMPTY, 0))
-                continue
+        return count
 
-            move_list.append(get_move_int(sq, target_sq, EMPTY, EMPTY, 0))
+    def generate_non_sliding_moves(self, sq, piece, moves, count: int, stage=GEN_ALL) -> int:
+        pieces = self.pos.pieces
+        enemy = self.pos.side ^ 1
+        captures, quiets = stage & GEN_CAPTURES, stage & GEN_QUIETS
 
-        return move_list
+        for target_sq in NON_SLIDING_TARGETS[piece][sq]:
+            target = pieces[target_sq]
+            if target != EMPTY:
+                if captures and PIECE_COLOR_MAP[target] == enemy:
+                    moves[count] = get_move_int(sq, target_sq, target, EMPTY, 0)
+                    count += 1
+            elif quiets:
+                moves[count] = get_move_int(sq, target_sq, EMPTY, EMPTY, 0)
+                count += 1
 
-    def generate_castling_moves(self) -> List:
-        move_list = []
+        return count
 
+    def generate_castling_moves(self, moves, count: int) -> int:
         if self.pos.side == WHITE:
             # if the position allows white king castling
             # here we do not check if square G1 (final square after castling) is attacked
@@ -218,40 +239,124 @@ class MoveGenerator:
             if (self.pos.castlePermissions & WHITE_KING_CASTLING) != 0:
                 if self.pos.pieces[F1] == EMPTY and self.pos.pieces[G1] == EMPTY:
                     if not self.pos.is_square_attacked(E1, BLACK) and not self.pos.is_square_attacked(F1, BLACK):
-                        move_list.append(get_move_int(E1, G1, EMPTY, EMPTY, MOVE_FLAG_CASTLE))
+                        moves[count] = get_move_int(E1, G1, EMPTY, EMPTY, MOVE_FLAG_CASTLE)
+                        count += 1
 
             if (self.pos.castlePermissions & WHITE_QUEEN_CASTLING) != 0:
                 if self.pos.pieces[D1] == EMPTY and self.pos.pieces[C1] == EMPTY and self.pos.pieces[B1] == EMPTY:
                     if not self.pos.is_square_attacked(E1, BLACK) and not self.pos.is_square_attacked(D1, BLACK):
-                        move_list.append(get_move_int(E1, C1, EMPTY, EMPTY, MOVE_FLAG_CASTLE))
+                        moves[count] = get_move_int(E1, C1, EMPTY, EMPTY, MOVE_FLAG_CASTLE)
+                        count += 1
 
         else:
             # castling
             if (self.pos.castlePermissions & BLACK_KING_CASTLING) != 0:
                 if self.pos.pieces[F8] == EMPTY and self.pos.pieces[G8] == EMPTY:
                     if not self.pos.is_square_attacked(E8, WHITE) and not self.pos.is_square_attacked(F8, WHITE):
-                        move_list.append(get_move_int(E8, G8, EMPTY, EMPTY, MOVE_FLAG_CASTLE))
+                        moves[count] = get_move_int(E8, G8, EMPTY, EMPTY, MOVE_FLAG_CASTLE)
+                        count += 1
 
             if (self.pos.castlePermissions & BLACK_QUEEN_CASTLING) != 0:
                 if self.pos.pieces[D8] == EMPTY and self.pos.pieces[C8] == EMPTY and self.pos.pieces[B8] == EMPTY:
                     if not self.pos.is_square_attacked(E8, WHITE) and not self.pos.is_square_attacked(D8, WHITE):
-                        move_list.append(get_move_int(E8, C8, EMPTY, EMPTY, MOVE_FLAG_CASTLE))
-
+                        moves[count] = get_move_int(E8, C8, EMPTY, EMPTY, MOVE_FLAG_CASTLE)
+                        count += 1
+
+        return count
+
+    def generate_moves_into(self, moves, stage=GEN_ALL, count: int = 0) -> int:
+        """Writes the pseudo legal moves of the given stage(s) of the side to move into the preallocated moves buffer
+        (see new_move_buffer) starting at index count. Returns the number of moves in the buffer.
+        Raises ValueError if the moves do not fit into the buffer.
+        """
+        # a piece is generated straight into the buffer if any piece fits, otherwise through pieceBuffer
+        size = len(moves) - MAX_PIECE_MOVES
+        piece_moves = self.pieceBuffer
+
+        if stage & (GEN_CAPTURES | GEN_QUIETS):
+            pieces = self.pos.pieces
+            side = self.pos.side
+            handlers = self.piece_move_handler
+
+            for sq in range(BOARD_SQUARE_NUMBER):
+                piece = pieces[sq]
+                if PIECE_COLOR_MAP[piece] == side:
+                    if count <= size:
+                        count = handlers[piece](sq, piece, moves, count, stage)
+                    else:
+                        count = self._copy_moves(piece_moves, handlers[piece](sq, piece, piece_moves, 0, stage),
+                                                 moves, count)
+
+        if stage & GEN_CASTLING:
+            if count <= size:
+                count = self.generate_castling_moves(moves, count)
+            else:
+                count = self._copy_moves(piece_moves, self.generate_castling_moves(piece_moves, 0), moves, count)
+
+        return count
+
+    def _copy_moves(self, source, source_count: int, moves, count: int) -> int:
+        if count + source_count > len(moves):
+            # only possible for positions that can not arise in a game (i.e. set up from a fen with 10 queens)
+            raise ValueError("the moves of {} do not fit into a buffer of {} moves".format(
+                self.pos.get_fen(), len(moves)))
+        moves[count:count + source_count] = source[:source_count]
+        return count + source_count
+
+    def generate_moves(self, move_list: List, stage=GEN_ALL) -> List:
+        """Appends the pseudo legal moves of the given stage(s) of the side to move to move_list and returns it"""
+        count = self.generate_moves_into(self.moveBuffer, stage)
+        move_list.extend(self.moveBuffer[:count])
         return move_list
 
     def generate_all_moves(self) -> List:
-        move_list = []
-
-        move_list.extend(self.generate_castling_moves())
-
-        for sq in range(BOARD_SQUARE_NUMBER):
-            piece = self.pos.pieces[sq]
-
-            if piece == OFF_BOARD or PIECE_COLOR_MAP[piece] != self.pos.side:
-                continue
-
-            handler = self.piece_move_handler[piece]
-            moves = handler(sq, piece)
-            move_list.extend(moves)
-
-        return move_list
+        return self.generate_moves([])
+
+    def iter_moves(self):
+        """Yields the pseudo legal moves stage by stage: captures & promotions, quiet moves and castling moves.
+        Within a stage the moves of a piece are generated when the moves of the previous piece are used up, so
+        consumers that stop early (i.e. at the first legal move) don't pay for the rest. The board must be in the
+        same position whenever the generator is resumed.
+        """
+        moves = array('I', bytes(4 * MAX_PIECE_MOVES))  # the moves of one piece, not shared with other callers
+        pieces = self.pos.pieces
+        side = self.pos.side
+        handlers = self.piece_move_handler
+
+        for stage in (GEN_CAPTURES, GEN_QUIETS):
+            for sq in range(BOARD_SQUARE_NUMBER):
+                piece = pieces[sq]
+                if PIECE_COLOR_MAP[piece] == side:
+                    yield from moves[:handlers[piece](sq, piece, moves, 0, stage)]
+
+        yield from moves[:self.generate_castling_moves(moves, 0)]
+
+
+def new_move_buffer() -> array:
+    """Returns a buffer big enough for the moves of any position"""
+    return array('I', bytes(4 * MAX_POSITION_MOVES))
+
+
+def new_move_buffers(plies: int) -> List[array]:
+    """Returns one move buffer per ply, i.e. for a recursive search that must not overwrite the moves of its caller"""
+    return [new_move_buffer() for _ in range(plies)]
+
+
+def perft(board, depth: int, buffers: List[array] = None) -> int:
+    """Counts the leaf nodes of the legal move tree of the given depth, reusing one move buffer per ply"""
+    if depth == 0:
+        return 1
+    if buffers is None:
+        buffers = new_move_buffers(depth)
+
+    moves = buffers[depth - 1]
+    count = board.get_moves_into(moves)
+    if depth == 1:
+        return count
+
+    nodes = 0
+    for index in range(count):
+        board.make_move(moves[index])
+        nodes += perft(board, depth - 1, buffers)
+        board.take_move()
+    return nodes
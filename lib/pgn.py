@@ -0,0 +1,253 @@
+import re
+
+from lib.board import Board
+from lib.constants import *
+from lib.conversion import convert_file_rank_to_square
+from lib.movegenerator import GEN_CASTLING
+
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SAN_PIECE_MAP = {"N": (WHITE_KNIGHT, BLACK_KNIGHT), "B": (WHITE_BISHOP, BLACK_BISHOP),
+                 "R": (WHITE_ROOK, BLACK_ROOK), "Q": (WHITE_QUEEN, BLACK_QUEEN), "K": (WHITE_KING, BLACK_KING),
+                 "P": (WHITE_PAWN, BLACK_PAWN)}
+PROMOTION_MAP = {"N": (WHITE_KNIGHT, BLACK_KNIGHT), "B": (WHITE_BISHOP, BLACK_BISHOP),
+                 "R": (WHITE_ROOK, BLACK_ROOK), "Q": (WHITE_QUEEN, BLACK_QUEEN)}
+SAN_PIECE_CHAR = "  NBRQK NBRQK"  # indexed by piece, pawns have no character in SAN
+
+HEADER_REGEX = re.compile(r'\[(\w+)\s+"(.*)"\]')
+# movetext tokens: comments, variations, NAGs, move numbers, results & moves
+TOKEN_REGEX = re.compile(r'\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|\d+\.+|1-0|0-1|1/2-1/2|\*|[^\s(){};$]+')
+SAN_REGEX = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+UCI_REGEX = re.compile(r'^[a-h][1-8][a-h][1-8][qrbn]?$')
+
+
+class PgnGame:
+    """A game read from a pgn file: its tag pairs and the tokens of its main line.
+    The moves are only decoded when the game is replayed on a board.
+    """
+    __slots__ = ['headers', 'moves', 'result']
+
+    def __init__(self):
+        self.headers: Dict[str, str] = {}
+        self.moves: List[str] = []  # SAN (or uci) strings of the main line
+        self.result: str = "*"
+
+    def replay(self, pos: Board):
+        """Sets up the starting position on pos and yields every move (int) of the main line after making it on pos.
+        Stops at the first move that can't be decoded.
+        """
+        pos.parse_fen(self.headers.get("FEN", START_FEN))
+
+        for move_str in self.moves:
+            move = parse_san(pos, move_str)
+            if move == NO_MOVE:
+                return
+
+            pos.make_move(move)
+            yield move
+
+
+def read_games(stream):
+    """Yields the games of a pgn stream (file object or any iterable of lines) one at a time
+    without reading the whole stream.
+    """
+    game = None
+    movetext = []
+
+    for line in stream:
+        line = line.strip()
+        if line.startswith("%"):  # escape mechanism -> line is ignored
+            continue
+
+        if line.startswith("[") and not _is_inside_comment(movetext):
+            header = HEADER_REGEX.match(line)
+            if header is None:
+                continue
+
+            if game is not None and movetext:  # tags after movetext start a new game
+                _parse_movetext(game, movetext)
+                yield game
+                game, movetext = None, []
+
+            if game is None:
+                game = PgnGame()
+            game.headers[header.group(1)] = header.group(2)
+            continue
+
+        if line:
+            if game is None:
+                game = PgnGame()
+            movetext.append(line)
+
+    if game is not None:
+        _parse_movetext(game, movetext)
+        yield game
+
+
+def _is_inside_comment(movetext) -> bool:
+    text = " ".join(movetext)
+    return text.count("{") > text.count("}")
+
+
+def _parse_movetext(game: PgnGame, movetext):
+    variation_depth = 0
+    for token in TOKEN_REGEX.findall(" ".join(movetext)):
+        if token == "(":
+            variation_depth += 1
+        elif token == ")":
+            variation_depth -= 1
+        elif variation_depth > 0 or token[0] in "{;$" or token[0].isdigit() and token.endswith("."):
+            continue
+        elif token in RESULTS:
+            game.result = token
+        else:
+            game.moves.append(token)
+
+
+def parse_san(pos: Board, san: str) -> int:
+    """Parses a move in standard algebraic notation (or uci notation) and returns the matching
+    legal move int for the position, or NO_MOVE.
+    Only the pseudo legal moves that match the move string are checked for legality.
+    """
+    san = san.rstrip("+#!?")
+
+    if UCI_REGEX.match(san):
+        return pos.parse_move(san)
+
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        to = (G1 if len(san) == 3 else C1) if pos.side == WHITE else (G8 if len(san) == 3 else C8)
+        for move in pos.moveGenerator.generate_moves([], GEN_CASTLING):
+            if get_to_square(move) == to and pos.is_move_legal(move):
+                return move
+        return NO_MOVE
+
+    match = SAN_REGEX.match(san)
+    if match is None:
+        return NO_MOVE
+
+    piece_char, from_file, from_rank, to_str, promotion_char = match.groups()
+    piece = SAN_PIECE_MAP[piece_char or "P"][pos.side]
+    promoted = PROMOTION_MAP[promotion_char][pos.side] if promotion_char else EMPTY
+    to = convert_file_rank_to_square(FILE_NOTATION_MAP[to_str[0]], int(to_str[1]) - 1)
+
+    for move in pos.moveGenerator.generate_all_moves():
+        from_ = get_from_square(move)
+        if get_to_square(move) != to or pos.pieces[from_] != piece or get_promoted_bits(move) != promoted:
+            continue
+        if from_file is not None and pos.conversion.FilesBoard[from_] != FILE_NOTATION_MAP[from_file]:
+            continue
+        if from_rank is not None and pos.conversion.RanksBoard[from_] != int(from_rank) - 1:
+            continue
+        if pos.is_move_legal(move):
+            return move
+
+    return NO_MOVE
+
+
+def get_san(pos: Board, move: int) -> str:
+    """Returns the standard algebraic notation of a legal move in the current position"""
+    from_ = get_from_square(move)
+    to = get_to_square(move)
+    piece = pos.pieces[from_]
+    is_capture = move & MOVE_FLAG_CAPTURE != 0
+    to_str = pos.moveGenerator.print_move(move)[2:4]
+
+    if move & MOVE_FLAG_CASTLE != 0:
+        san = "O-O" if to in (G1, G8) else "O-O-O"
+    elif IS_PIECE_PAWN[piece]:
+        san = to_str
+        if is_capture:
+            san = chr(ord("a") + pos.conversion.FilesBoard[from_]) + "x" + san
+        promoted = get_promoted_bits(move)
+        if promoted != EMPTY:
+            san += "=" + SAN_PIECE_CHAR[promoted]
+    else:
+        san = SAN_PIECE_CHAR[piece] + _get_disambiguation(pos, move) + ("x" if is_capture else "") + to_str
+
+    pos.make_move(move)
+    if pos.is_square_attacked(pos.kingSquare[pos.side], pos.side ^ 1):
+        san += "#" if not pos.get_moves() else "+"
+    pos.take_move()
+
+    return san
+
+
+def _get_disambiguation(pos: Board, move: int) -> str:
+    from_ = get_from_square(move)
+    to = get_to_square(move)
+    piece = pos.pieces[from_]
+
+    same_file, same_rank, ambiguous = False, False, False
+    for other in pos.moveGenerator.generate_all_moves():
+        other_from = get_from_square(other)
+        if other_from == from_ or get_to_square(other) != to or pos.pieces[other_from] != piece:
+            continue
+        if not pos.is_move_legal(other):
+            continue
+
+        ambiguous = True
+        same_file |= pos.conversion.FilesBoard[other_from] == pos.conversion.FilesBoard[from_]
+        same_rank |= pos.conversion.RanksBoard[other_from] == pos.conversion.RanksBoard[from_]
+
+    square = pos.moveGenerator.print_move(move)[:2]
+    if not ambiguous:
+        return ""
+    if not same_file:
+        return square[0]
+    if not same_rank:
+        return square[1]
+    return square
+
+
+def get_result_string(pos: Board) -> str:
+    """Returns the pgn result of the position ('*' if the game is not finished)"""
+    result = pos.get_result(WHITE)
+    if result is None:
+        return "*"
+    if result == DRAW:
+        return "1/2-1/2"
+    return "1-0" if result == WIN else "0-1"
+
+
+def write_game(stream, pos: Board, headers: Dict[str, str] = None, start_fen: str = START_FEN):
+    """Appends the game played on pos (all moves in its history, starting from start_fen) to a pgn stream.
+    The moves are taken back and replayed in place to produce SAN, pos is left in its final position.
+    """
+    all_headers = {"Event": "?", "Site": "?", "Date": "????.??.??", "Round": "?", "White": "?", "Black": "?",
+                   "Result": get_result_string(pos)}
+    if start_fen != START_FEN:
+        all_headers["SetUp"] = "1"
+        all_headers["FEN"] = start_fen
+    all_headers.update(headers or {})
+    result = all_headers["Result"]  # i.e. a resignation passed in through the headers
+
+    lines = ['[{} "{}"]'.format(tag, value) for tag, value in all_headers.items()]
+    lines.append("")
+
+    moves = [pos.history[ply].move for ply in range(pos.histPly)]
+    for _ in moves:
+        pos.take_move()
+
+    # move numbers depend on who moves first in the starting position
+    tokens = []
+    ply_offset = 1 if pos.side == BLACK else 0
+    for ply, move in enumerate(moves, start=ply_offset):
+        if ply % 2 == 0:
+            tokens.append("{}.".format(ply // 2 + 1))
+        elif ply == ply_offset:
+            tokens.append("{}...".format(ply // 2 + 1))
+        tokens.append(get_san(pos, move))
+        pos.make_move(move)
+    tokens.append(result)
+
+    line = ""
+    for token in tokens:  # keep lines below 80 characters
+        if len(line) + len(token) + 1 > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = token if not line else line + " " + token
+    lines.append(line)
+
+    stream.write("\n".join(lines) + "\n\n")
+    stream.flush()
@@ -0,0 +1,173 @@
+import random
+
+from lib.constants import *
+
+
+# Rollout policies pick the move of every rollout (simulation) ply. They get the board and a buffer holding its
+# count legal moves (see Board.get_moves_into) and return one of the moves.
+
+DEFAULT_EPSILON = 0.2  # share of uniformly random moves of the greedy policies
+MAX_CHECK_CANDIDATES = 4  # number of random quiet moves the heavy policy tries for a check
+CHECK_PRIOR = 15  # prior of a checking move, above the cheap captures (see get_move_prior)
+
+# offsets from a pawn of each side to the squares it attacks
+_PAWN_CHECKS = [(9, 11), (-9, -11)]
+
+# piece values used to order captures (MVV-LVA) and promotions
+PIECE_VALUES: List[int] = [0, 1, 3, 3, 5, 9, 20, 1, 3, 3, 5, 9, 20]
+
+
+def get_tactical_score(state, move: int) -> int:
+    """Scores captures by most valuable victim / least valuable attacker and promotions by the promoted piece.
+    Returns 0 for quiet moves.
+    """
+    score = 0
+    if move & MOVE_FLAG_CAPTURE:
+        # en passant moves have no captured piece bits but always take a pawn
+        victim = PIECE_VALUES[get_captured_bits(move)] if move & MOVE_FLAG_ENPASS == 0 else 1
+        score = victim * 10 - PIECE_VALUES[state.pieces[get_from_square(move)]] + 10
+
+    promoted = get_promoted_bits(move)
+    if promoted != EMPTY:
+        score += PIECE_VALUES[promoted] * 10
+
+    return score
+
+
+def gives_check(state, move: int) -> bool:
+    """Returns True if the legal move puts the opponent in check. Decided from the board without making the move
+    (a direct check by the moved or promoted piece or a slider uncovered by it), except for castling and en passant.
+    """
+    if move & (MOVE_FLAG_CASTLE | MOVE_FLAG_ENPASS):
+        state.make_move(move)
+        check = state.is_square_attacked(state.kingSquare[state.side], state.side ^ 1)
+        state.take_move()
+        return check
+
+    pieces = state.pieces
+    side = state.side
+    king_sq = state.kingSquare[side ^ 1]
+    from_ = get_from_square(move)
+    to = get_to_square(move)
+    piece = get_promoted_bits(move) or pieces[from_]
+
+    # direct check by the piece on its target square
+    if piece == WHITE_PAWN or piece == BLACK_PAWN:
+        if king_sq - to in _PAWN_CHECKS[side]:
+            return True
+    elif IS_PIECE_KNIGHT[piece]:
+        if king_sq in KNIGHT_TARGETS[to]:
+            return True
+    elif IS_PIECE_SLIDING[piece]:
+        dir_ = LINE_DIRECTION[to][king_sq]
+        is_slider = IS_PIECE_ROOK_QUEEN if dir_ in ROOK_MOVE_INCREMENT else IS_PIECE_BISHOP_QUEEN
+        if dir_ != 0 and is_slider[piece]:
+            sq = to + dir_
+            while sq != king_sq and (pieces[sq] == EMPTY or sq == from_):  # from_ is empty after the move
+                sq += dir_
+            if sq == king_sq:
+                return True
+
+    # discovered check by a slider behind the from square, unless the piece stays on the line
+    dir_ = LINE_DIRECTION[king_sq][from_]
+    if dir_ == 0 or LINE_DIRECTION[king_sq][to] == dir_:
+        return False
+
+    sq = king_sq + dir_
+    while pieces[sq] == EMPTY:
+        sq += dir_
+    if sq != from_:
+        return False  # another piece stands between the king and the moving piece
+
+    sq += dir_
+    while pieces[sq] == EMPTY:
+        sq += dir_
+    is_slider = IS_PIECE_ROOK_QUEEN if dir_ in ROOK_MOVE_INCREMENT else IS_PIECE_BISHOP_QUEEN
+    return is_slider[pieces[sq]] and PIECE_COLOR_MAP[pieces[sq]] == side
+
+
+def get_move_prior(state, move: int) -> int:
+    """Scores a legal move for ordering: captures and promotions by their tactical score plus CHECK_PRIOR for
+    checks. Returns 0 for quiet moves.
+    """
+    score = get_tactical_score(state, move)
+    if gives_check(state, move):
+        score += CHECK_PRIOR
+    return score
+
+
+class RandomRollout:
+    """Uniformly random moves (the light rollout)"""
+
+    def choose_move(self, state, moves, count: int) -> int:
+        return moves[int(random.random() * count)]
+
+
+class CaptureFirstRollout:
+    """Plays the best capture or promotion by MVV-LVA (random among equals) and a random move if there is none.
+    With probability epsilon any move is played at random.
+    """
+
+    def __init__(self, epsilon: float = DEFAULT_EPSILON):
+        self.epsilon = epsilon
+
+    def choose_tactical_move(self, state, moves, count: int) -> int:
+        best_move, best_score, ties = NO_MOVE, 0, 0
+        for index in range(count):
+            move = moves[index]
+            if move & (MOVE_FLAG_CAPTURE | MOVE_FLAG_PROMOTION) == 0:
+                continue
+
+            score = get_tactical_score(state, move)
+            if score > best_score:
+                best_move, best_score, ties = move, score, 1
+            elif score == best_score:
+                # reservoir sampling keeps a uniformly random one of the equally scored moves
+                ties += 1
+                if random.random() * ties < 1:
+                    best_move = move
+
+        return best_move
+
+    def choose_move(self, state, moves, count: int) -> int:
+        if random.random() >= self.epsilon:
+            move = self.choose_tactical_move(state, moves, count)
+            if move != NO_MOVE:
+                return move
+
+        return moves[int(random.random() * count)]
+
+
+class HeavyRollout(CaptureFirstRollout):
+    """Like CaptureFirstRollout, but without a capture or promotion a move that gives check is preferred
+    (up to MAX_CHECK_CANDIDATES random moves are tried, which is cheap with attack maps).
+    """
+
+    def choose_move(self, state, moves, count: int) -> int:
+        if random.random() < self.epsilon:
+            return moves[int(random.random() * count)]
+
+        move = self.choose_tactical_move(state, moves, count)
+        if move != NO_MOVE:
+            return move
+
+        for _ in range(min(MAX_CHECK_CANDIDATES, count)):
+            move = moves[int(random.random() * count)]
+            if gives_check(state, move):
+                return move
+
+        return move
+
+
+ROLLOUT_POLICIES = {
+    "random": RandomRollout,
+    "capture": CaptureFirstRollout,
+    "heavy": HeavyRollout,
+}
+
+
+def get_rollout_policy(name: str):
+    """Returns a new rollout policy by its name (see ROLLOUT_POLICIES)"""
+    if name not in ROLLOUT_POLICIES:
+        raise ValueError("unknown rollout policy {} (choose from {})".format(name, ", ".join(ROLLOUT_POLICIES)))
+    return ROLLOUT_POLICIES[name]()
@@ -1,11 +1,254 @@
 import sys
+import time
+from math import log10
+from threading import Thread
 
 from lib.board import Board
-from lib.mcts import uct
+from lib.constants import *
+from lib.mcts import Node, uct_search
+from lib.store import PositionStore
+from lib.timemanager import TimeManager
 
 
-sys.setrecursionlimit(5000)
+INFINITE_SIMULATIONS = sys.maxsize
+INFO_INTERVAL = 1.0  # seconds between two 'info' lines while thinking
 
 
-def search_position(pos: Board, simulations=1000) -> int:
-    return uct(rootstate=pos, itermax=simulations)
+class SearchInfo:
+    """Holds the search limits and the state shared between the search and the protocol loops (uci/console).
+    All times are in seconds as returned by time.time()
+    """
+    def __init__(self):
+        self.startTime: float = 0.0
+        self.stopTime: float = 0.0
+        self.timeSet: bool = False  # is the search limited by stopTime
+        self.nodes: int = 0  # number of simulations done by the current search
+        self.infinite: bool = False  # search until stopped
+        self.stopped: bool = False  # set (possibly from another thread) to stop the current search
+        self.quit: bool = False
+        self.postThinking: bool = False  # print 'info' lines while searching
+        self.lastInfoTime: float = 0.0
+        self.timeManager: TimeManager = None  # decides when to stop when playing with a clock
+
+    def reset(self):
+        self.startTime = time.time()
+        self.stopTime = 0.0
+        self.timeSet = False
+        self.nodes = 0
+        self.infinite = False
+        self.stopped = False
+        self.lastInfoTime = self.startTime
+        self.timeManager = None
+
+    def set_clock(self, time_left: float, increment: float = 0.0, moves_to_go: int = 0):
+        """Lets a TimeManager allocate the time for this move from the clock (all values in seconds).
+        stopTime is set to the hard limit of the move.
+        """
+        self.timeManager = TimeManager(time_left, increment, moves_to_go)
+        self.timeManager.startTime = self.startTime
+        self.timeSet = True
+        self.stopTime = self.startTime + self.timeManager.maximumTime
+
+    def check_up(self, rootnode=None):
+        """Stop the search if the time is up"""
+        if self.timeSet and time.time() > self.stopTime:
+            self.stopped = True
+        elif self.timeManager is not None and rootnode is not None and not self.infinite and (
+                self.timeManager.should_stop(rootnode, self.nodes)):
+            self.stopped = True
+
+
+def win_rate_to_centipawns(win_rate: float) -> int:
+    """Maps a win rate in [0, 1] to a centipawn score using the usual logistic pawn advantage model"""
+    win_rate = min(max(win_rate, 0.001), 0.999)
+    return int(round(-400 * log10(1 / win_rate - 1)))
+
+
+def get_info_line(pos: Board, rootnode, info: SearchInfo) -> str:
+    """Formats a uci 'info' line from the current state of the search tree"""
+    elapsed = max(time.time() - info.startTime, 0.001)
+    line = ["info", "nodes", str(info.nodes), "nps", str(int(info.nodes / elapsed)), "time", str(int(elapsed * 1000))]
+
+    best_node = rootnode.get_most_visited_child()
+    if best_node is not None:
+        # wins of a child node are from the POV of the player that made the move -> the side to move at the root
+        pv = rootnode.get_principal_variation()
+        line += ["depth", str(len(pv)), "score"] + _get_score(best_node, pv) + ["pv"]
+        line += _get_pv_strings(pos, pv)
+
+    return " ".join(line)
+
+
+def _get_score(best_node, pv) -> list:
+    # a proven win is a mate at the end of the pv (which ends in the mated position), a proven loss is mate against us
+    if best_node.proven == WIN:
+        return ["mate", str((len(pv) + 1) // 2)]
+    if best_node.proven == LOSS:
+        return ["mate", str(-(len(pv) // 2))]
+    if best_node.proven == DRAW:
+        return ["cp", "0"]
+    return ["cp", str(win_rate_to_centipawns(best_node.wins / best_node.visits))]
+
+
+def _get_pv_strings(pos: Board, pv) -> list:
+    # moves have to be printed from the position in which they are played -> walk the line and rewind
+    snapshot = pos.get_snapshot()
+    pv_strings = []
+    for move in pv:
+        pv_strings.append(pos.moveGenerator.print_move(move))
+        pos.make_move(move)
+
+    pos.rewind(snapshot)
+    return pv_strings
+
+
+class SearchResult:
+    """Details of the move returned by search_position: where it came from ('book', 'tablebase', 'store', 'cache' or
+    'search'), the simulations of the root (nodes) and, where known, the visits and win rate of the move
+    """
+    __slots__ = ['bestMove', 'source', 'nodes', 'visits', 'winRate']
+
+    def __init__(self):
+        self.bestMove: int = NO_MOVE
+        self.source: str = None
+        self.nodes: int = 0
+        self.visits: int = None
+        self.winRate: float = None
+
+
+def search_tree(pos: Board, simulations=1000, info: SearchInfo = None, rootnode=None, tablebase=None,
+                rollout_policy=None, rave=False, selection_policy=None) -> Node:
+    """Searches the position and returns the root node of the search tree.
+    If info is given, its time limit and stop flag are respected and, if info.postThinking is set,
+    uci 'info' lines are printed periodically. An existing tree for pos can be passed in as rootnode to continue
+    searching it. With an endgame tablebase (lib.tablebase.Tablebase) positions covered by the tables are
+    terminal for the search. rollout_policy (see lib.rollout) picks the moves of the simulations, selection_policy
+    (see lib.selection) the children in the tree and rave enables all-moves-as-first statistics.
+    """
+    if info is None:
+        info = SearchInfo()
+        info.reset()
+
+    if info.infinite:
+        simulations = INFINITE_SIMULATIONS
+
+    def on_iteration(node, iterations) -> bool:
+        info.nodes = iterations
+        info.check_up(node)
+
+        if info.postThinking and time.time() - info.lastInfoTime >= INFO_INTERVAL:
+            info.lastInfoTime = time.time()
+            print(get_info_line(pos, node, info), flush=True)
+
+        return info.stopped
+
+    previous_tablebase = pos.tablebase
+    if tablebase is not None:
+        pos.tablebase = tablebase
+    try:
+        rootnode = uct_search(rootstate=pos, itermax=simulations, rootnode=rootnode, on_iteration=on_iteration,
+                              rollout_policy=rollout_policy, rave=rave, selection_policy=selection_policy,
+                              stop_when_proven=not info.infinite)
+    finally:
+        pos.tablebase = previous_tablebase
+
+    if info.postThinking:
+        print(get_info_line(pos, rootnode, info), flush=True)
+
+    return rootnode
+
+
+def search_position(pos: Board, simulations=1000, info: SearchInfo = None, rootnode=None,
+                    store: PositionStore = None, book=None, tablebase=None, tree=None, cache=None,
+                    result: SearchResult = None) -> int:
+    """Searches the position and returns the best move found (NO_MOVE if there are no legal moves).
+    A move from the opening book (lib.book.OpeningBook, if given) is returned without searching and so is the
+    fastest mate (or the best defence) of a position covered by the tablebase (if given, unless the search is infinite).
+    If a position store is given, a stored result of at least as many simulations is returned without searching and
+    the result of the search is written back to the store.
+    A tree loaded from disk (lib.treefile.SearchTree) is searched further if it belongs to pos (same posKey)
+    and there is no rootnode, other trees are ignored.
+    A result cache (lib.cache.ResultCache) returns the best move of a search of pos with the same simulations without
+    searching, or warm starts the search from a cached tree of fewer simulations. Searches with a time limit are
+    neither looked up nor cached, their result does not depend on the simulations alone.
+    If a SearchResult is given it is filled in with the details of the returned move.
+    """
+    if result is None:
+        result = SearchResult()
+
+    if book is not None:
+        move = book.get_move(pos)
+        if move != NO_MOVE:
+            result.bestMove, result.source = move, "book"
+            return move
+
+    if tablebase is not None and (info is None or not info.infinite):
+        move = tablebase.get_best_move(pos)
+        if move != NO_MOVE:
+            result.bestMove, result.source = move, "tablebase"
+            return move
+
+    if store is not None:
+        entry = store.probe(pos)
+        if entry is not None and entry.visits >= simulations:
+            result.bestMove, result.source, result.nodes, result.winRate = \
+                entry.bestMove, "store", entry.visits, entry.winRate
+            return entry.bestMove
+
+    if rootnode is None and tree is not None and tree.posKey == pos.posKey.value:
+        rootnode = tree.root
+
+    use_cache = cache is not None and (info is None or not (info.timeSet or info.infinite))
+    remaining = simulations
+    if use_cache:
+        entry = cache.get(pos, simulations)
+        if entry is not None:
+            result.bestMove, result.source, result.nodes = entry.bestMove, "cache", entry.visits
+            if entry.bestMove != NO_MOVE:
+                result.visits = max(visits for _, visits, _ in entry.children)
+                result.winRate = entry.winRate
+            return entry.bestMove
+
+        if rootnode is None:
+            rootnode = cache.take_tree(pos, simulations)
+            if rootnode is not None:
+                remaining = simulations - rootnode.visits
+
+    root = search_tree(pos, remaining, info, rootnode, tablebase)
+    if use_cache:
+        cache.put(pos, simulations, root)
+
+    result.source, result.nodes = "search", root.visits
+    best_node = root.get_most_visited_child()
+    if best_node is None:
+        result.bestMove = NO_MOVE
+        return NO_MOVE
+
+    result.bestMove, result.visits, result.winRate = best_node.move, best_node.visits, best_node.wins / best_node.visits
+    if store is not None:
+        store.store(pos, best_node.move, root.visits, result.winRate)
+
+    return best_node.move
+
+
+def start_pondering(pos: Board, rootnode: Node = None):
+    """Starts an infinite search of pos (usually the opponent to move) in a background thread.
+    Returns the thread, its SearchInfo and the root node of the tree being searched. The caller owns the tree
+    again once stop_pondering returns.
+    """
+    info = SearchInfo()
+    info.reset()
+    info.infinite = True
+
+    state = pos.__copy__()
+    if rootnode is None:
+        rootnode = Node(state=state)
+
+    thread = Thread(target=search_tree, args=(state, INFINITE_SIMULATIONS, info, rootnode), daemon=True)
+    thread.start()
+    return thread, info, rootnode
+
+
+def stop_pondering(thread: Thread, info: SearchInfo):
+    info.stopped = True
+    thread.join()
@@ -0,0 +1,144 @@
+from array import array
+from math import log, sqrt
+
+from lib.constants import LOSS
+
+
+# Selection policies pick the child of a fully widened node to descend into during the tree walk of a search.
+# select_child(node) gets a node with at least one visited child and returns one of node.childNodes.
+# Children proven to lose for the player to move (see Node.proven) are only selected if there is nothing else.
+
+DEFAULT_UCB1_C = sqrt(2)  # the exploration constant of the original UCB1 formula
+DEFAULT_UCB1_TUNED_C = 1.0
+UCB1_TUNED_VARIANCE_C = sqrt(2)  # the variance bound of a child is variance + this * sqrt(log(n) / visits)
+MAX_VARIANCE = 0.25  # of results in [0, 1], the bound of UCB1-Tuned is capped by it
+SQRT_MAX_VARIANCE = sqrt(MAX_VARIANCE)
+DEFAULT_PUCT_C = 1.5
+RAVE_EQUIVALENCE = 500  # the AMAF win rate of a child is weighted by sqrt(k / (3 * visits + k)) with this k
+
+# log(n), sqrt(n) and sqrt(log(n)) of small visit counts, the descent loop only computes them for larger counts
+TABLE_SIZE = 1 << 14
+LOG_TABLE = array('d', [0.0] + [log(n) for n in range(1, TABLE_SIZE)])
+SQRT_TABLE = array('d', [sqrt(n) for n in range(TABLE_SIZE)])
+SQRT_LOG_TABLE = array('d', [sqrt(value) for value in LOG_TABLE])
+
+
+def get_log(n: int) -> float:
+    return LOG_TABLE[n] if n < TABLE_SIZE else log(n)
+
+
+def get_sqrt(n: int) -> float:
+    return SQRT_TABLE[n] if n < TABLE_SIZE else sqrt(n)
+
+
+def get_sqrt_log(n: int) -> float:
+    return SQRT_LOG_TABLE[n] if n < TABLE_SIZE else sqrt(log(n))
+
+
+class UCB1:
+    """wins / visits + c * sqrt(log(parent visits) / visits)"""
+
+    def __init__(self, c: float = DEFAULT_UCB1_C):
+        self.c = c
+
+    def select_child(self, node):
+        exploration = self.c * get_sqrt_log(node.visits)
+        best, best_value = node.childNodes[0], -1.0
+        for child in node.childNodes:
+            if child.proven == LOSS:
+                continue
+            visits = child.visits
+            value = child.wins / visits + exploration / (SQRT_TABLE[visits] if visits < TABLE_SIZE else sqrt(visits))
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+
+class UCB1Tuned:
+    """UCB1 with the exploration of a child bounded by the observed variance of its results (Auer et al.)"""
+
+    def __init__(self, c: float = DEFAULT_UCB1_TUNED_C):
+        self.c = c
+
+    def select_child(self, node):
+        # sqrt(log(n) / visits * min(MAX_VARIANCE, variance)) with the square roots of the visits from the tables,
+        # only the square root of a variance below MAX_VARIANCE is computed
+        sqrt_log_visits = get_sqrt_log(node.visits)
+        best, best_value = node.childNodes[0], -1.0
+        for child in node.childNodes:
+            if child.proven == LOSS:
+                continue
+            visits = child.visits
+            exploration = sqrt_log_visits / (SQRT_TABLE[visits] if visits < TABLE_SIZE else sqrt(visits))
+            mean = child.wins / visits
+            variance = child.squaredWins / visits - mean * mean + UCB1_TUNED_VARIANCE_C * exploration
+            value = mean + self.c * exploration * (SQRT_MAX_VARIANCE if variance >= MAX_VARIANCE else sqrt(variance))
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+
+class PUCT:
+    """wins / visits + c * prior * sqrt(parent visits) / (1 + visits), with the move priors of the expansion
+    order (see Node.prior).
+    """
+
+    def __init__(self, c: float = DEFAULT_PUCT_C):
+        self.c = c
+
+    def select_child(self, node):
+        exploration = self.c * get_sqrt(node.visits)
+        best, best_value = node.childNodes[0], -1.0
+        for child in node.childNodes:
+            if child.proven == LOSS:
+                continue
+            value = child.wins / child.visits + exploration * child.prior / (1 + child.visits)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+
+class RAVE(UCB1):
+    """UCB1 on the win rate of a child blended with its all-moves-as-first win rate. The weight of the AMAF value
+    shrinks as the child gets visits (see RAVE_EQUIVALENCE). Needs a search that updates AMAF statistics.
+    """
+
+    def __init__(self, c: float = DEFAULT_UCB1_C, equivalence: int = RAVE_EQUIVALENCE):
+        super().__init__(c)
+        self.equivalence = equivalence
+        self.betaTable = array('d', [sqrt(equivalence / (3 * n + equivalence)) for n in range(TABLE_SIZE)])
+
+    def get_beta(self, visits: int) -> float:
+        if visits < TABLE_SIZE:
+            return self.betaTable[visits]
+        return sqrt(self.equivalence / (3 * visits + self.equivalence))
+
+    def select_child(self, node):
+        exploration = self.c * get_sqrt_log(node.visits)
+        best, best_value = node.childNodes[0], -1.0
+        for child in node.childNodes:
+            if child.proven == LOSS:
+                continue
+            visits = child.visits
+            value = child.wins / visits
+            if child.amafVisits:
+                value += self.get_beta(visits) * (child.amafWins / child.amafVisits - value)
+            value += exploration / (SQRT_TABLE[visits] if visits < TABLE_SIZE else sqrt(visits))
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+
+SELECTION_POLICIES = {
+    "ucb1": UCB1,
+    "ucb1-tuned": UCB1Tuned,
+    "puct": PUCT,
+    "rave": RAVE,
+}
+
+
+def get_selection_policy(name: str):
+    """Returns a new selection policy with its default constants by its name (see SELECTION_POLICIES)"""
+    if name not in SELECTION_POLICIES:
+        raise ValueError("unknown selection policy {} (choose from {})".format(name, ", ".join(SELECTION_POLICIES)))
+    return SELECTION_POLICIES[name]()
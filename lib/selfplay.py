@@ -0,0 +1,139 @@
+import mmap
+import os
+import random
+import struct
+from multiprocessing import Pool
+from typing import List, Tuple
+
+from lib.mcts import rand_choice
+from lib.search import *
+
+
+MAX_RECORDED_CHILDREN = 32  # visit distribution of the (at most) 32 most visited root children is stored
+
+# Fixed size record for every searched position of a self-play game (little endian, no padding):
+#   game id (I), ply (H), packed position (PACKED_POSITION_SIZE bytes), game result from the POV of the side to
+#   move (b: 1 win, 0 draw, -1 loss), played move (I), number of stored children (B), total visits of the root
+#   children that were not stored (I) and MAX_RECORDED_CHILDREN x (child move (I), child visits (I))
+# Roots with more than MAX_RECORDED_CHILDREN children keep only the most visited ones, the dropped visits keep the
+# stored visits plus the dropped visits equal to the visits of all children.
+RECORD_HEADER_FORMAT = "<IH{}sbIBI".format(PACKED_POSITION_SIZE)
+RECORD_FORMAT = RECORD_HEADER_FORMAT + "II" * MAX_RECORDED_CHILDREN
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+_record_struct = struct.Struct(RECORD_FORMAT)
+
+
+class SelfPlayRecord:
+    """A position of a self-play game read back from a record file"""
+    __slots__ = ['gameId', 'ply', 'packedPosition', 'result', 'move', 'children', 'droppedVisits']
+
+    def __init__(self, fields):
+        self.gameId: int = fields[0]
+        self.ply: int = fields[1]
+        self.packedPosition: bytes = fields[2]
+        self.result: int = fields[3]
+        self.move: int = fields[4]
+        # list of (move, visits) of the most visited root children
+        self.children: List[Tuple[int, int]] = [(fields[7 + 2 * i], fields[8 + 2 * i]) for i in range(fields[5])]
+        self.droppedVisits: int = fields[6]  # visits of the root children that are not in children
+
+
+def pack_record(game_id: int, ply: int, packed_position: bytes, result: int, move: int, children) -> bytes:
+    children = sorted(children, key=lambda c: c[1], reverse=True)
+    dropped_visits = sum(visits for _, visits in children[MAX_RECORDED_CHILDREN:])
+    children = children[:MAX_RECORDED_CHILDREN]
+
+    values = [game_id, ply, packed_position, result, move, len(children), dropped_visits]
+    for child_move, visits in children:
+        values += [child_move, visits]
+    values += [NO_MOVE, 0] * (MAX_RECORDED_CHILDREN - len(children))
+
+    return _record_struct.pack(*values)
+
+
+def play_game(game_id: int, seed: int, simulations=1000, move_time=0.0, random_plies=0, max_plies=400,
+              start_fen=START_FEN) -> bytes:
+    """Plays one self-play game and returns the records of all searched positions.
+    The first random_plies moves are played uniformly at random (and not recorded) to diversify the openings.
+    """
+    random.seed(seed)
+
+    board = Board()
+    board.parse_fen(start_fen)
+    positions = []
+
+    while board.get_result(board.playerJustMoved) is None and board.histPly < max_plies:
+        if board.histPly < random_plies:
+            board.make_move(rand_choice(board.get_moves()))
+            continue
+
+        info = SearchInfo()
+        info.reset()
+        if move_time > 0:
+            info.timeSet = True
+            info.stopTime = info.startTime + move_time
+
+        root = search_tree(board, simulations=simulations if simulations > 0 else INFINITE_SIMULATIONS, info=info)
+        move = root.get_most_visited_child().move
+        positions.append((board.histPly, board.get_packed_position(), board.side, move,
+                          [(c.move, c.visits) for c in root.childNodes]))
+        board.make_move(move)
+
+    # unfinished games (max_plies reached) are recorded as draws
+    white_result = board.get_result(WHITE)
+    white_score = 0 if white_result is None or white_result == DRAW else (1 if white_result == WIN else -1)
+
+    return b"".join(pack_record(game_id, ply, packed, white_score if side == WHITE else -white_score, move, children)
+                    for ply, packed, side, move, children in positions)
+
+
+def _play_game_star(args) -> bytes:
+    return play_game(*args)
+
+
+def run_selfplay(path: str, games: int, workers=1, simulations=1000, move_time=0.0, random_plies=8, max_plies=400,
+                 seed=None, start_fen=START_FEN, first_game_id=None) -> int:
+    """Plays games concurrently over a pool of worker processes and appends the records of every finished game
+    to the record file at path. The games are numbered from first_game_id on, by default they continue after the
+    last game already in the file. Returns the number of written records.
+    """
+    seed = random.getrandbits(32) if seed is None else seed
+    if first_game_id is None:
+        first_game_id = get_next_game_id(path)
+    tasks = ((first_game_id + i, seed + i, simulations, move_time, random_plies, max_plies, start_fen)
+             for i in range(games))
+
+    count = 0
+    with open(path, "ab") as record_file:
+        def append(records: bytes):
+            record_file.write(records)
+            record_file.flush()
+            return len(records) // RECORD_SIZE
+
+        if workers <= 1:
+            for task in tasks:
+                count += append(_play_game_star(task))
+            return count
+
+        with Pool(processes=workers) as pool:
+            for records in pool.imap_unordered(_play_game_star, tasks):
+                count += append(records)
+
+    return count
+
+
+def get_next_game_id(path: str) -> int:
+    """Returns the id after the highest game id of the record file at path (0 for a missing or empty file)"""
+    if not os.path.exists(path):
+        return 0
+    return max((record.gameId + 1 for record in iter_records(path)), default=0)
+
+
+def iter_records(path: str):
+    """Yields the records of a record file, reading it through a memory map"""
+    if os.path.getsize(path) < RECORD_SIZE:
+        return
+
+    with open(path, "rb") as record_file, mmap.mmap(record_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for index in range(len(mm) // RECORD_SIZE):
+            yield SelfPlayRecord(_record_struct.unpack_from(mm, index * RECORD_SIZE))
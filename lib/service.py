@@ -0,0 +1,222 @@
+import asyncio
+import itertools
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from lib.batch import analyse_position
+from lib.board import Board
+from lib.constants import *
+
+
+# Analysis service: clients send json lines over tcp and get one json line back per request, in completion order.
+#   {"id": ..., "fen": ..., "nodes": 1000, "movetime": 0, "priority": 0} - analyse (movetime in ms, lower priority
+#                                                                          values are searched first)
+#   {"cmd": "cancel", "id": ...}                                        - cancel a request of this connection (its
+#                                                                          search keeps running if it already started)
+# Responses are the results of lib.batch.analyse_position with the id of the request or {"id": ..., "error": ...}.
+# The id of an analysis is required and must not be used by another request of the connection that is in flight.
+# Every worker process caches its results (see lib.cache), popular positions are answered without searching.
+
+DEFAULT_SERVICE_PORT = 9078
+DEFAULT_SERVICE_WORKERS = 2
+MAX_PENDING_JOBS = 256  # searches waiting for a worker, further requests are rejected as busy
+MAX_REQUESTS_PER_CLIENT = 16  # requests of a connection in flight before the service stops reading from it
+
+
+class ServiceBusy(Exception):
+    """Raised when a request can not be queued because MAX_PENDING_JOBS searches are waiting"""
+
+
+class AnalysisJob:
+    """One search, shared by all requests of the same position (posKey) and budget"""
+    __slots__ = ['key', 'fen', 'simulations', 'moveTime', 'priority', 'waiters', 'started']
+
+    def __init__(self, key: tuple, fen: str, simulations: int, move_time: float, priority: int):
+        self.key: tuple = key
+        self.fen: str = fen
+        self.simulations: int = simulations
+        self.moveTime: float = move_time
+        self.priority: int = priority
+        self.waiters: List[asyncio.Future] = []  # futures of the requests waiting for the result
+        self.started: bool = False
+
+
+class AnalysisService:
+    """Schedules analysis requests onto a bounded pool of worker processes. Requests for a position and budget that
+    is already queued or searched wait for that search instead of starting another one. Queued searches are started
+    in priority order, a search nobody waits for anymore (cancelled requests) is dropped before it starts. A search
+    that already started runs to the end, its result is only not sent to cancelled requests.
+    """
+    def __init__(self, workers: int = DEFAULT_SERVICE_WORKERS, max_pending: int = MAX_PENDING_JOBS):
+        self.workers = workers
+        self.maxPending = max_pending
+        self.jobs: Dict[tuple, AnalysisJob] = {}  # queued and running searches
+        self.pending = 0  # number of queued searches
+        self.searches = 0  # number of searches started
+        self.counter = itertools.count()  # keeps the queue first in first out within a priority
+        self.queue: asyncio.PriorityQueue = None
+        self.executor: ProcessPoolExecutor = None
+        self.dispatchers: List[asyncio.Task] = []
+
+    async def start(self):
+        self.queue = asyncio.PriorityQueue()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def close(self):
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        self.executor.shutdown(cancel_futures=True)
+
+    def submit(self, fen: str, simulations: int = 1000, move_time: float = 0.0, priority: int = 0) -> asyncio.Future:
+        """Queues the analysis of fen and returns a future of its result (see lib.batch.analyse_position).
+        Raises ValueError for an invalid FEN and ServiceBusy when too many searches are waiting.
+        """
+        # parsing the fen is the cheapest way to the posKey of the dedup key, it runs in the event loop but takes far
+        # less time than the search it may save
+        pos = Board()
+        try:
+            pos.parse_fen(fen)
+        except (AssertionError, KeyError, IndexError, ValueError):
+            raise ValueError("invalid fen")
+
+        key = (pos.posKey.value, simulations, move_time)
+        job = self.jobs.get(key)
+        if job is None:
+            if self.pending >= self.maxPending:
+                raise ServiceBusy()
+            job = AnalysisJob(key, fen, simulations, move_time, priority)
+            self.jobs[key] = job
+            self.pending += 1
+            self.queue.put_nowait((priority, next(self.counter), job))
+        elif not job.started and priority < job.priority:
+            # queue it again with the higher priority, the old queue entry is skipped once the job started
+            job.priority = priority
+            self.queue.put_nowait((priority, next(self.counter), job))
+
+        future = asyncio.get_running_loop().create_future()
+        job.waiters.append(future)
+        return future
+
+    def cancel(self, future: asyncio.Future):
+        """Cancels the request of future. Its search is dropped if it did not start and nobody else waits for it,
+        a running search is not interrupted.
+        """
+        for job in self.jobs.values():
+            if future in job.waiters:
+                job.waiters.remove(future)
+                if not job.waiters and not job.started:
+                    del self.jobs[job.key]
+                    self.pending -= 1
+                break
+        future.cancel()
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job = await self.queue.get()
+            if job.started or self.jobs.get(job.key) is not job:
+                continue  # a stale entry of a job queued again or a dropped job
+
+            job.started = True
+            self.pending -= 1
+            self.searches += 1
+            try:
+                result = await loop.run_in_executor(self.executor, analyse_position, job.fen, None, job.simulations,
+                                                    job.moveTime, None, True)
+            except Exception as error:  # a crashed worker must not take the service down
+                result = {"fen": job.fen, "error": str(error)}
+            finally:
+                del self.jobs[job.key]
+
+            for future in job.waiters:
+                if not future.done():
+                    future.set_result(result)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serves the requests of one connection until it is closed"""
+        in_flight = asyncio.Semaphore(MAX_REQUESTS_PER_CLIENT)
+        requests: Dict[object, asyncio.Future] = {}
+        responders = set()  # the event loop only keeps weak references to tasks
+
+        async def send(message: dict):
+            if writer.is_closing():
+                return  # the client is gone
+            try:
+                writer.write((json.dumps(message) + "\n").encode())
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+        async def respond(request_id, future: asyncio.Future):
+            try:
+                message = dict(await future, id=request_id)
+            except asyncio.CancelledError:
+                message = {"id": request_id, "error": "cancelled"}
+            except Exception as error:  # e.g. BrokenProcessPool, the client still gets a reply
+                message = {"id": request_id, "error": str(error)}
+            finally:
+                requests.pop(request_id, None)
+                in_flight.release()
+            await send(message)
+
+        try:
+            while True:
+                # back-pressure: a client with too many requests in flight is not read until one of them finishes
+                await in_flight.acquire()
+                line = await reader.readline()
+                if not line:
+                    break
+
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request.get("id")
+                    if request.get("cmd") == "cancel":
+                        if request_id in requests:
+                            self.cancel(requests[request_id])
+                        in_flight.release()
+                        continue
+
+                    if request_id is None or request_id in requests:
+                        raise ValueError("missing id" if request_id is None else "duplicate id {}".format(request_id))
+                    future = self.submit(request["fen"], int(request.get("nodes", 1000)),
+                                         request.get("movetime", 0) / 1000, int(request.get("priority", 0)))
+                except ServiceBusy:
+                    in_flight.release()
+                    await send({"id": request_id, "error": "busy"})
+                    continue
+                except (ValueError, KeyError, TypeError, AttributeError) as error:
+                    in_flight.release()
+                    await send({"id": request_id, "error": "bad request: {}".format(error)})
+                    continue
+
+                requests[request_id] = future
+                responder = asyncio.create_task(respond(request_id, future))
+                responders.add(responder)
+                responder.add_done_callback(responders.discard)
+        except ConnectionError:
+            pass
+        finally:
+            for future in list(requests.values()):  # nobody is left to read these results
+                self.cancel(future)
+            writer.close()
+
+
+async def start_service(host: str = "", port: int = DEFAULT_SERVICE_PORT, workers: int = DEFAULT_SERVICE_WORKERS):
+    """Starts the analysis service and returns (service, server). Close the server and the service when done."""
+    service = AnalysisService(workers)
+    await service.start()
+    server = await asyncio.start_server(service.handle_client, host, port)
+    return service, server
+
+
+async def serve(host: str = "", port: int = DEFAULT_SERVICE_PORT, workers: int = DEFAULT_SERVICE_WORKERS):
+    """Runs the analysis service until it is cancelled"""
+    service, server = await start_service(host, port, workers)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
@@ -0,0 +1,109 @@
+import os
+import struct
+from multiprocessing import Lock, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from lib.constants import *
+
+
+DEFAULT_TABLE_CAPACITY = 1 << 18  # number of slots, always a power of 2
+BUCKET_SIZE = 4  # consecutive slots a position key may be stored in
+DEFAULT_LOCK_STRIPES = 64  # a bucket is guarded by lock number bucket % stripes
+
+# posKey (0 - empty slot), wins from the POV of the player that just moved, visits, proven result (see below)
+_slot_struct = struct.Struct("<QdIb3x")
+SLOT_SIZE = _slot_struct.size
+
+NOT_PROVEN = -1  # proven results are stored as int(result * 2), i.e. 0 - loss, 1 - draw, 2 - win
+
+
+class TableEntry:
+    """Search statistics of a position shared by all workers"""
+    __slots__ = ['visits', 'wins', 'proven']
+
+    def __init__(self, visits: int, wins: float, proven):
+        self.visits: int = visits
+        self.wins: float = wins
+        self.proven = proven  # proven result (POV of the player that just moved) or None
+
+
+class SharedTable:
+    """Transposition table in shared memory, keyed by posKey, that search processes read and write at the same
+    time. Every key has a bucket of BUCKET_SIZE slots, the slot with the least visits is replaced when all of them
+    are taken. Buckets are guarded by a fixed number of striped locks.
+    A table is passed to worker processes as a Process argument, they attach to the same memory. The process that
+    created the table has to unlink it once all workers are done.
+    """
+    def __init__(self, capacity: int = DEFAULT_TABLE_CAPACITY, stripes: int = DEFAULT_LOCK_STRIPES):
+        assert capacity >= BUCKET_SIZE and capacity & (capacity - 1) == 0, "capacity must be a power of 2"
+
+        self.capacity = capacity
+        self.locks = [Lock() for _ in range(stripes)]
+        self.memory = SharedMemory(create=True, size=capacity * SLOT_SIZE)
+        self.memory.buf[:capacity * SLOT_SIZE] = bytes(capacity * SLOT_SIZE)
+        self.owner = True
+
+    def __getstate__(self):
+        return self.memory.name, self.capacity, self.locks
+
+    def __setstate__(self, state):
+        name, self.capacity, self.locks = state
+        self.owner = False
+        try:
+            self.memory = SharedMemory(name=name, track=False)  # python 3.13+
+        except TypeError:
+            self.memory = SharedMemory(name=name)
+            # before 3.13 attaching registers the memory with the resource tracker (posix only, under the name with
+            # a leading slash), which would unlink it when this process ends
+            if os.name == "posix":
+                resource_tracker.unregister("/" + self.memory.name, "shared_memory")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Detaches from the shared memory, the creating process also frees it"""
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def _get_bucket(self, key: int):
+        bucket = (key // BUCKET_SIZE) & (self.capacity // BUCKET_SIZE - 1)
+        return bucket * BUCKET_SIZE * SLOT_SIZE, self.locks[bucket % len(self.locks)]
+
+    def probe(self, key: int):
+        """Returns the TableEntry of the position key or None"""
+        offset, lock = self._get_bucket(key)
+        buffer = self.memory.buf
+        with lock:
+            for slot in range(BUCKET_SIZE):
+                slot_key, wins, visits, proven = _slot_struct.unpack_from(buffer, offset + slot * SLOT_SIZE)
+                if slot_key == key:
+                    return TableEntry(visits, wins, None if proven == NOT_PROVEN else proven / 2)
+        return None
+
+    def update(self, key: int, result: float, proven=None):
+        """Adds one visit with result (POV of the player that just moved) to the position key and stores its proven
+        result if given. Replaces the least visited entry of the bucket for a new key.
+        """
+        offset, lock = self._get_bucket(key)
+        buffer = self.memory.buf
+        with lock:
+            replace_offset, replace_visits = offset, None
+            for slot in range(BUCKET_SIZE):
+                slot_offset = offset + slot * SLOT_SIZE
+                slot_key, wins, visits, slot_proven = _slot_struct.unpack_from(buffer, slot_offset)
+                if slot_key == key:
+                    if proven is not None:
+                        slot_proven = int(proven * 2)
+                    _slot_struct.pack_into(buffer, slot_offset, key, wins + result, visits + 1, slot_proven)
+                    return
+
+                if replace_visits is None or visits < replace_visits:
+                    replace_offset, replace_visits = slot_offset, visits
+
+            _slot_struct.pack_into(buffer, replace_offset, key, result, 1,
+                                   NOT_PROVEN if proven is None else int(proven * 2))
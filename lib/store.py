@@ -0,0 +1,126 @@
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on windows, the store is unlocked there
+    fcntl = None
+
+from lib.board import Board
+from lib.constants import *
+
+
+STORE_MAGIC = b"HUGOPS01"
+DEFAULT_STORE_CAPACITY = 1 << 20  # number of slots, always a power of 2
+MAX_PROBES = 8  # number of consecutive slots that are tried for a position key
+
+_header_struct = struct.Struct("<8sQ")  # magic, capacity
+# posKey (0 - empty slot), packed position, best move, visits, win rate of the best move from the POV of the
+# side to move
+_slot_struct = struct.Struct("<Q{}sIIf".format(PACKED_POSITION_SIZE))
+SLOT_SIZE = _slot_struct.size
+
+
+class StoreEntry:
+    """Result of a previous search of a position"""
+    __slots__ = ['bestMove', 'visits', 'winRate']
+
+    def __init__(self, best_move: int, visits: int, win_rate: float):
+        self.bestMove: int = best_move
+        self.visits: int = visits
+        self.winRate: float = win_rate
+
+
+class PositionStore:
+    """On disk store of analysed positions. The file is an open addressing hash table of fixed size slots indexed
+    by posKey and is accessed through a shared memory map, so lookups read the slots in place and all processes that
+    open the same file see each other's results.
+    Entries are verified against the packed position to protect against key collisions. When all MAX_PROBES slots
+    of a key are taken the one with the least visits is replaced.
+    Processes lock the file (flock) while they access it: readers share the lock, a writer holds it exclusively
+    from probing for a slot to writing it, so concurrent writers can not take the same slot or interleave their writes.
+    """
+    def __init__(self, path: str, capacity: int = DEFAULT_STORE_CAPACITY):
+        assert capacity > 0 and capacity & (capacity - 1) == 0, "capacity must be a power of 2"
+
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "wb") as store_file:
+                store_file.write(_header_struct.pack(STORE_MAGIC, capacity))
+                store_file.truncate(_header_struct.size + capacity * SLOT_SIZE)
+
+        self.file = open(path, "r+b")
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+
+        magic, self.capacity = _header_struct.unpack_from(self.mm, 0)
+        if magic != STORE_MAGIC or len(self.mm) != _header_struct.size + self.capacity * SLOT_SIZE:
+            self.close()
+            raise ValueError("{} is not a position store".format(path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def _get_offset(self, slot: int) -> int:
+        return _header_struct.size + (slot & (self.capacity - 1)) * SLOT_SIZE
+
+    def probe(self, pos: Board):
+        """Returns the StoreEntry of the position or None if it was never stored"""
+        key = pos.posKey.value
+        packed = None
+
+        with self._locked(exclusive=False):
+            for probe in range(MAX_PROBES):
+                offset = self._get_offset(key + probe)
+                slot_key, slot_packed, best_move, visits, win_rate = _slot_struct.unpack_from(self.mm, offset)
+                if slot_key == 0:
+                    return None
+
+                if slot_key == key:
+                    if packed is None:
+                        packed = pos.get_packed_position()
+                    if slot_packed == packed:
+                        return StoreEntry(best_move, visits, win_rate)
+
+        return None
+
+    def store(self, pos: Board, best_move: int, visits: int, win_rate: float):
+        """Stores the result of a search. An existing entry of the position is only replaced by one with more visits"""
+        key = pos.posKey.value
+        packed = pos.get_packed_position()
+
+        with self._locked(exclusive=True):
+            target_offset, target_visits = None, None
+            for probe in range(MAX_PROBES):
+                offset = self._get_offset(key + probe)
+                slot_key, slot_packed, _, slot_visits, _ = _slot_struct.unpack_from(self.mm, offset)
+
+                if slot_key == 0 or (slot_key == key and slot_packed == packed):
+                    if slot_key != 0 and slot_visits >= visits:
+                        return  # we already know more about this position
+                    target_offset = offset
+                    break
+
+                if target_visits is None or slot_visits < target_visits:
+                    target_offset, target_visits = offset, slot_visits
+
+            _slot_struct.pack_into(self.mm, target_offset, key, packed, best_move, visits, win_rate)
@@ -0,0 +1,437 @@
+import mmap
+import os
+from typing import Optional, Tuple
+
+from lib.constants import *
+
+
+# Endgame tablebases for small pawnless material sets (i.e. KQvK, KRvK, KQvKR, KBNvK).
+#
+# A table holds one byte for every placement of its pieces and side to move (64^pieces * 2 bytes) indexed by the
+# 64 based squares of the pieces in signature order (kings first), i.e. for KQvK: wk, wq, bk, side to move.
+# The byte encodes the result for the side to move and the distance to mate (DTM) in plies:
+#   0 - draw, odd value d - win in d plies, even value d >= 2 - loss in d - 2 plies, 255 - illegal position.
+# Tables are generated by retrograde analysis: starting from the mates, positions are resolved in order of their
+# distance to mate by walking back through the moves that lead to them. Captures lead to the (smaller) tables of the
+# reduced material which are generated first.
+# Castling is not represented in the tables -> positions with castling permissions are not probed.
+
+TABLEBASE_MAGIC = b"HUGOTB01"
+TABLEBASE_EXTENSION = ".htb"
+MAX_TABLEBASE_PIECES = 4
+TB_DRAW = 0
+TB_ILLEGAL = 255
+MAX_DTM = 252
+DEFAULT_TABLEBASE_SIGNATURES = ["KQvK", "KRvK", "KBvK", "KNvK"]
+
+TB_PIECE_TYPES = "QRBN"  # non-king piece types, strongest first
+TB_PIECE_VALUES = {"Q": 9, "R": 5, "B": 3, "N": 3}
+BOARD_PIECE_TYPES = {WHITE_QUEEN: "Q", WHITE_ROOK: "R", WHITE_BISHOP: "B", WHITE_KNIGHT: "N", WHITE_KING: "K",
+                     BLACK_QUEEN: "Q", BLACK_ROOK: "R", BLACK_BISHOP: "B", BLACK_KNIGHT: "N", BLACK_KING: "K"}
+
+_ROOK_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+_BISHOP_DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+_KNIGHT_JUMPS = [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+
+
+def _build_targets(steps, repeat: bool) -> List[List[List[int]]]:
+    """For every 64 based square returns the list of rays (squares in the order they are reached) for the steps"""
+    rays = []
+    for sq in range(64):
+        square_rays = []
+        for file_step, rank_step in steps:
+            ray = []
+            file, rank = (sq & 7) + file_step, (sq >> 3) + rank_step
+            while 0 <= file < 8 and 0 <= rank < 8:
+                ray.append(rank * 8 + file)
+                if not repeat:
+                    break
+                file, rank = file + file_step, rank + rank_step
+            if ray:
+                square_rays.append(ray)
+        rays.append(square_rays)
+    return rays
+
+
+TB_RAYS = {
+    "K": _build_targets(_ROOK_DIRECTIONS + _BISHOP_DIRECTIONS, repeat=False),
+    "N": _build_targets(_KNIGHT_JUMPS, repeat=False),
+    "Q": _build_targets(_ROOK_DIRECTIONS + _BISHOP_DIRECTIONS, repeat=True),
+    "R": _build_targets(_ROOK_DIRECTIONS, repeat=True),
+    "B": _build_targets(_BISHOP_DIRECTIONS, repeat=True),
+}
+
+
+def encode_result(win: bool, dtm: int) -> int:
+    return dtm if win else dtm + 2
+
+
+def decode_result(value: int) -> Tuple[float, int]:
+    """Returns (result from the POV of the side to move, dtm in plies) of a table byte"""
+    if value == TB_DRAW:
+        return DRAW, 0
+    if value & 1:
+        return WIN, value
+    return LOSS, value - 2
+
+
+def get_signature(white: str, black: str) -> str:
+    """Returns the signature of a material set, i.e. ('KQ', 'K') -> 'KQvK'"""
+    return "{}v{}".format(white, black)
+
+
+def parse_signature(signature: str) -> Tuple[str, str]:
+    white, black = signature.upper().split("V")
+    if not (white.startswith("K") and black.startswith("K")) or "K" in white[1:] + black[1:]:
+        raise ValueError("invalid signature {}".format(signature))
+    if any(piece not in TB_PIECE_TYPES for piece in white[1:] + black[1:]):
+        raise ValueError("only pawnless signatures are supported: {}".format(signature))
+
+    order = "K" + TB_PIECE_TYPES
+    return "".join(sorted(white, key=order.index)), "".join(sorted(black, key=order.index))
+
+
+def _get_strength(pieces: str):
+    return sum(TB_PIECE_VALUES.get(piece, 0) for piece in pieces), len(pieces), [-"KQRBN".index(p) for p in pieces]
+
+
+def get_canonical_signature(white: str, black: str) -> Tuple[str, bool]:
+    """Returns the signature of the table that holds the material set and whether the colours have to be
+    swapped to look it up (the stronger side is always first in a table).
+    """
+    white, black = parse_signature(get_signature(white, black))
+    if _get_strength(black) > _get_strength(white):
+        return get_signature(black, white), True
+    return get_signature(white, black), False
+
+
+def get_table_size(signature: str) -> int:
+    white, black = parse_signature(signature)
+    return 2 * 64 ** (len(white) + len(black))
+
+
+def get_index(squares, side: int) -> int:
+    index = 0
+    for sq in squares:
+        index = index * 64 + sq
+    return index * 2 + side
+
+
+def _build_attacks(rays) -> List[int]:
+    """Bitmask of the squares reached from every square on an empty board"""
+    return [sum(1 << target for ray in square_rays for target in ray) for square_rays in rays]
+
+
+TB_ATTACKS = {piece: _build_attacks(rays) for piece, rays in TB_RAYS.items()}
+# TB_BETWEEN[a][b] - bitmask of the squares strictly between a and b if they share a line or diagonal
+TB_BETWEEN = [[0] * 64 for _ in range(64)]
+for _sq in range(64):
+    for _ray in TB_RAYS["Q"][_sq]:
+        for _i, _target in enumerate(_ray):
+            TB_BETWEEN[_sq][_target] = sum(1 << between for between in _ray[:_i])
+
+
+class Tablebase:
+    """Probes (and generates) endgame tables. Tables are read from directory (memory mapped) when they are first
+    needed, tables that were generated by this object are kept in memory.
+    """
+    def __init__(self, directory: str = None):
+        self.directory = directory
+        self.tables: Dict[str, bytes] = {}
+        self._files = []
+
+    def close(self):
+        for table_file, mm, table in self._files:
+            table.release()
+            mm.close()
+            table_file.close()
+        self._files = []
+        self.tables = {}
+
+    def get_table_path(self, signature: str) -> str:
+        return os.path.join(self.directory, signature + TABLEBASE_EXTENSION)
+
+    def get_table(self, signature: str):
+        """Returns the table data for a canonical signature or None if the table is not available"""
+        if signature in self.tables:
+            return self.tables[signature]
+
+        table = None
+        if self.directory is not None and os.path.exists(self.get_table_path(signature)):
+            table_file = open(self.get_table_path(signature), "rb")
+            mm = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+            header_size = len(TABLEBASE_MAGIC) + 8
+            if mm[:len(TABLEBASE_MAGIC)] != TABLEBASE_MAGIC or len(mm) != header_size + get_table_size(signature):
+                mm.close()
+                table_file.close()
+                raise ValueError("{} is not a valid table".format(self.get_table_path(signature)))
+
+            table = memoryview(mm)[header_size:]
+            self._files.append((table_file, mm, table))
+
+        self.tables[signature] = table
+        return table
+
+    def probe_pieces(self, white, black, side: int) -> Optional[Tuple[float, int]]:
+        """Probes a position given as lists of (piece type, 64 based square) for both colours.
+        Returns (result from the POV of the side to move, dtm in plies) or None if the table is not available.
+        """
+        if len(white) + len(black) > MAX_TABLEBASE_PIECES:
+            return None
+        if len(white) == 1 and len(black) == 1:
+            return DRAW, 0
+
+        order = "K" + TB_PIECE_TYPES
+        white = sorted(white, key=lambda p: order.index(p[0]))
+        black = sorted(black, key=lambda p: order.index(p[0]))
+        signature, swap = get_canonical_signature("".join(p for p, _ in white), "".join(p for p, _ in black))
+        if swap:
+            white, black, side = black, white, side ^ 1
+
+        table = self.get_table(signature)
+        if table is None:
+            return None
+
+        value = table[get_index([sq for _, sq in white] + [sq for _, sq in black], side)]
+        if value == TB_ILLEGAL:
+            return None
+        return decode_result(value)
+
+    def probe(self, pos) -> Optional[Tuple[float, int]]:
+        """Probes a board. Returns (result from the POV of the side to move, dtm in plies) or None if the
+        position is not covered by an available table.
+        """
+        if pos.pieceNumber[WHITE_PAWN] or pos.pieceNumber[BLACK_PAWN] or pos.castlePermissions:
+            return None
+        if sum(pos.pieceNumber) > MAX_TABLEBASE_PIECES:
+            return None
+
+        white, black = [], []
+        for sq64 in range(64):
+            piece = pos.pieces[pos.conversion.Sq64ToSq120[sq64]]
+            if piece != EMPTY:
+                (white if PIECE_COLOR_MAP[piece] == WHITE else black).append((BOARD_PIECE_TYPES[piece], sq64))
+
+        return self.probe_pieces(white, black, pos.side)
+
+    def get_best_move(self, pos) -> int:
+        """Returns the move that keeps the best tablebase result (fastest win, slowest loss) or NO_MOVE if the
+        position is not covered.
+        """
+        if self.probe(pos) is None:
+            return NO_MOVE
+
+        best_move, best_score = NO_MOVE, None
+        for move in pos.get_moves():
+            pos.make_move(move)
+            probed = self.probe(pos)
+            pos.take_move()
+            if probed is None:
+                continue
+
+            # child results are from the opponent's POV: prefer their fastest loss, then draws, then slowest win
+            result, dtm = probed
+            score = (2, -dtm) if result == LOSS else ((1, 0) if result == DRAW else (0, dtm))
+            if best_score is None or score > best_score:
+                best_move, best_score = move, score
+
+        return best_move
+
+    def generate(self, signature: str) -> bytearray:
+        """Generates the table for the signature (and all tables it depends on) by retrograde analysis,
+        writes it to the directory (if set) and returns it. Tables that already exist are not generated again.
+        """
+        white, black = parse_signature(signature)
+        signature, _ = get_canonical_signature(white, black)
+        existing = self.get_table(signature)
+        if existing is not None:
+            return existing
+
+        white, black = parse_signature(signature)
+        if len(white) + len(black) > MAX_TABLEBASE_PIECES:
+            raise ValueError("tables with more than {} pieces are not supported".format(MAX_TABLEBASE_PIECES))
+
+        # generate the tables of all captures first
+        for i in range(1, len(white)):
+            if len(white) + len(black) > 3:
+                self.generate(get_signature(white[:i] + white[i + 1:], black))
+        for i in range(1, len(black)):
+            if len(white) + len(black) > 3:
+                self.generate(get_signature(white, black[:i] + black[i + 1:]))
+
+        table = _TableGenerator(self, white, black).generate()
+        self.tables[signature] = table
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.get_table_path(signature), "wb") as table_file:
+                table_file.write(TABLEBASE_MAGIC + len(white + black).to_bytes(8, "little"))
+                table_file.write(table)
+
+        return table
+
+
+class _TableGenerator:
+    """Retrograde analysis of one material set"""
+    def __init__(self, tablebase: Tablebase, white: str, black: str):
+        self.tablebase = tablebase
+        self.pieces = list(white + black)
+        self.colors = [WHITE] * len(white) + [BLACK] * len(black)
+        self.kingIndex = [0, len(white)]  # position of each side's king in the piece list
+        self.enemies = [[i for i, color in enumerate(self.colors) if color != side] for side in (WHITE, BLACK)]
+        self.count = len(self.pieces)
+        self.size = 2 * 64 ** self.count
+        self.strides = [2 * 64 ** (self.count - 1 - i) for i in range(self.count)]  # index step of each piece
+
+    def decode(self, index: int) -> Tuple[List[int], int]:
+        side = index & 1
+        index >>= 1
+        squares = [0] * self.count
+        for i in reversed(range(self.count)):
+            squares[i] = index & 63
+            index >>= 6
+        return squares, side
+
+    def is_attacked(self, sq: int, squares, occupied: int, side: int, captured: int = -1) -> bool:
+        """Is sq attacked by any piece of the opponent of side (except the captured one)"""
+        for i in self.enemies[side]:
+            if i != captured:
+                from_sq = squares[i]
+                if TB_ATTACKS[self.pieces[i]][from_sq] >> sq & 1 and not TB_BETWEEN[from_sq][sq] & occupied:
+                    return True
+        return False
+
+    def is_valid(self, squares, side: int) -> bool:
+        occupied = 0
+        for sq in squares:
+            if occupied >> sq & 1:
+                return False
+            occupied |= 1 << sq
+        # the side that just moved can't be in check
+        return not self.is_attacked(squares[self.kingIndex[side ^ 1]], squares, occupied, side ^ 1)
+
+    def get_moves(self, squares, side: int):
+        """Yields (piece index, to square, captured piece index or -1) for all pseudo legal moves of side"""
+        occupied = 0
+        for sq in squares:
+            occupied |= 1 << sq
+
+        for i in range(self.count):
+            if self.colors[i] != side:
+                continue
+            for ray in TB_RAYS[self.pieces[i]][squares[i]]:
+                for target in ray:
+                    if occupied >> target & 1:
+                        captured = squares.index(target)
+                        if self.colors[captured] != side:
+                            yield i, target, captured
+                        break
+                    yield i, target, -1
+
+    def get_predecessors(self, index: int, squares, side: int):
+        """Yields the indexes of all positions from which the side that just moved reached this position with a
+        quiet move (un-moves, captures are not reversed as they come from bigger tables)
+        """
+        mover = side ^ 1
+        index += mover - side
+        occupied = 0
+        for sq in squares:
+            occupied |= 1 << sq
+
+        for i in range(self.count):
+            if self.colors[i] != mover:
+                continue
+            sq, stride = squares[i], self.strides[i]
+            for ray in TB_RAYS[self.pieces[i]][sq]:
+                for origin in ray:
+                    if occupied >> origin & 1:
+                        break
+                    yield index + (origin - sq) * stride
+
+    def probe_capture(self, squares, side: int, captured: int) -> Tuple[float, int]:
+        white = [(self.pieces[i], squares[i]) for i in range(self.count) if i != captured and self.colors[i] == WHITE]
+        black = [(self.pieces[i], squares[i]) for i in range(self.count) if i != captured and self.colors[i] == BLACK]
+        return self.tablebase.probe_pieces(white, black, side)
+
+    def generate(self) -> bytearray:
+        table = bytearray(self.size)
+        resolved = bytearray(self.size)
+        remaining = bytearray(self.size)  # number of quiet legal moves not known to lose
+        loss_floor = bytearray(self.size)  # longest dtm of captures that win for the opponent
+        can_avoid_loss = bytearray(self.size)  # a capture draws or wins
+        buckets: Dict[int, List[int]] = {}
+
+        for index in range(self.size):
+            squares, side = self.decode(index)
+            if not self.is_valid(squares, side):
+                table[index] = TB_ILLEGAL
+                resolved[index] = 1
+                continue
+
+            quiet_moves, has_moves, best_win = 0, False, None
+            occupied = 0
+            for sq in squares:
+                occupied |= 1 << sq
+
+            king = self.kingIndex[side]
+            for piece, target, captured in self.get_moves(squares, side):
+                king_sq = target if piece == king else squares[king]
+                if self.is_attacked(king_sq, squares, occupied ^ (1 << squares[piece]) | (1 << target), side, captured):
+                    continue  # illegal, our king is left in check
+
+                has_moves = True
+                if captured < 0:
+                    quiet_moves += 1
+                    continue
+
+                after = list(squares)
+                after[piece] = target
+                result, dtm = self.probe_capture(after, side ^ 1, captured)
+                if result == LOSS:
+                    best_win = dtm + 1 if best_win is None else min(best_win, dtm + 1)
+                elif result == WIN:
+                    loss_floor[index] = max(loss_floor[index], dtm)
+                else:
+                    can_avoid_loss[index] = 1
+
+            if not has_moves:
+                resolved[index] = 1
+                if self.is_attacked(squares[king], squares, occupied, side):
+                    table[index] = encode_result(False, 0)  # mated
+                    buckets.setdefault(0, []).append(index)
+                continue  # stalemate stays a draw
+
+            if best_win is not None:
+                can_avoid_loss[index] = 1
+                buckets.setdefault(best_win, []).append(index)
+
+            remaining[index] = quiet_moves
+            if quiet_moves == 0 and not can_avoid_loss[index]:
+                buckets.setdefault(loss_floor[index] + 1, []).append(index)  # every capture loses
+
+        # resolve positions in increasing distance to mate and propagate to their predecessors
+        dtm = 0
+        while dtm <= max(buckets, default=-1) and dtm <= MAX_DTM:
+            for index in buckets.pop(dtm, []):
+                if resolved[index] and dtm > 0:
+                    continue
+
+                win = dtm & 1 == 1
+                resolved[index] = 1
+                table[index] = encode_result(win, dtm)
+
+                squares, side = self.decode(index)
+                for previous in self.get_predecessors(index, squares, side):
+                    if resolved[previous]:
+                        continue
+
+                    if not win:  # moving into this position wins
+                        buckets.setdefault(dtm + 1, []).append(previous)
+                        continue
+
+                    remaining[previous] -= 1
+                    if remaining[previous] == 0 and not can_avoid_loss[previous]:
+                        buckets.setdefault(max(dtm, loss_floor[previous]) + 1, []).append(previous)
+            dtm += 1
+
+        return table
@@ -0,0 +1,86 @@
+import time
+
+
+DEFAULT_MOVES_TO_GO = 30  # assumed number of moves left in the game when movestogo is not given
+MOVE_OVERHEAD = 0.05  # seconds kept in reserve for communication with the gui
+INCREMENT_USAGE = 0.75  # part of the increment that is spent on top of the time share of the current move
+MAX_TIME_FRACTION = 0.3  # never spend more than this fraction of the remaining clock on one move
+MAX_EXTENSION = 3.0  # the hard limit of a move is at most this many times the optimum time
+UNSTABLE_EXTENSION = 2.0  # factor by which the budget is extended while the best move is unstable
+UNSTABLE_SHARE = 0.5  # best child having less than this share of the root visits is considered unstable
+STABILITY_WINDOW = 0.25  # best move is unstable if it changed within this fraction of the optimum time
+MIN_ITERATIONS = 32  # never stop early before this many simulations were done
+
+
+class TimeManager:
+    """Maps the remaining clock time, increment and moves to go to a per move time budget and decides,
+    based on the root statistics, when the search of the current move should stop.
+    All times are in seconds.
+
+    The search normally stops at optimumTime. The budget is extended (up to maximumTime) while the most visited
+    root child is unstable, i.e. it recently changed or it holds less than UNSTABLE_SHARE of the root visits.
+    The search stops before that if the most visited child can no longer be overtaken by the runner up within
+    the simulations that are left in the budget.
+    """
+    def __init__(self, time_left: float, increment: float = 0.0, moves_to_go: int = 0):
+        moves_to_go = moves_to_go if moves_to_go > 0 else DEFAULT_MOVES_TO_GO
+        available = max(time_left - MOVE_OVERHEAD, 0.0)
+
+        self.maximumTime: float = min(available, available * MAX_TIME_FRACTION + increment) if moves_to_go > 1 \
+            else available
+        self.optimumTime: float = min(available / moves_to_go + increment * INCREMENT_USAGE, self.maximumTime)
+        self.maximumTime = min(self.maximumTime, self.optimumTime * MAX_EXTENSION)
+
+        self.startTime: float = time.time()
+        self.lastBestMove: int = 0
+        self.lastChangeTime: float = 0.0
+
+    def start(self):
+        self.startTime = time.time()
+        self.lastBestMove = 0
+        self.lastChangeTime = 0.0
+
+    def get_time_limit(self, rootnode, elapsed: float) -> float:
+        """Returns the time after which the search should stop given the current root statistics"""
+        best, second = get_two_most_visited(rootnode)
+        if best is None:
+            return self.maximumTime
+
+        if best.move != self.lastBestMove:
+            self.lastBestMove = best.move
+            self.lastChangeTime = elapsed
+
+        recently_changed = elapsed - self.lastChangeTime < STABILITY_WINDOW * self.optimumTime
+        if recently_changed or best.visits < UNSTABLE_SHARE * rootnode.visits:
+            return min(self.optimumTime * UNSTABLE_EXTENSION, self.maximumTime)
+
+        return self.optimumTime
+
+    def should_stop(self, rootnode, iterations: int) -> bool:
+        elapsed = time.time() - self.startTime
+        if elapsed >= self.maximumTime:
+            return True
+
+        limit = self.get_time_limit(rootnode, elapsed)
+        if elapsed >= limit:
+            return True
+
+        if iterations < MIN_ITERATIONS or elapsed <= 0:
+            return False
+
+        # the runner up can gain at most one visit per remaining simulation
+        best, second = get_two_most_visited(rootnode)
+        remaining_iterations = (limit - elapsed) * iterations / elapsed
+        return best.visits - (second.visits if second is not None else 0) > remaining_iterations
+
+
+def get_two_most_visited(rootnode):
+    """Returns the most visited and the second most visited children of the node (None if missing)"""
+    best, second = None, None
+    for child in rootnode.childNodes:
+        if best is None or child.visits > best.visits:
+            best, second = child, best
+        elif second is None or child.visits > second.visits:
+            second = child
+
+    return best, second
@@ -0,0 +1,163 @@
+import os
+import struct
+import sys
+from array import array
+
+from lib.board import Board
+from lib.mcts import Node
+from lib.search import SearchInfo, get_info_line, search_tree
+
+
+TREE_MAGIC = b"HUGOMT01"
+DEFAULT_CHECKPOINT_SIMULATIONS = 10000  # simulations between two saves of an analysis
+
+_header_struct = struct.Struct("<8sQBI")  # magic, posKey of the root, playerJustMoved of the root, node count
+
+# the nodes are stored in depth first pre-order as one array per field, each node with the number of its children
+# proven results are stored as 0 (not proven), 1 (loss), 2 (draw) or 3 (win), plus PROVEN_BY_HISTORY for proofs that
+# depend on the moves played before (see Node.provenByHistory)
+PROVEN_BY_HISTORY = 4
+_NODE_ARRAYS = [
+    ("move", "I"),
+    ("childCount", "I"),
+    ("visits", "I"),
+    ("wins", "d"),
+    ("squaredWins", "d"),
+    ("amafVisits", "I"),
+    ("amafWins", "d"),
+    ("prior", "f"),
+    ("proven", "B"),
+]
+
+
+class SearchTree:
+    """MCTS tree (its root node) of the position with the given posKey"""
+    __slots__ = ['posKey', 'root']
+
+    def __init__(self, pos_key: int, root: Node):
+        self.posKey: int = pos_key
+        self.root: Node = root
+
+
+def _write_array(tree_file, values: array):
+    if sys.byteorder == "big":  # the file is little endian on every machine
+        values.byteswap()
+    values.tofile(tree_file)
+
+
+def _read_array(tree_file, typecode: str, count: int) -> array:
+    values = array(typecode)
+    values.fromfile(tree_file, count)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def save_tree(path: str, pos: Board, rootnode: Node) -> int:
+    """Writes the tree searched from pos to a binary tree file and returns the number of nodes written.
+    Untried moves are not stored, they are generated again when a loaded node is expanded.
+    """
+    columns = {name: array(typecode) for name, typecode in _NODE_ARRAYS}
+    for node, _ in rootnode.iter_tree():
+        columns["move"].append(node.move or 0)
+        columns["childCount"].append(len(node.childNodes))
+        columns["visits"].append(node.visits)
+        columns["wins"].append(node.wins)
+        columns["squaredWins"].append(node.squaredWins)
+        columns["amafVisits"].append(node.amafVisits)
+        columns["amafWins"].append(node.amafWins)
+        columns["prior"].append(node.prior)
+        if node.proven is None:
+            columns["proven"].append(0)
+        else:
+            columns["proven"].append(int(node.proven * 2) + 1 | (PROVEN_BY_HISTORY if node.provenByHistory else 0))
+
+    # write a new file and replace the old one, an interrupted save keeps the previous checkpoint
+    count = len(columns["move"])
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as tree_file:
+        tree_file.write(_header_struct.pack(TREE_MAGIC, pos.posKey.value, rootnode.playerJustMoved, count))
+        for name, _ in _NODE_ARRAYS:
+            _write_array(tree_file, columns[name])
+    os.replace(temp_path, path)
+
+    return count
+
+
+def load_tree(path: str) -> SearchTree:
+    """Reads a tree written by save_tree. Raises ValueError if the file is not a tree file."""
+    with open(path, "rb") as tree_file:
+        header = tree_file.read(_header_struct.size)
+        if len(header) != _header_struct.size or header[:len(TREE_MAGIC)] != TREE_MAGIC:
+            raise ValueError("{} is not a tree file".format(path))
+        _, pos_key, player_just_moved, count = _header_struct.unpack(header)
+
+        try:
+            columns = {name: _read_array(tree_file, typecode, count) for name, typecode in _NODE_ARRAYS}
+        except EOFError:
+            raise ValueError("{} is truncated".format(path))
+
+    nodes = []
+    for i in range(count):
+        nodes.append(Node(move=columns["move"][i] if i > 0 else None, player_just_moved=player_just_moved))
+        node = nodes[i]
+        node.visits = columns["visits"][i]
+        node.wins = columns["wins"][i]
+        node.squaredWins = columns["squaredWins"][i]
+        node.amafVisits = columns["amafVisits"][i]
+        node.amafWins = columns["amafWins"][i]
+        node.prior = columns["prior"][i]
+        proven = columns["proven"][i]
+        node.proven = None if proven == 0 else ((proven & ~PROVEN_BY_HISTORY) - 1) / 2
+        node.provenByHistory = bool(proven & PROVEN_BY_HISTORY)
+
+    # link the children back to their parents, the pre-order puts every parent before its subtree
+    child_counts = columns["childCount"]
+    stack = [[nodes[0], child_counts[0]]]  # nodes whose children are still being read, with their missing children
+    for i in range(1, count):
+        while stack[-1][1] == 0:
+            stack.pop()
+        parent = stack[-1][0]
+        stack[-1][1] -= 1
+
+        node = nodes[i]
+        node.parentNode = parent
+        node.playerJustMoved = parent.playerJustMoved ^ 1
+        parent.childNodes.append(node)
+        stack.append([node, child_counts[i]])
+
+    return SearchTree(pos_key, nodes[0])
+
+
+def run_analysis(pos: Board, simulations: int, path: str, checkpoint_simulations=DEFAULT_CHECKPOINT_SIMULATIONS,
+                 post_thinking=False, overwrite=False) -> Node:
+    """Searches pos for the given number of simulations and saves the tree to path after every
+    checkpoint_simulations simulations. A tree of pos saved in path before is searched further, so an interrupted
+    analysis continues from its last checkpoint. A tree of another position in path raises a ValueError unless
+    overwrite is set. Returns the root node.
+    """
+    rootnode = None
+    if os.path.exists(path):
+        tree = load_tree(path)
+        if tree.posKey == pos.posKey.value:
+            rootnode = tree.root
+        elif not overwrite:
+            raise ValueError("{} holds the tree of another position".format(path))
+
+    info = SearchInfo()
+    info.reset()
+    done = 0
+    while done < simulations:
+        chunk = min(checkpoint_simulations, simulations - done)
+        rootnode = search_tree(pos, chunk, rootnode=rootnode)
+        save_tree(path, pos, rootnode)
+        done += chunk
+
+        if post_thinking:
+            info.nodes = rootnode.visits  # the simulations of the loaded tree included
+            print(get_info_line(pos, rootnode, info), flush=True)
+
+        if rootnode.proven is not None:
+            break
+
+    return rootnode
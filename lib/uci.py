@@ -0,0 +1,131 @@
+from threading import Thread
+
+from lib.search import *
+from lib.timemanager import MOVE_OVERHEAD
+
+
+ENGINE_NAME = "Hugo"
+ENGINE_AUTHOR = "AngelVI13"
+
+DEFAULT_SIMULATIONS = 1000  # used by 'go' when no limits are given
+
+
+def send(line: str):
+    print(line, flush=True)
+
+
+def parse_position(line: str, pos: Board):
+    """Parses 'position startpos|fen <fen> [moves <move> ...]' and sets up the position"""
+    tokens = line.split()
+
+    if len(tokens) > 1 and tokens[1] == "fen":
+        fen_end = tokens.index("moves") if "moves" in tokens else len(tokens)
+        pos.parse_fen(" ".join(tokens[2:fen_end]))
+    else:
+        pos.parse_fen(START_FEN)
+
+    if "moves" not in tokens:
+        return
+
+    for move_str in tokens[tokens.index("moves") + 1:]:
+        move = pos.parse_move(move_str) if len(move_str) >= 4 else NO_MOVE
+        if move == NO_MOVE:
+            break
+
+        pos.make_move(move)
+
+
+def parse_go(line: str, pos: Board, info: SearchInfo) -> int:
+    """Parses 'go ...', sets up the search limits in info and returns the number of simulations to run"""
+    tokens = line.split()
+    values = {}
+    for key in ("wtime", "btime", "winc", "binc", "movestogo", "movetime", "nodes"):
+        if key in tokens:
+            values[key] = int(tokens[tokens.index(key) + 1])
+
+    info.reset()
+    info.infinite = "infinite" in tokens
+
+    time_left = values.get("wtime") if pos.side == WHITE else values.get("btime")
+    increment = values.get("winc", 0) if pos.side == WHITE else values.get("binc", 0)
+
+    # an infinite search runs until 'stop', time limits sent along with 'infinite' are ignored
+    if "movetime" in values and not info.infinite:
+        info.timeSet = True
+        info.stopTime = info.startTime + max(values["movetime"] / 1000 - MOVE_OVERHEAD, 0.0)
+    elif time_left is not None and not info.infinite:
+        info.set_clock(time_left / 1000, increment / 1000, values.get("movestogo", 0))
+
+    if "nodes" in values:
+        return values["nodes"]
+
+    if info.infinite or info.timeSet:
+        return INFINITE_SIMULATIONS
+
+    return DEFAULT_SIMULATIONS
+
+
+def search_and_report(pos: Board, simulations: int, info: SearchInfo, book=None, tablebase=None):
+    """Runs the search and reports the best move (this is the target of the background search thread)"""
+    # an infinite search (i.e. analysis) must not return before it is stopped -> no book moves
+    move = search_position(pos, simulations=simulations, info=info, book=None if info.infinite else book,
+                           tablebase=tablebase)
+    send("bestmove {}".format(pos.moveGenerator.print_move(move) if move != NO_MOVE else "0000"))
+
+
+def stop_search(search_thread: Thread, info: SearchInfo):
+    if search_thread is not None and search_thread.is_alive():
+        info.stopped = True
+        search_thread.join()
+
+
+def uci_loop(pos: Board, info: SearchInfo, book=None, tablebase=None):
+    """Speaks the uci protocol on stdin/stdout. The search runs in a background thread so that
+    'stop' and 'isready' are answered while the engine is thinking. Positions found in the opening book (if given)
+    are answered with a book move, positions covered by the endgame tablebase (if given) with the tablebase move.
+    """
+    info.postThinking = True
+    search_thread = None
+
+    send("id name {}".format(ENGINE_NAME))
+    send("id author {}".format(ENGINE_AUTHOR))
+    send("uciok")
+
+    while True:
+        try:
+            line = input()
+        except EOFError:
+            line = "quit"
+
+        if not line.strip():
+            continue
+
+        command = line.split()[0]
+
+        if command == "isready":
+            send("readyok")
+        elif command == "uci":
+            send("id name {}".format(ENGINE_NAME))
+            send("id author {}".format(ENGINE_AUTHOR))
+            send("uciok")
+        elif command == "ucinewgame":
+            stop_search(search_thread, info)
+            pos.parse_fen(START_FEN)
+        elif command == "position":
+            stop_search(search_thread, info)
+            parse_position(line, pos)
+        elif command == "go":
+            stop_search(search_thread, info)
+            simulations = parse_go(line, pos, info)
+            # the search gets its own copy of the board so that the main loop is free to handle new commands
+            search_thread = Thread(target=search_and_report, args=(pos.__copy__(), simulations, info, book, tablebase),
+                                   daemon=True)
+            search_thread.start()
+        elif command == "stop":
+            stop_search(search_thread, info)
+        elif command == "quit":
+            stop_search(search_thread, info)
+            info.quit = True
+            break
+
+    return pos, info
@@ -0,0 +1,220 @@
+from lib.conversion import Conversion
+from lib.constants import *
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, it is only needed by the batch functions below
+    np = None
+
+
+# Batch versions of the attack & move generation of lib.board / lib.movegenerator: N positions are stored as an
+# N x 120 array of mailboxes (Board.pieces) and every step of every piece is done for all positions at once.
+# Pieces move along the direction increments of lib.constants, a slider step is one array operation over all
+# sources that can still reach a square in that direction.
+
+MAX_RAY_LENGTH = 7
+
+_PAWN_CAPTURES = [[9, 11], [-9, -11]]  # capture increments per side
+_PAWN_PUSH = [10, -10]
+_PAWN_START_RANK = [RANK_2, RANK_7]
+
+_conversion = Conversion()
+_tables: dict = None
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("numpy is required for the batch move generation (lib.vectorized)")
+
+
+def _get_steps(increment: int, sliding: bool) -> list:
+    """Returns (sources, targets, moves) index arrays for every step (1 square for non sliding pieces) in the
+    direction of increment: the 64 square indexes of the sources, the 120 square indexes of the squares they reach
+    with that step and the from * 64 + to indexes of these moves. Only steps that stay on the board are included.
+    """
+    steps = []
+    for distance in range(1, MAX_RAY_LENGTH + 1 if sliding else 2):
+        sources, targets = [], []
+        for sq64, sq in enumerate(_conversion.Sq64ToSq120):
+            target_sq = sq + increment * distance
+            if 0 <= target_sq < BOARD_SQUARE_NUMBER and _conversion.FilesBoard[target_sq] != OFF_BOARD and \
+                    all(_conversion.FilesBoard[sq + increment * d] != OFF_BOARD for d in range(1, distance)):
+                sources.append(sq64)
+                targets.append(target_sq)
+        moves = [sq64 * 64 + _conversion.Sq120ToSq64[sq] for sq64, sq in zip(sources, targets)]
+        steps.append((np.array(sources, dtype=np.intp), np.array(targets, dtype=np.intp),
+                      np.array(moves, dtype=np.intp)))
+    return steps
+
+
+def _get_tables() -> dict:
+    global _tables
+    _require_numpy()
+    if _tables is None:
+        _tables = {
+            "squares": np.array(_conversion.Sq64ToSq120, dtype=np.intp),
+            "sq120ToSq64": np.array(_conversion.Sq120ToSq64, dtype=np.intp),
+            "colors": np.array(PIECE_COLOR_MAP, dtype=np.int8),
+            "knight": [_get_steps(increment, False) for increment in KNIGHT_MOVE_INCREMENT],
+            "king": [_get_steps(increment, False) for increment in KING_MOVE_INCREMENT],
+            "rook": [_get_steps(increment, True) for increment in ROOK_MOVE_INCREMENT],
+            "bishop": [_get_steps(increment, True) for increment in BISHOP_MOVE_INCREMENT],
+            "pawnCaptures": [[_get_steps(increment, False)[0] for increment in increments]
+                             for increments in _PAWN_CAPTURES],
+            "pawnPushes": [_get_steps(increment, False)[0] for increment in _PAWN_PUSH],
+        }
+    return _tables
+
+
+class PositionBatch:
+    """N positions as arrays: pieces (N x 120 mailboxes), side to move, en passant square and castle permissions"""
+    __slots__ = ['pieces', 'sides', 'enPassantSquares', 'castlePermissions']
+
+    def __init__(self, pieces, sides, en_passant_squares=None, castle_permissions=None):
+        _require_numpy()
+        self.pieces = np.asarray(pieces, dtype=np.int8)
+        self.sides = np.asarray(sides, dtype=np.int8)
+        count = len(self.pieces)
+        self.enPassantSquares = np.full(count, NO_SQUARE, dtype=np.int16) if en_passant_squares is None else \
+            np.asarray(en_passant_squares, dtype=np.int16)
+        self.castlePermissions = np.zeros(count, dtype=np.int8) if castle_permissions is None else \
+            np.asarray(castle_permissions, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.pieces)
+
+
+def encode_boards(boards) -> PositionBatch:
+    """Returns the positions of the boards as a PositionBatch"""
+    _require_numpy()
+    return PositionBatch([board.pieces for board in boards], [board.side for board in boards],
+                         [board.enPassantSquare for board in boards], [board.castlePermissions for board in boards])
+
+
+# The arrays below are square major (squares x N): gathering the rows of some squares for all positions is a
+# contiguous copy, gathering columns of N x 120 arrays is not.
+
+def _walk(squares, movers, steps, on_step):
+    """Moves the pieces of the movers mask (64 x N) along steps (see _get_steps). on_step(targets, moves, reached)
+    is called for every step with the len(sources) x N mask of the pieces that reach the targets, sliding pieces stop
+    on the first occupied square.
+    """
+    active = movers.copy() if len(steps) > 1 else movers
+    for sources, targets, moves in steps:
+        reached = active[sources]
+        on_step(targets, moves, reached)
+        if len(steps) > 1:
+            active[sources] = reached & (squares[targets] == EMPTY)
+
+
+# pieces moving along the king, knight, rook & bishop increments (per side)
+_MOVERS = {
+    "knight": [KNIGHT_OF_SIDE], "king": [KING_OF_SIDE],
+    "rook": [ROOK_OF_SIDE, QUEEN_OF_SIDE], "bishop": [BISHOP_OF_SIDE, QUEEN_OF_SIDE],
+}
+
+
+def _get_movers(board, kind: str, sides):
+    """Returns the 64 x N mask of the squares of board (64 x N) holding the pieces of kind of the given side(s)
+    (one side or an array of the N sides)
+    """
+    mask = None
+    for pieces_of_side in _MOVERS[kind]:
+        is_piece = board == np.asarray(pieces_of_side)[sides]
+        mask = is_piece if mask is None else mask | is_piece
+    return mask
+
+
+def _get_attacks(tables: dict, squares):
+    """Returns the 2 x 120 x N attack counts of the positions of squares (120 x N)"""
+    attacks = np.zeros((2, BOARD_SQUARE_NUMBER, squares.shape[1]), dtype=np.int16)
+    board = squares[tables["squares"]]
+
+    for side in (WHITE, BLACK):
+        side_attacks = attacks[side]
+
+        def add_attacks(targets, _moves, reached):
+            side_attacks[targets] += reached
+
+        for kind in _MOVERS:
+            movers = _get_movers(board, kind, side)
+            for steps in tables[kind]:
+                _walk(squares, movers, steps, add_attacks)
+
+        pawns = board == PAWN_OF_SIDE[side]
+        for sources, targets, _ in tables["pawnCaptures"][side]:
+            side_attacks[targets] += pawns[sources]
+
+    return attacks
+
+
+def get_attack_maps(pieces):
+    """Returns the number of attackers of every square for both sides (N x 2 x 120 int16, indexed by position, side
+    and square) of the N x 120 array of mailboxes, the same counts as Board.attackMaps. Squares off the board are 0.
+    """
+    tables = _get_tables()
+    squares = np.ascontiguousarray(np.asarray(pieces, dtype=np.int8).T)
+    return np.ascontiguousarray(_get_attacks(tables, squares).transpose(2, 0, 1))
+
+
+# castling: permission, king from & to square, squares that must be empty, squares that must not be attacked
+_CASTLING = [
+    [(WHITE_KING_CASTLING, E1, G1, [F1, G1], [E1, F1]), (WHITE_QUEEN_CASTLING, E1, C1, [D1, C1, B1], [E1, D1])],
+    [(BLACK_KING_CASTLING, E8, G8, [F8, G8], [E8, F8]), (BLACK_QUEEN_CASTLING, E8, C8, [D8, C8, B8], [E8, D8])],
+]
+
+
+def get_move_masks(batch: PositionBatch):
+    """Returns the pseudo legal moves of the side to move of every position as an N x 64 x 64 bool array indexed by
+    position, from and to square (64 square indexes). These are the moves of MoveGenerator.generate_all_moves
+    (castling included), a promotion is a single entry for all promotion pieces.
+    """
+    tables = _get_tables()
+    count = len(batch)
+    squares = np.ascontiguousarray(batch.pieces.T)
+    board = squares[tables["squares"]]
+    sides = batch.sides.astype(np.intp)
+    colors = tables["colors"][squares]  # colour of every square (BOTH for empty & off board squares)
+    not_own = colors != sides
+    enemy = colors == sides ^ 1
+    masks = np.zeros((64 * 64, count), dtype=bool)  # from * 64 + to x N
+
+    def add_moves(targets, moves, reached):
+        masks[moves] |= reached & not_own[targets]
+
+    for kind in _MOVERS:
+        movers = _get_movers(board, kind, sides)
+        for steps in tables[kind]:
+            _walk(squares, movers, steps, add_moves)
+
+    for side in (WHITE, BLACK):
+        pawns = (board == PAWN_OF_SIDE[side]) & (sides == side)
+        push = _PAWN_PUSH[side]
+        sources, targets, moves = tables["pawnPushes"][side]
+        single = pawns[sources] & (squares[targets] == EMPTY)
+        masks[moves] |= single
+
+        # double pushes from the start rank if both squares are empty
+        start = np.array([_conversion.RanksBoard[sq - push] == _PAWN_START_RANK[side] for sq in targets])
+        double_targets = targets[start] + push
+        masks[sources[start] * 64 + tables["sq120ToSq64"][double_targets]] |= \
+            single[start] & (squares[double_targets] == EMPTY)
+
+        for sources, targets, moves in tables["pawnCaptures"][side]:
+            masks[moves] |= pawns[sources] & (enemy[targets] | (batch.enPassantSquares == targets[:, None]))
+
+    # castling needs the attacks of the opponent, only computed for the positions that may castle
+    for side in (WHITE, BLACK):
+        rows = np.flatnonzero((sides == side) & (batch.castlePermissions & sum(c[0] for c in _CASTLING[side]) != 0))
+        if len(rows) == 0:
+            continue
+
+        enemy_attacks = _get_attacks(tables, squares[:, rows])[side ^ 1]
+        for permission, from_sq, to_sq, empty_squares, safe_squares in _CASTLING[side]:
+            allowed = (batch.castlePermissions[rows] & permission) != 0
+            allowed &= (squares[empty_squares][:, rows] == EMPTY).all(axis=0)
+            allowed &= (enemy_attacks[safe_squares] == 0).all(axis=0)
+            sq120_to_sq64 = tables["sq120ToSq64"]
+            masks[sq120_to_sq64[from_sq] * 64 + sq120_to_sq64[to_sq], rows] |= allowed
+
+    return masks.T.reshape(count, 64, 64)
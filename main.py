@@ -1,10 +1,155 @@
+import argparse
+import asyncio
+import sys
+
+from lib.batch import run_batch
+from lib.book import build_book, open_book
 from lib.console import console_loop
+from lib.distributed import DEFAULT_WORKER_PORT, create_worker_server, run_coordinator
 from lib.board import Board
+from lib.constants import NO_MOVE
+from lib.search import SearchInfo
+from lib.selfplay import run_selfplay
+from lib.service import DEFAULT_SERVICE_PORT, DEFAULT_SERVICE_WORKERS, serve
+from lib.tablebase import DEFAULT_TABLEBASE_SIGNATURES, Tablebase
+from lib.treefile import DEFAULT_CHECKPOINT_SIMULATIONS, run_analysis
+from lib.uci import uci_loop
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Hugo chess engine. Starts in interactive mode without a command.")
+    parser.add_argument("--book", default=None, help="opening book used in interactive (uci/console) mode")
+    parser.add_argument("--tablebase", default=None, help="endgame tablebase directory used in interactive mode")
+    commands = parser.add_subparsers(dest="command")
+
+    batch = commands.add_parser("batch", help="analyse FEN/EPD positions and write the results as json lines")
+    batch.add_argument("input", nargs="?", default="-", help="file with one FEN/EPD per line (default: stdin)")
+    batch.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    batch.add_argument("-n", "--nodes", type=int, default=1000, help="simulations per position")
+    batch.add_argument("-t", "--movetime", type=int, default=0, help="time per position in ms (0 - no limit)")
+    batch.add_argument("-w", "--workers", type=int, default=1, help="number of worker processes")
+    batch.add_argument("-s", "--store", default=None, help="position store file shared by all workers")
+    batch.add_argument("-c", "--cache", action="store_true",
+                       help="answer repeated positions from a result cache of every worker (not with --movetime)")
+
+    selfplay = commands.add_parser("selfplay", help="play self-play games and append them to a binary record file")
+    selfplay.add_argument("output", help="record file the games are appended to")
+    selfplay.add_argument("-g", "--games", type=int, default=1, help="number of games to play")
+    selfplay.add_argument("-n", "--nodes", type=int, default=1000, help="simulations per move")
+    selfplay.add_argument("-t", "--movetime", type=int, default=0, help="time per move in ms (0 - no limit)")
+    selfplay.add_argument("-r", "--random-plies", type=int, default=8, help="random opening plies per game")
+    selfplay.add_argument("-m", "--max-plies", type=int, default=400, help="unfinished games are adjudicated a draw")
+    selfplay.add_argument("-w", "--workers", type=int, default=1, help="number of worker processes")
+    selfplay.add_argument("-s", "--seed", type=int, default=None, help="seed of the first game")
+    selfplay.add_argument("--first-game-id", type=int, default=None,
+                          help="id of the first game (default: after the last game in the file)")
+
+    book = commands.add_parser("book", help="compile an opening book from pgn files and/or self-play records")
+    book.add_argument("output", help="book file to write")
+    book.add_argument("-p", "--pgn", nargs="*", default=[], help="pgn files")
+    book.add_argument("-r", "--records", nargs="*", default=[], help="self-play record files")
+    book.add_argument("-m", "--max-ply", type=int, default=20, help="only moves of the first MAX_PLY half moves")
+    book.add_argument("--min-weight", type=int, default=1, help="drop moves with a smaller total weight")
+
+    tablebase = commands.add_parser("tablebase", help="generate endgame tables by retrograde analysis")
+    tablebase.add_argument("output", help="directory the tables are written to")
+    tablebase.add_argument("signatures", nargs="*", default=DEFAULT_TABLEBASE_SIGNATURES,
+                           help="material sets to generate, i.e. KQvK KRvK KQvKR (default: all 3 piece sets)")
+
+    service = commands.add_parser("serve", help="serve analysis requests (json lines over tcp) from a process pool")
+    service.add_argument("--host", default="", help="address to listen on (default: all interfaces)")
+    service.add_argument("--port", type=int, default=DEFAULT_SERVICE_PORT, help="port to listen on")
+    service.add_argument("-w", "--workers", type=int, default=DEFAULT_SERVICE_WORKERS, help="number of worker processes")
+
+    analyse = commands.add_parser("analyse", help="analyse a position, checkpointing the search tree to a file")
+    analyse.add_argument("fen", help="position to analyse")
+    analyse.add_argument("tree", help="tree file, an existing tree of the position is searched further")
+    analyse.add_argument("-n", "--nodes", type=int, default=100000, help="simulations to add to the tree")
+    analyse.add_argument("-c", "--checkpoint", type=int, default=DEFAULT_CHECKPOINT_SIMULATIONS,
+                         help="simulations between two saves of the tree")
+    analyse.add_argument("-f", "--force", action="store_true", help="overwrite a tree file of another position")
+
+    worker = commands.add_parser("worker", help="serve root parallel searches of a distributed search over tcp")
+    worker.add_argument("--host", default="", help="address to listen on (default: all interfaces)")
+    worker.add_argument("--port", type=int, default=DEFAULT_WORKER_PORT, help="port to listen on")
+
+    distributed = commands.add_parser("distributed", help="search a position on several workers and merge the results")
+    distributed.add_argument("fen", help="root position")
+    distributed.add_argument("workers", nargs="+", help="worker addresses as host:port")
+    distributed.add_argument("-m", "--moves", nargs="*", default=[], help="moves played from the root position")
+    distributed.add_argument("-n", "--nodes", type=int, default=10000, help="simulations over all workers")
+    distributed.add_argument("-t", "--movetime", type=int, default=0, help="time limit in ms (0 - no limit)")
+
+    return parser.parse_args()
+
+
+def run_command(args):
+    if args.command == "batch":
+        input_stream = sys.stdin if args.input == "-" else open(args.input)
+        output_stream = sys.stdout if args.output == "-" else open(args.output, "a")
+        try:
+            run_batch(input_stream, output_stream, simulations=args.nodes, move_time=args.movetime / 1000,
+                      workers=args.workers, store_path=args.store, use_cache=args.cache)
+        finally:
+            for stream in (input_stream, output_stream):
+                if stream not in (sys.stdin, sys.stdout):
+                    stream.close()
+    elif args.command == "selfplay":
+        run_selfplay(args.output, args.games, workers=args.workers, simulations=args.nodes,
+                     move_time=args.movetime / 1000, random_plies=args.random_plies, max_plies=args.max_plies,
+                     seed=args.seed, first_game_id=args.first_game_id)
+    elif args.command == "book":
+        count = build_book(args.output, pgn_paths=args.pgn, record_paths=args.records, max_ply=args.max_ply,
+                           min_weight=args.min_weight)
+        print("{} book entries written to {}".format(count, args.output))
+    elif args.command == "tablebase":
+        tablebase = Tablebase(args.output)
+        for signature in args.signatures:
+            tablebase.generate(signature)
+            print("generated {}".format(signature))
+    elif args.command == "worker":
+        with create_worker_server(args.host, args.port) as server:
+            server.serve_forever()
+    elif args.command == "distributed":
+        workers = []
+        for address in args.workers:
+            host, _, port = address.rpartition(":")
+            workers.append((host, int(port)))
+        result = run_coordinator(workers, args.fen, args.moves, simulations=args.nodes, move_time=args.movetime / 1000)
+
+        pos = Board()
+        pos.parse_fen(args.fen)
+        for move_str in args.moves:
+            pos.make_move(pos.parse_move(move_str))
+        for move, (visits, wins, _) in sorted(result.children.items(), key=lambda item: -item[1][0]):
+            print("{} visits {} score {:.3f}".format(pos.moveGenerator.print_move(move), visits, wins / visits))
+        best_move = result.get_best_move()
+        print("bestmove {}".format(pos.moveGenerator.print_move(best_move) if best_move != NO_MOVE else "0000"))
+    elif args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, args.workers))
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "analyse":
+        pos = Board()
+        pos.parse_fen(args.fen)
+        root = run_analysis(pos, args.nodes, args.tree, checkpoint_simulations=args.checkpoint, post_thinking=True,
+                            overwrite=args.force)
+        best_node = root.get_most_visited_child()
+        if best_node is not None:
+            print("bestmove {}".format(pos.moveGenerator.print_move(best_node.move)))
 
 
 if __name__ == '__main__':
+    arguments = parse_args()
+    if arguments.command is not None:
+        run_command(arguments)
+        sys.exit(0)
+
     board = Board()
-    # info = SearchInfo()
+    info = SearchInfo()
+    opening_book = open_book(arguments.book)
+    endgame_tablebase = Tablebase(arguments.tablebase) if arguments.tablebase else None
 
     print("Welcome to Hugo! Type 'hugo' for console mode...\n")
 
@@ -14,12 +159,12 @@ if __name__ == '__main__':
             continue
 
         if "uci" in line:
-            # board, info = UciLoop(board, info)
-            # if info.Quit:
-            #     break
+            board, info = uci_loop(board, info, opening_book, endgame_tablebase)
+            if info.quit:
+                break
             continue
         elif "hugo" in line:
-            console_loop(board)
+            console_loop(board, opening_book, endgame_tablebase)
             # if info.Quit:
             #     break
             # continue
@@ -0,0 +1,46 @@
+import io
+import json
+import unittest
+from lib.batch import iter_positions, run_batch
+
+
+EPD = """8/8/3k4/8/8/3K4/8/R7 w - - 0 1
+# comment
+
+3k4/Q7/3K4/8/8/8/8/8 w - - bm Qd7; id "mate.1";
+8/8/8/8
+"""
+
+
+class TestBatch(unittest.TestCase):
+    def test_iter_positions(self):
+        positions = list(iter_positions(io.StringIO(EPD)))
+
+        self.assertEqual(len(positions), 3)
+        self.assertEqual(positions[0], ("8/8/3k4/8/8/3K4/8/R7 w - - 0 1", None))
+        self.assertEqual(positions[1], ("3k4/Q7/3K4/8/8/8/8/8 w - -", "mate.1"))
+
+    def test_run_batch(self):
+        output = io.StringIO()
+        count = run_batch(io.StringIO(EPD), output, simulations=5)
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+
+        self.assertEqual(count, 3)
+        self.assertEqual(results[0]["nodes"], 5)
+        self.assertIn("bestmove", results[0])
+        self.assertEqual(results[1]["id"], "mate.1")
+        self.assertIn("error", results[2])
+
+    def test_run_batch_with_cache(self):
+        fen = "8/8/3k4/8/8/3K4/8/R7 w - - 0 1"
+        output = io.StringIO()
+        run_batch(io.StringIO("\n".join([fen, fen])), output, simulations=7, use_cache=True)
+        first, second = [json.loads(line) for line in output.getvalue().splitlines()]
+
+        self.assertNotIn("cached", first)
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["bestmove"], first["bestmove"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from lib.constants import START_FEN, NO_MOVE
+from lib.board import Board
+from lib.book import build_book, OpeningBook
+from lib.search import search_position
+
+
+PGN = """[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 1-0
+
+[Result "0-1"]
+
+1. e4 c5 0-1
+
+[Result "1/2-1/2"]
+
+1. d4 d5 1/2-1/2
+"""
+
+
+class TestOpeningBook(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        pgn_path = os.path.join(self.directory.name, "games.pgn")
+        with open(pgn_path, "w") as pgn_file:
+            pgn_file.write(PGN)
+
+        self.path = os.path.join(self.directory.name, "book.bin")
+        self.count = build_book(self.path, pgn_paths=[pgn_path], max_ply=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_entries(self):
+        board = Board()
+        board.parse_fen(START_FEN)
+
+        with OpeningBook(self.path) as book:
+            entries = dict(book.get_entries(board))
+
+            # e4: win + loss, d4: draw
+            self.assertEqual(entries, {board.parse_move("e2e4"): 2, board.parse_move("d2d4"): 1})
+            self.assertEqual(book.get_move(board, pick_random=False), board.parse_move("e2e4"))
+
+            board.make_move(board.parse_move("e2e4"))
+            self.assertEqual(dict(book.get_entries(board)), {board.parse_move("c7c5"): 2})  # e5 only lost
+
+            board.make_move(board.parse_move("e7e5"))
+            self.assertEqual(book.get_move(board), NO_MOVE)  # beyond max_ply
+
+        self.assertEqual(self.count, 4)
+
+    def test_book_hit_skips_search(self):
+        board = Board()
+        board.parse_fen(START_FEN)
+
+        with OpeningBook(self.path) as book:
+            move = search_position(board, simulations=10 ** 9, book=book)
+
+        self.assertIn(move, (board.parse_move("e2e4"), board.parse_move("d2d4")))
+
+
+if __name__ == '__main__':
+    unittest.main()
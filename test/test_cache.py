@@ -0,0 +1,92 @@
+import unittest
+from lib.batch import analyse_position
+from lib.board import Board
+from lib.cache import ResultCache
+from lib.constants import *
+from lib.mcts import uct_search
+from lib.search import SearchInfo, search_position
+
+
+QUIET_FEN = "8/8/3k4/8/8/3K4/8/R7 w - - 0 1"
+OTHER_FEN = "8/8/3k4/8/8/3K4/8/1R6 w - - 0 1"
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.board = Board()
+        self.board.parse_fen(QUIET_FEN)
+        self.other = Board()
+        self.other.parse_fen(OTHER_FEN)
+
+    def test_get_and_put(self):
+        cache = ResultCache()
+        self.assertIsNone(cache.get(self.board, 50))
+
+        root = uct_search(self.board, 50)
+        cache.put(self.board, 50, root)
+        entry = cache.get(self.board, 50)
+        self.assertEqual(entry.bestMove, root.get_most_visited_child().move)
+        self.assertEqual(entry.visits, 50)
+        self.assertEqual(len(entry.children), len(root.childNodes))
+        self.assertIsNone(entry.rootnode)
+        self.assertIsNone(cache.get(self.board, 100))  # other budget
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(max_entries=2)
+        cache.put(self.board, 10, uct_search(self.board, 10))
+        cache.put(self.other, 10, uct_search(self.other, 10))
+        cache.get(self.board, 10)  # the other position is now the least recently used one
+        cache.put(self.board, 20, uct_search(self.board, 20))
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(self.other, 10))
+        self.assertIsNotNone(cache.get(self.board, 10))
+        self.assertIsNotNone(cache.get(self.board, 20))
+
+    def test_memory_bound(self):
+        cache = ResultCache(max_bytes=1, keep_trees=True)
+        cache.put(self.board, 20, uct_search(self.board, 20))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.memory, 0)
+
+        root = uct_search(self.board, 20)
+        cache = ResultCache(keep_trees=True)
+        cache.put(self.board, 20, root)
+        cache.maxBytes = cache.memory * 2
+        cache.put(self.other, 20, uct_search(self.other, 20))
+        self.assertLessEqual(cache.memory, cache.maxBytes)
+
+    def test_search_position_hit(self):
+        cache = ResultCache()
+        move = search_position(self.board, 50, cache=cache)
+        self.assertEqual(cache.get(self.board, 50).bestMove, move)
+
+        info = SearchInfo()
+        info.reset()
+        self.assertEqual(search_position(self.board, 50, info=info, cache=cache), move)
+        self.assertEqual(info.nodes, 0)  # answered without searching
+
+    def test_warm_start(self):
+        cache = ResultCache(keep_trees=True)
+        search_position(self.board, 40, cache=cache)
+        root = cache.get(self.board, 40).rootnode
+
+        search_position(self.board, 100, cache=cache)
+        self.assertIsNone(cache.get(self.board, 40))  # the tree moved to the larger search
+        entry = cache.get(self.board, 100)
+        self.assertIs(entry.rootnode, root)
+        self.assertEqual(root.visits, 100)
+
+    def test_analyse_position(self):
+        result = analyse_position(QUIET_FEN, simulations=30, use_cache=True)
+        self.assertNotIn("cached", result)
+
+        cached = analyse_position(QUIET_FEN, simulations=30, use_cache=True)
+        self.assertTrue(cached["cached"])
+        self.assertEqual(cached["bestmove"], result["bestmove"])
+        self.assertEqual(cached["nodes"], result["nodes"])
+
+
+if __name__ == '__main__':
+    unittest.main()
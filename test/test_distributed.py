@@ -0,0 +1,57 @@
+import threading
+import unittest
+from lib.board import Board
+from lib.constants import *
+from lib.distributed import create_worker_server, run_coordinator
+
+
+MATE_IN_1_FEN = "3k4/Q7/3K4/8/8/8/8/8 w - - 0 1"
+QUIET_FEN = "8/8/3k4/8/8/3K4/8/R7 w - - 0 1"
+
+
+class TestDistributed(unittest.TestCase):
+    def setUp(self):
+        self.servers = [create_worker_server("127.0.0.1", 0) for _ in range(2)]
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.workers = [server.server_address for server in self.servers]
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def test_merges_worker_statistics(self):
+        updates = []
+        result = run_coordinator(self.workers, QUIET_FEN, moves=["a1a6", "d6c5"], simulations=40,
+                                 on_update=updates.append)
+
+        self.assertEqual(result.workers, 2)
+        self.assertEqual(result.visits, 40)  # 20 simulations on each worker
+        self.assertEqual(sum(visits for visits, _, _ in result.children.values()), 40)
+        self.assertTrue(updates)
+
+        board = Board()
+        board.parse_fen(QUIET_FEN)
+        board.make_move(board.parse_move("a1a6"))
+        board.make_move(board.parse_move("d6c5"))
+        self.assertIn(result.get_best_move(), board.get_moves())
+
+    def test_proven_root_stops_all_workers(self):
+        result = run_coordinator(self.workers, MATE_IN_1_FEN, simulations=100000)
+        self.assertEqual(result.proven, LOSS)
+        self.assertLess(result.visits, 100000)
+
+        board = Board()
+        board.parse_fen(MATE_IN_1_FEN)
+        board.make_move(result.get_best_move())
+        self.assertEqual(board.get_result(board.playerJustMoved), WIN)
+
+    def test_time_limit(self):
+        result = run_coordinator(self.workers, QUIET_FEN, simulations=100000, move_time=0.3)
+        self.assertEqual(result.workers, 2)
+        self.assertLess(result.visits, 100000)
+
+
+if __name__ == '__main__':
+    unittest.main()
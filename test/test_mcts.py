@@ -0,0 +1,139 @@
+import sys
+import unittest
+from unittest.mock import patch
+from lib.board import Board
+from lib.constants import *
+from lib.mcts import Node, uct_search, get_expansion_order, update_amaf
+
+
+MATE_IN_1_FEN = "3k4/Q7/3K4/8/8/8/8/8 w - - 0 1"
+MATE_IN_2_FEN = "3k4/Q7/8/3K4/8/8/8/8 w - - 0 1"
+STALEMATED_FEN = "k7/2Q5/1K6/8/8/8/8/8 b - - 0 1"
+CAPTURES_FEN = "3k4/3p4/8/3q4/4P3/8/8/3QK3 w - - 0 1"
+KIWIPETE_FEN = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+
+
+class TestMcts(unittest.TestCase):
+    def search(self, fen: str, itermax: int):
+        board = Board()
+        board.parse_fen(fen)
+        return board, uct_search(board, itermax)
+
+    def test_mate_in_1_is_proven(self):
+        board, root = self.search(MATE_IN_1_FEN, 5000)
+        self.assertEqual(root.proven, LOSS)  # lost for black, the player that just moved at the root
+        self.assertLess(root.visits, 5000)
+
+        best = root.get_most_visited_child()
+        self.assertEqual(best.proven, WIN)
+        board.make_move(best.move)
+        self.assertEqual(board.get_result(board.playerJustMoved), WIN)
+
+    def test_mate_in_2_is_proven(self):
+        board, root = self.search(MATE_IN_2_FEN, 5000)
+        self.assertEqual(root.proven, LOSS)
+        self.assertLess(root.visits, 5000)
+
+        best = root.get_most_visited_child()
+        self.assertEqual(best.proven, WIN)
+        self.assertTrue(all(c.proven == LOSS for c in best.childNodes))  # every reply gets mated
+
+    def test_terminal_root(self):
+        board, root = self.search(STALEMATED_FEN, 100)
+        self.assertEqual(root.proven, DRAW)
+        self.assertEqual(root.visits, 1)
+
+    def test_expansion_order(self):
+        board = Board()
+        board.parse_fen(CAPTURES_FEN)
+        moves, priors = get_expansion_order(board)
+
+        self.assertEqual(sorted(moves), sorted(board.get_moves()))
+        self.assertEqual(len(priors), len(moves))
+        self.assertAlmostEqual(sum(priors), 1.0, places=5)
+        self.assertGreater(priors[-1], priors[0])
+        self.assertEqual(board.moveGenerator.print_move(moves[-1]), "e4d5")  # pawn takes queen
+        self.assertEqual(board.moveGenerator.print_move(moves[-2]), "d1d5")
+
+    def test_expansion_order_makes_no_moves(self):
+        board = Board()
+        board.parse_fen(CAPTURES_FEN)
+        board.enable_attack_maps()  # as in a search, legal moves are found without making them
+        with patch.object(board, "make_move", wraps=board.make_move) as make_move:
+            moves, priors = get_expansion_order(board)
+        self.assertEqual(make_move.call_count, 0)  # checks are found on the board, not by playing the moves
+
+        # the priors are packed floats in the order of the moves instead of a dict by move
+        self.assertLess(sys.getsizeof(priors), sys.getsizeof(dict.fromkeys(moves, 0.0)))
+
+    def test_progressive_widening(self):
+        board = Board()
+        board.parse_fen(START_FEN)
+        root = uct_search(board, 100)
+
+        self.assertLessEqual(len(root.childNodes), 11)  # 1 + sqrt(100)
+        self.assertEqual(len(root.childNodes) + len(root.untriedMoves), 20)
+        # leaves never generate their moves
+        leaves = [c for c in root.childNodes if not c.childNodes]
+        self.assertTrue(all(c.untriedMoves is None for c in leaves if c.visits == 1))
+
+    def test_moves_are_generated_on_expansion(self):
+        board = Board()
+        board.parse_fen(START_FEN)
+        node = Node(state=board)
+        self.assertIsNone(node.untriedMoves)
+        self.assertTrue(node.can_expand(board))
+        self.assertEqual(len(node.untriedMoves), 20)
+
+    def test_update_amaf(self):
+        board = Board()
+        board.parse_fen(START_FEN)
+        root = Node(state=board)
+        root.can_expand(board)
+        e4, d4, e5 = board.parse_move("e2e4"), board.parse_move("d2d4"), board.parse_move("e7e5")
+        board.make_move(e4)
+        child = root.add_child(e4, board)
+        board.take_move()
+        board.make_move(d4)
+        sibling = root.add_child(d4, board)
+
+        # the simulation went e4 (tree move) e5 d4: d4 was played by white later on
+        update_amaf(child, [e4, e5, d4], 1, WIN)
+        self.assertEqual((child.amafVisits, child.amafWins), (1, WIN))
+        self.assertEqual((sibling.amafVisits, sibling.amafWins), (1, WIN))
+
+        update_amaf(child, [e4, d4, e5], 1, LOSS)  # d4 played by black is no match for the white sibling
+        self.assertEqual(sibling.amafVisits, 1)
+
+    def test_rave_search(self):
+        board = Board()
+        board.parse_fen(MATE_IN_2_FEN)
+        root = uct_search(board, 5000, rave=True)
+        self.assertEqual(root.proven, LOSS)
+        self.assertTrue(any(c.amafVisits > c.visits for c in root.childNodes))
+
+    def test_deep_tree_walks(self):
+        board = Board()
+        board.parse_fen(START_FEN)
+        root = node = Node(state=board)
+        for _ in range(5000):  # deeper than the default recursion limit
+            node.visits = 1
+            node = Node(move=0, parent=node, state=board)
+            node.parentNode.childNodes.append(node)
+
+        self.assertEqual(sum(1 for _ in root.iter_tree()), 5001)
+        self.assertEqual(root.convert_tree_to_string(0).count("\n"), 5001)
+
+    def test_search_restores_root(self):
+        board = Board()
+        board.parse_fen(KIWIPETE_FEN)
+        fen, key = board.get_fen(), board.posKey.value
+        uct_search(board, 20)
+
+        self.assertEqual(board.get_fen(), fen)
+        self.assertEqual(board.posKey.value, key)
+        self.assertEqual(board.histPly, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
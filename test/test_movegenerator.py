@@ -1,6 +1,11 @@
 import unittest
-from lib.constants import START_FEN, BLACK
+from array import array
+from lib.constants import *
 from lib.board import Board
+from lib.movegenerator import GEN_CAPTURES, new_move_buffer, perft
+
+
+KIWIPETE_FEN = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
 
 
 class TestMoveGenerator(unittest.TestCase):
@@ -47,6 +52,94 @@ class TestMoveGenerator(unittest.TestCase):
 
         self.assertEqual(len(moves), 43)
 
+    def test_staged_moves(self):
+        board = Board()
+        board.parse_fen(KIWIPETE_FEN)
+        staged = list(board.moveGenerator.iter_moves())
+
+        self.assertEqual(sorted(staged), sorted(board.moveGenerator.generate_all_moves()))
+
+        # captures first, castling last
+        captures = board.moveGenerator.generate_moves([], GEN_CAPTURES)
+        self.assertEqual(staged[:len(captures)], captures)
+        self.assertTrue(all(move & MOVE_FLAG_CAPTURE for move in captures))
+        self.assertTrue(all(move & MOVE_FLAG_CASTLE for move in staged[-2:]))
+
+    def test_staged_moves_resume_after_take_move(self):
+        board = Board()
+        board.parse_fen(START_FEN)
+        moves = board.moveGenerator.iter_moves()
+        first = next(moves)
+
+        board.make_move(first)  # the generator is resumed in the same position
+        board.take_move()
+        self.assertEqual([first] + list(moves), list(board.moveGenerator.iter_moves()))
+
+    def test_has_legal_move(self):
+        board = Board()
+        board.parse_fen(START_FEN)
+        self.assertTrue(board.has_legal_move())
+
+        board.parse_fen("3k4/3Q4/3K4/8/8/8/8/8 b - - 0 1")  # mated
+        self.assertFalse(board.has_legal_move())
+
+    def test_rewind(self):
+        board = Board()
+        board.parse_fen(KIWIPETE_FEN)
+        board.enable_attack_maps()
+        board.make_move(board.parse_move("e1g1"))
+        snapshot = board.get_snapshot()
+        fen, key, maps = board.get_fen(), board.posKey.value, [list(attack_map) for attack_map in board.attackMaps]
+
+        for move in ("b4c3", "d5e6", "e8c8", "e6f7"):  # capture, castling and a check
+            board.make_move(board.parse_move(move))
+        board.rewind(snapshot)
+
+        self.assertEqual(board.get_fen(), fen)
+        self.assertEqual(board.posKey.value, key)
+        self.assertEqual(board.histPly, 1)
+        self.assertEqual([list(attack_map) for attack_map in board.attackMaps], maps)
+        board.take_move()  # the history below the snapshot is intact
+        self.assertEqual(board.get_fen(), KIWIPETE_FEN)
+
+    def test_perft(self):
+        board = Board()
+        board.parse_fen(KIWIPETE_FEN)
+
+        self.assertEqual(perft(board, 2), 2039)
+
+    def test_moves_into_buffer(self):
+        board = Board()
+        board.parse_fen(KIWIPETE_FEN)
+        moves = new_move_buffer()
+
+        count = board.get_moves_into(moves)
+        self.assertEqual(sorted(moves[:count]), sorted(board.get_moves()))
+
+        with self.assertRaises(ValueError):  # more moves than the buffer holds
+            board.moveGenerator.generate_moves_into(array('I', bytes(4 * 8)))
+
+        count = board.moveGenerator.generate_moves_into(moves)
+        exact = array('I', bytes(4 * count))  # the last pieces go through the piece buffer
+        self.assertEqual(board.moveGenerator.generate_moves_into(exact), count)
+        self.assertEqual(exact, moves[:count])
+        with self.assertRaises(ValueError):
+            board.moveGenerator.generate_moves_into(array('I', bytes(4 * (count - 1))))
+
+    def test_perft_with_attack_maps(self):
+        board = Board()
+        board.parse_fen(KIWIPETE_FEN)
+        board.enable_attack_maps()
+
+        self.assertEqual(perft(board, 2), 2039)
+
+        # the incrementally updated maps match maps computed from scratch
+        board.make_move(board.parse_move("e2a6"))
+        board.make_move(board.parse_move("b4c3"))
+        maps = [list(attack_map) for attack_map in board.attackMaps]
+        board.compute_attack_maps()
+        self.assertEqual(maps, board.attackMaps)
+
 
 if __name__ == '__main__':
     unittest.main()
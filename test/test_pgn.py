@@ -0,0 +1,77 @@
+import io
+import unittest
+from lib.constants import START_FEN, NO_MOVE
+from lib.board import Board
+from lib.pgn import read_games, write_game, parse_san, get_san
+
+
+PGN = """[Event "First"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 {a comment
+spanning two lines} Nc6 3. Bb5 (3. Bc4 Bc5) a6 $1 4. Ba4 Nf6 5. O-O b5 1-0
+
+[Event "Second"]
+[SetUp "1"]
+[FEN "4k3/P7/8/8/8/8/8/4K3 w - - 0 1"]
+
+1. a8=Q+ Kd7 *
+"""
+
+
+class TestPgn(unittest.TestCase):
+    def test_read_games(self):
+        games = list(read_games(io.StringIO(PGN)))
+
+        self.assertEqual(len(games), 2)
+        self.assertEqual(games[0].headers["Event"], "First")
+        self.assertEqual(games[0].result, "1-0")
+        self.assertEqual(games[0].moves, ["e4", "e5", "Nf3", "Nc6", "Bb5", "a6", "Ba4", "Nf6", "O-O", "b5"])
+        self.assertEqual(games[1].moves, ["a8=Q+", "Kd7"])
+
+    def test_replay(self):
+        board = Board()
+        games = list(read_games(io.StringIO(PGN)))
+
+        self.assertEqual(len(list(games[0].replay(board))), 10)
+        self.assertEqual(board.get_fen(), "r1bqkb1r/2pp1ppp/p1n2n2/1p2p3/B3P3/5N2/PPPP1PPP/RNBQ1RK1 w kq b6 0 6")
+
+    def test_fen_fullmove_number(self):
+        board = Board()
+        board.parse_fen("4k3/8/8/8/8/8/4K3/R6R b - - 0 42")
+        self.assertEqual(board.get_fen(), "4k3/8/8/8/8/8/4K3/R6R b - - 0 42")
+
+        board.make_move(board.parse_move("e8d7"))
+        self.assertEqual(board.get_fen(), "8/3k4/8/8/8/8/4K3/R6R w - - 1 43")
+        board.make_move(board.parse_move("e2e3"))
+        self.assertEqual(board.get_fen(), "8/3k4/8/8/8/4K3/8/R6R b - - 2 43")
+
+    def test_san(self):
+        board = Board()
+        board.parse_fen("4k3/8/8/8/8/8/4K3/R6R w - - 0 1")
+        self.assertEqual(get_san(board, parse_san(board, "Rad1")), "Rad1")
+
+        board.parse_fen("4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1")
+        self.assertEqual(get_san(board, parse_san(board, "Rd1")), "Rd1")
+        self.assertEqual(get_san(board, parse_san(board, "O-O-O")), "O-O-O")
+        self.assertEqual(get_san(board, parse_san(board, "Ra8")), "Ra8+")
+        self.assertEqual(parse_san(board, "Rb8"), NO_MOVE)
+        self.assertEqual(parse_san(board, "e1g1"), parse_san(board, "O-O"))
+
+    def test_write_and_read_back(self):
+        board = Board()
+        game = list(read_games(io.StringIO(PGN)))[0]
+        list(game.replay(board))
+
+        output = io.StringIO()
+        write_game(output, board, headers={"Event": "Copy", "Result": "1-0"}, start_fen=START_FEN)
+        copy = list(read_games(io.StringIO(output.getvalue())))[0]
+
+        self.assertEqual(copy.headers["Event"], "Copy")
+        self.assertEqual(copy.moves, game.moves)
+        self.assertEqual(copy.result, "1-0")
+        self.assertEqual(board.histPly, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
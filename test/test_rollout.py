@@ -0,0 +1,66 @@
+import unittest
+from lib.board import Board
+from lib.constants import *
+from lib.mcts import uct_search
+from lib.movegenerator import new_move_buffer
+from lib.rollout import CaptureFirstRollout, HeavyRollout, get_rollout_policy, get_tactical_score, gives_check
+
+
+CAPTURES_FEN = "3k4/3p4/8/3q4/4P3/8/8/3QK3 w - - 0 1"
+MATE_IN_1_FEN = "3k4/Q7/3K4/8/8/8/8/8 w - - 0 1"
+# direct, discovered & promotion checks, en passant and castling
+CHECKS_FENS = [
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+    "4k3/8/8/3pP3/8/8/8/R3K2B w Q d6 0 1",
+]
+
+
+class TestRollout(unittest.TestCase):
+    def test_tactical_score(self):
+        board = Board()
+        board.parse_fen(CAPTURES_FEN)
+
+        pawn_takes_queen = get_tactical_score(board, board.parse_move("e4d5"))
+        queen_takes_queen = get_tactical_score(board, board.parse_move("d1d5"))
+        self.assertGreater(pawn_takes_queen, queen_takes_queen)
+        self.assertEqual(get_tactical_score(board, board.parse_move("e1e2")), 0)
+
+    def test_gives_check(self):
+        board = Board()
+        for fen in CHECKS_FENS:
+            board.parse_fen(fen)
+            for move in board.get_moves():
+                board.make_move(move)
+                check = board.is_square_attacked(board.kingSquare[board.side], board.side ^ 1)
+                board.take_move()
+                self.assertEqual(gives_check(board, move), check, (fen, board.moveGenerator.print_move(move)))
+
+    def test_capture_first_plays_mvv_lva(self):
+        board = Board()
+        board.parse_fen(CAPTURES_FEN)
+        moves = new_move_buffer()
+        count = board.get_moves_into(moves)
+
+        move = CaptureFirstRollout(epsilon=0.0).choose_move(board, moves, count)
+        self.assertEqual(board.moveGenerator.print_move(move), "e4d5")
+
+    def test_search_with_heavy_rollouts(self):
+        board = Board()
+        board.parse_fen(MATE_IN_1_FEN)
+
+        root = uct_search(board, 150, rollout_policy=HeavyRollout())
+        best = root.get_most_visited_child()
+        board.make_move(best.move)
+        self.assertEqual(board.get_result(board.playerJustMoved), WIN)
+
+    def test_unknown_policy(self):
+        self.assertIsInstance(get_rollout_policy("capture"), CaptureFirstRollout)
+        with self.assertRaises(ValueError):
+            get_rollout_policy("nonsense")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import time
+import unittest
+from lib.board import Board
+from lib.constants import LOSS
+from lib.search import SearchResult, search_position, search_tree, start_pondering, stop_pondering
+
+
+MATE_IN_1_FEN = "3k4/Q7/3K4/8/8/8/8/8 w - - 0 1"
+QUIET_FEN = "8/8/3k4/8/8/3K4/8/R7 w - - 0 1"  # no forced mate within the reach of the searches
+
+
+class TestSearch(unittest.TestCase):
+    def test_search_tree(self):
+        board = Board()
+        board.parse_fen(QUIET_FEN)
+        root = search_tree(board, simulations=20)
+
+        self.assertEqual(root.visits, 20)
+        self.assertEqual(board.histPly, 0)  # board is restored after the search
+
+    def test_search_result(self):
+        board = Board()
+        board.parse_fen(QUIET_FEN)
+        result = SearchResult()
+        move = search_position(board, simulations=20, result=result)
+
+        self.assertEqual(result.bestMove, move)
+        self.assertEqual((result.source, result.nodes), ("search", 20))
+        self.assertGreater(result.visits, 0)
+        self.assertTrue(0.0 <= result.winRate <= 1.0)
+
+    def test_ponder_keeps_subtree(self):
+        board = Board()
+        board.parse_fen(QUIET_FEN)
+        thread, info, root = start_pondering(board)
+        time.sleep(0.5)
+        stop_pondering(thread, info)
+
+        self.assertFalse(thread.is_alive())
+        self.assertGreater(root.visits, 0)
+
+        child = root.get_most_visited_child()
+        subtree = root.detach_child(child.move)
+        self.assertIs(subtree, child)
+        self.assertIsNone(subtree.parentNode)
+
+        board.make_move(child.move)
+        visits = subtree.visits
+        search_tree(board, simulations=5, rootnode=subtree)
+        self.assertEqual(subtree.visits, visits + 5)
+
+    def test_search_stops_when_proven(self):
+        board = Board()
+        board.parse_fen(MATE_IN_1_FEN)
+        root = search_tree(board, simulations=1000)
+
+        self.assertEqual(root.proven, LOSS)
+        self.assertLess(root.visits, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from math import log, sqrt
+from lib.board import Board
+from lib.constants import *
+from lib.mcts import uct_search
+from lib.selection import (PUCT, UCB1, UCB1Tuned, RAVE, TABLE_SIZE, get_log, get_sqrt, get_sqrt_log,
+                           get_selection_policy)
+
+
+MATE_IN_2_FEN = "3k4/Q7/8/3K4/8/8/8/8 w - - 0 1"
+
+
+class FakeNode:
+    def __init__(self, wins=0.0, visits=0, prior=1.0, proven=None):
+        self.wins = wins
+        self.squaredWins = wins
+        self.visits = visits
+        self.prior = prior
+        self.proven = proven
+        self.amafWins = 0
+        self.amafVisits = 0
+        self.childNodes = []
+
+
+class TestSelection(unittest.TestCase):
+    def test_tables(self):
+        for n in (1, 2, 100, TABLE_SIZE - 1, TABLE_SIZE, 10 * TABLE_SIZE):
+            self.assertAlmostEqual(get_log(n), log(n))
+            self.assertAlmostEqual(get_sqrt(n), sqrt(n))
+            self.assertAlmostEqual(get_sqrt_log(n), sqrt(log(n)))
+
+    def test_ucb1_tuned_formula(self):
+        parent = FakeNode(visits=1000)
+        low_variance, high_variance = FakeNode(wins=30, visits=60), FakeNode(wins=31, visits=60)
+        low_variance.squaredWins = 16  # results close to the mean
+        parent.childNodes = [low_variance, high_variance]
+
+        def ucb1_tuned(child):
+            mean = child.wins / child.visits
+            variance = child.squaredWins / child.visits - mean * mean + sqrt(2 * log(parent.visits) / child.visits)
+            return mean + sqrt(log(parent.visits) / child.visits * min(0.25, variance))
+
+        expected = max(parent.childNodes, key=ucb1_tuned)
+        self.assertIs(UCB1Tuned().select_child(parent), expected)
+        self.assertIs(expected, high_variance)
+
+    def test_policies_explore(self):
+        parent = FakeNode(visits=100)
+        good, unexplored = FakeNode(wins=60, visits=90), FakeNode(wins=5, visits=10)
+        parent.childNodes = [good, unexplored]
+
+        self.assertIs(UCB1(c=0.0).select_child(parent), good)
+        self.assertIs(UCB1(c=10.0).select_child(parent), unexplored)
+        self.assertIs(UCB1Tuned().select_child(parent), unexplored)
+        self.assertIs(RAVE().select_child(parent), unexplored)
+
+        unexplored.prior, good.prior = 0.01, 0.99
+        self.assertIs(PUCT().select_child(parent), good)
+
+    def test_proven_losses_are_avoided(self):
+        parent = FakeNode(visits=100)
+        lost, other = FakeNode(wins=99, visits=99, proven=LOSS), FakeNode(wins=0, visits=1)
+        parent.childNodes = [lost, other]
+
+        for name in ("ucb1", "ucb1-tuned", "puct", "rave"):
+            self.assertIs(get_selection_policy(name).select_child(parent), other)
+
+    def test_search_with_policies(self):
+        for policy in (UCB1Tuned(), PUCT()):
+            board = Board()
+            board.parse_fen(MATE_IN_2_FEN)
+            root = uct_search(board, 5000, selection_policy=policy)
+            self.assertEqual(root.proven, LOSS)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            get_selection_policy("nonsense")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from lib.board import Board
+from lib.constants import PACKED_POSITION_SIZE
+from lib.selfplay import run_selfplay, iter_records, pack_record, MAX_RECORDED_CHILDREN, RECORD_SIZE
+
+
+class TestSelfPlay(unittest.TestCase):
+    def test_records_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "games.bin")
+            count = run_selfplay(path, games=2, simulations=3, random_plies=0, max_plies=4, seed=1,
+                                 start_fen="8/8/3k4/8/8/3K4/8/R7 w - - 0 1")
+            records = list(iter_records(path))
+
+            self.assertEqual(os.path.getsize(path), count * RECORD_SIZE)
+            self.assertEqual(len(records), count)
+            self.assertEqual({record.gameId for record in records}, {0, 1})
+
+            board = Board()
+            for record in records:
+                board.parse_packed_position(record.packedPosition)
+                self.assertIn(record.move, board.get_moves())
+                self.assertEqual(sum(visits for _, visits in record.children) + record.droppedVisits, 3)
+
+    def test_game_ids_continue(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "games.bin")
+            for _ in range(2):
+                run_selfplay(path, games=2, simulations=3, random_plies=0, max_plies=2, seed=1,
+                             start_fen="8/8/3k4/8/8/3K4/8/R7 w - - 0 1")
+            run_selfplay(path, games=1, simulations=3, random_plies=0, max_plies=2, seed=1,
+                         start_fen="8/8/3k4/8/8/3K4/8/R7 w - - 0 1", first_game_id=10)
+            self.assertEqual({record.gameId for record in iter_records(path)}, {0, 1, 2, 3, 10})
+
+    def test_dropped_children_are_counted(self):
+        children = [(move, 100000 + move) for move in range(1, MAX_RECORDED_CHILDREN + 9)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "games.bin")
+            with open(path, "wb") as record_file:
+                record_file.write(pack_record(0, 0, bytes(PACKED_POSITION_SIZE), 0, 1, children))
+            record, = iter_records(path)
+
+        self.assertEqual(len(record.children), MAX_RECORDED_CHILDREN)
+        self.assertEqual(record.children[0], children[-1])  # most visited first, visits are not clipped
+        self.assertEqual(sum(visits for _, visits in record.children) + record.droppedVisits,
+                         sum(visits for _, visits in children))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import unittest
+from lib.constants import *
+from lib.service import AnalysisService, ServiceBusy, start_service
+
+
+QUIET_FEN = "8/8/3k4/8/8/3K4/8/R7 w - - 0 1"
+MATE_IN_1_FEN = "3k4/Q7/3K4/8/8/8/8/8 w - - 0 1"
+
+
+class FailingService(AnalysisService):
+    def submit(self, fen: str, simulations: int = 1000, move_time: float = 0.0, priority: int = 0):
+        future = asyncio.get_running_loop().create_future()
+        future.set_exception(RuntimeError("worker crashed"))
+        return future
+
+
+class TestService(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.service = AnalysisService(workers=1, max_pending=3)
+        await self.service.start()
+
+    async def asyncTearDown(self):
+        await self.service.close()
+
+    async def test_requests_are_deduplicated(self):
+        first = self.service.submit(QUIET_FEN, simulations=10)
+        second = self.service.submit(QUIET_FEN.replace(" 0 1", " 5 20"), simulations=10)  # same posKey
+        other_budget = self.service.submit(QUIET_FEN, simulations=5)
+
+        results = await asyncio.gather(first, second, other_budget)
+        self.assertIs(results[0], results[1])
+        self.assertEqual(results[0]["nodes"], 10)
+        self.assertEqual(results[2]["nodes"], 5)
+        self.assertEqual(self.service.searches, 2)
+
+    async def test_priorities_and_cancellation(self):
+        order = []
+        running = self.service.submit(QUIET_FEN, simulations=20)  # keeps the only worker busy
+        await asyncio.sleep(0.1)
+        low = self.service.submit(MATE_IN_1_FEN, simulations=10, priority=5)
+        high = self.service.submit(QUIET_FEN, simulations=10, priority=1)
+        cancelled = self.service.submit(START_FEN, simulations=10, priority=0)
+        for future, name in ((low, "low"), (high, "high")):
+            future.add_done_callback(lambda _, name=name: order.append(name))
+
+        self.service.cancel(cancelled)
+        await asyncio.gather(running, low, high)
+        self.assertEqual(order, ["high", "low"])
+        self.assertTrue(cancelled.cancelled())
+        self.assertEqual(self.service.searches, 3)  # the cancelled search never started
+
+    async def test_busy(self):
+        self.service.submit(QUIET_FEN, simulations=30)
+        await asyncio.sleep(0.1)
+        futures = [self.service.submit(QUIET_FEN, simulations=nodes) for nodes in (1, 2, 3)]
+        with self.assertRaises(ServiceBusy):
+            self.service.submit(QUIET_FEN, simulations=4)
+        with self.assertRaises(ValueError):
+            self.service.submit("not a fen")
+        await asyncio.gather(*futures)
+
+    async def test_tcp_protocol(self):
+        service, server = await start_service("127.0.0.1", 0, workers=1)
+        try:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            for request in ({"id": 1, "fen": MATE_IN_1_FEN, "nodes": 10},
+                            {"id": 2, "fen": QUIET_FEN, "nodes": 10, "priority": 9},
+                            {"id": 2, "fen": QUIET_FEN, "nodes": 20},
+                            {"cmd": "cancel", "id": 2},
+                            {"id": 3, "fen": "nonsense"},
+                            {"fen": QUIET_FEN}):
+                writer.write((json.dumps(request) + "\n").encode())
+            await writer.drain()
+
+            responses = {}
+            for _ in range(5):
+                response = json.loads(await reader.readline())
+                responses.setdefault(response["id"], []).append(response)
+
+            self.assertIn("bestmove", responses[1][0])
+            errors = sorted(response["error"] for response in responses[2])
+            self.assertEqual(errors, ["bad request: duplicate id 2", "cancelled"])
+            self.assertIn("error", responses[3][0])
+            self.assertEqual(responses[None][0]["error"], "bad request: missing id")
+            writer.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.close()
+
+    async def test_failed_request_gets_an_error_reply(self):
+        service = FailingService(workers=1)
+        server = await asyncio.start_server(service.handle_client, "127.0.0.1", 0)
+        try:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write((json.dumps({"id": 7, "fen": QUIET_FEN}) + "\n").encode())
+            await writer.drain()
+
+            response = json.loads(await reader.readline())
+            self.assertEqual(response, {"id": 7, "error": "worker crashed"})
+            writer.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from multiprocessing import Process
+from lib.board import Board
+from lib.constants import *
+from lib.mcts import TABLE_MIN_VISITS, uct_multi, uct_search
+from lib.sharedtable import BUCKET_SIZE, SharedTable
+
+
+MATE_IN_1_FEN = "3k4/Q7/3K4/8/8/8/8/8 w - - 0 1"
+QUIET_FEN = "8/8/3k4/8/8/3K4/8/R7 w - - 0 1"
+
+
+def add_visits(table, key, count):
+    for _ in range(count):
+        table.update(key, WIN)
+
+
+class TestSharedTable(unittest.TestCase):
+    def test_update_and_probe(self):
+        with SharedTable(capacity=16) as table:
+            self.assertIsNone(table.probe(12345))
+
+            table.update(12345, WIN)
+            table.update(12345, DRAW, proven=LOSS)
+            entry = table.probe(12345)
+            self.assertEqual((entry.visits, entry.wins, entry.proven), (2, 1.5, LOSS))
+
+    def test_least_visited_entry_is_replaced(self):
+        with SharedTable(capacity=16) as table:
+            keys = [1 + index * 16 for index in range(BUCKET_SIZE + 1)]  # all in the same bucket
+            for index, key in enumerate(keys[:BUCKET_SIZE]):
+                add_visits(table, key, index + 1)
+
+            table.update(keys[BUCKET_SIZE], LOSS)
+            self.assertIsNone(table.probe(keys[0]))
+            self.assertEqual(table.probe(keys[BUCKET_SIZE]).visits, 1)
+            self.assertEqual(table.probe(keys[1]).visits, 2)
+
+    def test_processes_share_the_table(self):
+        with SharedTable(capacity=16) as table:
+            processes = [Process(target=add_visits, args=(table, 99, 200)) for _ in range(4)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+            self.assertEqual(table.probe(99).visits, 800)
+
+    def test_search_writes_the_table(self):
+        board = Board()
+        board.parse_fen(MATE_IN_1_FEN)
+        with SharedTable(capacity=1 << 12) as table:
+            root = uct_search(board, 1000, table=table)
+            entry = table.probe(board.posKey.value)
+            self.assertEqual(entry.visits, root.visits)
+            self.assertEqual(entry.proven, LOSS)
+
+            # a second search finds the proofs of the first one
+            second = uct_search(board, 1000, table=table)
+            self.assertEqual(second.proven, LOSS)
+
+    def test_repetition_draws_are_not_shared(self):
+        board = Board()
+        board.parse_fen(QUIET_FEN)
+        for move in ["a1a2", "d6d7", "a2a1", "d7d6"] * 2:  # a1a2 now repeats a position for the third time
+            board.make_move(board.parse_move(move))
+
+        with SharedTable(capacity=1 << 12) as table:
+            root = uct_search(board, 300, table=table)
+            repetition = next(c for c in root.childNodes if board.moveGenerator.print_move(c.move) == "a1a2")
+            self.assertEqual(repetition.proven, DRAW)
+            self.assertTrue(repetition.provenByHistory)
+
+            board.make_move(repetition.move)
+            entry = table.probe(board.posKey.value)
+            self.assertIsNone(entry.proven)
+
+    def test_table_results_are_not_written_back(self):
+        board = Board()
+        board.parse_fen(QUIET_FEN)
+        move = uct_search(board, 1).childNodes[0].move  # the child the first iteration expands
+        board.make_move(move)
+        child_key = board.posKey.value
+        board.take_move()
+
+        with SharedTable(capacity=1 << 12) as table:
+            add_visits(table, child_key, TABLE_MIN_VISITS)
+            root = uct_search(board, 1, table=table)
+            self.assertEqual(root.childNodes[0].wins, WIN)  # the mean of the table instead of a rollout
+            self.assertEqual(table.probe(child_key).visits, TABLE_MIN_VISITS)
+            self.assertEqual(table.probe(board.posKey.value).visits, 1)  # the ancestors do take the result
+
+    def test_uct_multi(self):
+        board = Board()
+        board.parse_fen("3k4/8/3K4/8/8/8/8/R7 w - - 0 1")
+        move = uct_multi(board, 200)
+        board.make_move(move)
+        self.assertEqual(board.get_result(board.playerJustMoved), WIN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from multiprocessing import Process
+from lib.board import Board
+from lib.constants import START_FEN
+from lib.search import search_position
+from lib.store import PositionStore, MAX_PROBES
+
+
+MATE_IN_1_FEN = "3k4/Q7/3K4/8/8/8/8/8 w - - 0 1"
+QUIET_FEN = "8/8/3k4/8/8/3K4/8/R7 w - - 0 1"
+
+
+def store_positions(path: str, worker: int, workers: int):
+    """Stores the positions after every workers-th first move of the game, starting at move number worker"""
+    board = Board()
+    board.parse_fen(START_FEN)
+    with PositionStore(path, capacity=64) as store:
+        for index, move in enumerate(board.get_moves()):
+            if index % workers == worker:
+                board.make_move(move)
+                for visits in range(1, 50):
+                    store.store(board, move, visits, 0.5)
+                board.take_move()
+
+
+class TestPositionStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "positions.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_store_and_probe(self):
+        board = Board()
+        board.parse_fen(MATE_IN_1_FEN)
+        move = board.get_moves()[0]
+
+        with PositionStore(self.path, capacity=16) as store:
+            self.assertIsNone(store.probe(board))
+            store.store(board, move, 100, 0.75)
+            store.store(board, move, 50, 0.5)  # less visits -> ignored
+
+        # a new board and a reopened file see the same entry
+        other = Board()
+        other.parse_fen(MATE_IN_1_FEN)
+        with PositionStore(self.path) as store:
+            entry = store.probe(other)
+
+        self.assertEqual((entry.bestMove, entry.visits), (move, 100))
+        self.assertAlmostEqual(entry.winRate, 0.75)
+
+    def test_full_probe_window_replaces_least_visited(self):
+        board = Board()
+        board.parse_fen(MATE_IN_1_FEN)
+        moves = board.get_moves()
+
+        with PositionStore(self.path, capacity=MAX_PROBES) as store:
+            for i, move in enumerate(moves[:MAX_PROBES + 1]):
+                board.make_move(move)
+                store.store(board, move, i + 1, 0.5)
+                board.take_move()
+
+            board.make_move(moves[0])
+            self.assertIsNone(store.probe(board))  # the entry with one visit was replaced
+            board.take_move()
+
+            board.make_move(moves[MAX_PROBES])
+            self.assertEqual(store.probe(board).visits, MAX_PROBES + 1)
+
+    def test_search_position_uses_store(self):
+        board = Board()
+        board.parse_fen(QUIET_FEN)
+
+        with PositionStore(self.path, capacity=16) as store:
+            move = search_position(board, simulations=10, store=store)
+            self.assertEqual(store.probe(board).visits, 10)
+
+            store.store(board, board.get_moves()[-1], 1000, 1.0)
+            self.assertEqual(search_position(board, simulations=10, store=store), board.get_moves()[-1])
+            self.assertNotEqual(move, 0)
+
+    def test_concurrent_writers(self):
+        PositionStore(self.path, capacity=64).close()
+        processes = [Process(target=store_positions, args=(self.path, worker, 4)) for worker in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        board = Board()
+        board.parse_fen(START_FEN)
+        with PositionStore(self.path, capacity=64) as store:
+            for move in board.get_moves():
+                board.make_move(move)
+                entry = store.probe(board)
+                self.assertEqual((entry.bestMove, entry.visits), (move, 49))
+                board.take_move()
+
+
+if __name__ == '__main__':
+    unittest.main()
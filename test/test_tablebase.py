@@ -0,0 +1,67 @@
+import tempfile
+import unittest
+from lib.board import Board
+from lib.constants import *
+from lib.search import search_position
+from lib.tablebase import Tablebase
+
+
+MATE_IN_1_FEN = "3k4/Q7/3K4/8/8/8/8/8 w - - 0 1"
+MIRRORED_MATE_IN_1_FEN = "8/8/8/8/8/3k4/q7/3K4 b - - 0 1"
+HANGING_QUEEN_FEN = "K7/8/8/8/8/8/2kQ4/8 b - - 0 1"
+
+
+class TestTablebase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # generating KQvK takes a few seconds -> only once for all tests
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.tablebase = Tablebase(cls.directory.name)
+        cls.tablebase.generate("KQvK")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tablebase.close()
+        cls.directory.cleanup()
+
+    def probe(self, fen: str, tablebase=None):
+        board = Board()
+        board.parse_fen(fen)
+        return (tablebase or self.tablebase).probe(board)
+
+    def test_probe(self):
+        self.assertEqual(self.probe(MATE_IN_1_FEN), (WIN, 1))
+        self.assertEqual(self.probe(MIRRORED_MATE_IN_1_FEN), (WIN, 1))
+        self.assertEqual(self.probe(HANGING_QUEEN_FEN), (DRAW, 0))
+        self.assertEqual(self.probe("3k4/8/3K4/8/8/8/8/3Q4 b - - 0 1")[0], LOSS)
+        self.assertIsNone(self.probe(START_FEN))
+
+    def test_tables_are_read_from_disk(self):
+        tablebase = Tablebase(self.directory.name)
+        try:
+            self.assertEqual(self.probe(MATE_IN_1_FEN, tablebase), (WIN, 1))
+            self.assertIsNone(self.probe("3k4/R7/3K4/8/8/8/8/8 w - - 0 1", tablebase))  # KRvK was not generated
+        finally:
+            tablebase.close()
+
+    def test_best_move_mates(self):
+        board = Board()
+        board.parse_fen(MATE_IN_1_FEN)
+        move = search_position(board, simulations=2, tablebase=self.tablebase)
+
+        board.make_move(move)
+        self.assertEqual(board.get_result(board.playerJustMoved), WIN)
+
+    def test_get_result_uses_tablebase(self):
+        board = Board()
+        board.parse_fen("3k4/8/8/3K4/8/8/8/Q7 w - - 0 1")
+        self.assertIsNone(board.get_result(board.playerJustMoved))
+
+        board.tablebase = self.tablebase
+        self.assertEqual(board.get_result(WHITE), WIN)
+        self.assertEqual(board.get_result(BLACK), LOSS)
+        self.assertIs(board.__copy__().tablebase, self.tablebase)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import time
+import unittest
+from lib.timemanager import TimeManager, MIN_ITERATIONS
+
+
+class FakeNode:
+    def __init__(self, move=0, visits=0, children=()):
+        self.move = move
+        self.visits = visits
+        self.childNodes = list(children)
+
+
+class TestTimeManager(unittest.TestCase):
+    def test_allocation(self):
+        manager = TimeManager(time_left=60.0, increment=1.0, moves_to_go=20)
+
+        self.assertGreater(manager.optimumTime, 60.0 / 20)
+        self.assertGreaterEqual(manager.maximumTime, manager.optimumTime)
+        self.assertLess(manager.maximumTime, 60.0)
+
+    def test_last_move_uses_all_time(self):
+        manager = TimeManager(time_left=2.0, moves_to_go=1)
+
+        self.assertLess(manager.maximumTime, 2.0)
+        self.assertAlmostEqual(manager.optimumTime, manager.maximumTime)
+
+    def test_stop_when_best_move_cannot_be_overtaken(self):
+        manager = TimeManager(time_left=600.0)
+        manager.startTime = time.time() - manager.optimumTime * 0.9
+        manager.lastBestMove = 1  # move 1 has been the best move since the start of the search
+        root = FakeNode(visits=1000, children=[FakeNode(1, 990), FakeNode(2, 5), FakeNode(3, 5)])
+
+        self.assertTrue(manager.should_stop(root, 1000))
+
+    def test_continue_when_undecided(self):
+        manager = TimeManager(time_left=600.0)
+        manager.startTime = time.time() - manager.optimumTime * 0.1
+        root = FakeNode(visits=MIN_ITERATIONS * 2, children=[FakeNode(1, MIN_ITERATIONS), FakeNode(2, MIN_ITERATIONS)])
+
+        self.assertFalse(manager.should_stop(root, MIN_ITERATIONS * 2))
+
+    def test_unstable_best_move_extends_budget(self):
+        manager = TimeManager(time_left=600.0)
+        root = FakeNode(visits=100, children=[FakeNode(1, 40), FakeNode(2, 35), FakeNode(3, 25)])
+
+        self.assertGreater(manager.get_time_limit(root, manager.optimumTime * 0.5), manager.optimumTime)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from lib.board import Board
+from lib.constants import *
+from lib.mcts import uct_search
+from lib.search import search_position
+from lib.treefile import load_tree, run_analysis, save_tree
+
+
+QUIET_FEN = "8/8/3k4/8/8/3K4/8/R7 w - - 0 1"
+
+
+class TestTreeFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "tree.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        board = Board()
+        board.parse_fen(QUIET_FEN)
+        root = uct_search(board, 50, rave=True)
+
+        count = save_tree(self.path, board, root)
+        tree = load_tree(self.path)
+        self.assertEqual(tree.posKey, board.posKey.value)
+        self.assertEqual(count, sum(1 for _ in root.iter_tree()))
+
+        for (node, depth), (loaded, loaded_depth) in zip(root.iter_tree(), tree.root.iter_tree()):
+            self.assertEqual(depth, loaded_depth)
+            self.assertEqual(node.move, loaded.move)
+            self.assertEqual((node.visits, node.wins, node.amafVisits, node.proven),
+                             (loaded.visits, loaded.wins, loaded.amafVisits, loaded.proven))
+            self.assertEqual(node.playerJustMoved, loaded.playerJustMoved)
+            self.assertAlmostEqual(node.prior, loaded.prior, places=6)
+
+    def test_proofs_by_history(self):
+        board = Board()
+        board.parse_fen(QUIET_FEN)
+        for move in ["a1a2", "d6d7", "a2a1", "d7d6"] * 2:  # a1a2 now repeats a position for the third time
+            board.make_move(board.parse_move(move))
+        root = uct_search(board, 100)
+
+        save_tree(self.path, board, root)
+        for (node, _), (loaded, _) in zip(root.iter_tree(), load_tree(self.path).root.iter_tree()):
+            self.assertEqual((node.proven, node.provenByHistory), (loaded.proven, loaded.provenByHistory))
+        self.assertTrue(any(node.provenByHistory for node, _ in root.iter_tree()))
+
+    def test_search_position_continues_loaded_tree(self):
+        board = Board()
+        board.parse_fen(QUIET_FEN)
+        save_tree(self.path, board, uct_search(board, 30))
+        tree = load_tree(self.path)
+
+        search_position(board, simulations=20, tree=tree)
+        self.assertEqual(tree.root.visits, 50)
+        children = [c.move for c in tree.root.childNodes]
+        self.assertEqual(len(children), len(set(children)))  # loaded children are not expanded twice
+
+        other = Board()
+        other.parse_fen(START_FEN)
+        self.assertNotEqual(search_position(other, simulations=5, tree=tree), NO_MOVE)
+        self.assertEqual(tree.root.visits, 50)  # the tree of another position is ignored
+
+    def test_run_analysis_resumes(self):
+        board = Board()
+        board.parse_fen(QUIET_FEN)
+        run_analysis(board, 20, self.path, checkpoint_simulations=10)
+        root = run_analysis(board, 10, self.path)
+        self.assertEqual(root.visits, 30)
+
+    def test_run_analysis_other_position(self):
+        board = Board()
+        board.parse_fen(QUIET_FEN)
+        run_analysis(board, 10, self.path)
+        board.parse_fen(START_FEN)
+        with self.assertRaises(ValueError):
+            run_analysis(board, 10, self.path)
+
+        root = run_analysis(board, 10, self.path, overwrite=True)
+        self.assertEqual(root.visits, 10)
+        self.assertEqual(load_tree(self.path).posKey, board.posKey.value)
+
+    def test_not_a_tree_file(self):
+        with open(self.path, "wb") as tree_file:
+            tree_file.write(b"garbage")
+        with self.assertRaises(ValueError):
+            load_tree(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import io
+import time
+import unittest
+from contextlib import redirect_stdout
+from threading import Thread
+from lib.constants import START_FEN, BLACK, WHITE_PAWN, E4
+from lib.board import Board
+from lib.search import SearchInfo, INFINITE_SIMULATIONS
+from lib.uci import parse_position, parse_go, search_and_report, stop_search
+
+
+MATE_IN_1_FEN = "3k4/Q7/3K4/8/8/8/8/8 w - - 0 1"
+
+
+class TestUci(unittest.TestCase):
+    def test_position_startpos_moves(self):
+        board = Board()
+        parse_position("position startpos moves e2e4 e7e5 g1f3", board)
+
+        self.assertEqual(board.histPly, 3)
+        self.assertEqual(board.side, BLACK)
+        self.assertEqual(board.pieces[E4], WHITE_PAWN)
+
+    def test_position_fen(self):
+        board = Board()
+        parse_position("position fen 3k4/Q7/8/3K4/8/8/8/8 w - - 0 1 moves a7a8", board)
+
+        self.assertEqual(board.histPly, 1)
+        self.assertEqual(board.side, BLACK)
+
+    def test_go_limits(self):
+        board = Board()
+        board.parse_fen(START_FEN)
+        info = SearchInfo()
+
+        self.assertEqual(parse_go("go nodes 123", board, info), 123)
+        self.assertFalse(info.timeSet)
+
+        self.assertEqual(parse_go("go wtime 60000 btime 60000", board, info), INFINITE_SIMULATIONS)
+        self.assertTrue(info.timeSet)
+        self.assertLess(info.stopTime - info.startTime, 60)
+
+        parse_go("go infinite", board, info)
+        self.assertTrue(info.infinite)
+
+        parse_go("go infinite wtime 1000 btime 1000 movetime 500", board, info)
+        self.assertTrue(info.infinite)
+        self.assertFalse(info.timeSet)
+        self.assertIsNone(info.timeManager)
+
+    def test_go_infinite_on_proven_root(self):
+        board = Board()
+        board.parse_fen(MATE_IN_1_FEN)
+        info = SearchInfo()
+        info.postThinking = True
+        output = io.StringIO()
+
+        with redirect_stdout(output):
+            simulations = parse_go("go infinite", board, info)
+            thread = Thread(target=search_and_report, args=(board.__copy__(), simulations, info), daemon=True)
+            thread.start()
+            time.sleep(0.5)  # the mate is proven within a few simulations
+            self.assertTrue(thread.is_alive())
+            self.assertNotIn("bestmove", output.getvalue())
+            stop_search(thread, info)
+
+        self.assertIn("score mate 1", output.getvalue())
+        self.assertIn("bestmove", output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
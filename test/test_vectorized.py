@@ -0,0 +1,52 @@
+import unittest
+from lib.board import Board
+from lib.constants import *
+from lib.vectorized import np
+
+if np is not None:
+    from lib.vectorized import encode_boards, get_attack_maps, get_move_masks
+
+
+FENS = [
+    START_FEN,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R b KQkq - 0 1",
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+    "8/2P5/8/8/3k4/8/5p2/4K3 b - - 0 1",
+    "8/8/3k4/8/8/3K4/8/R7 w - - 0 1",
+]
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestVectorized(unittest.TestCase):
+    def setUp(self):
+        self.boards = []
+        for fen in FENS:
+            board = Board()
+            board.parse_fen(fen)
+            self.boards.append(board)
+        self.batch = encode_boards(self.boards)
+
+    def test_attack_maps(self):
+        attacks = get_attack_maps(self.batch.pieces)
+        self.assertEqual(attacks.shape, (len(FENS), 2, BOARD_SQUARE_NUMBER))
+
+        for board, board_attacks in zip(self.boards, attacks):
+            board.enable_attack_maps()
+            for side in (WHITE, BLACK):
+                for sq in board.conversion.Sq64ToSq120:
+                    self.assertEqual(board_attacks[side][sq], board.attackMaps[side][sq], (board.get_fen(), side, sq))
+
+    def test_move_masks(self):
+        masks = get_move_masks(self.batch)
+        self.assertEqual(masks.shape, (len(FENS), 64, 64))
+
+        for board, mask in zip(self.boards, masks):
+            to_64 = board.conversion.Sq120ToSq64
+            expected = {(to_64[get_from_square(move)], to_64[get_to_square(move)])
+                        for move in board.moveGenerator.generate_all_moves()}
+            self.assertEqual(set(zip(*np.nonzero(mask))), expected, board.get_fen())
+
+
+if __name__ == '__main__':
+    unittest.main()